@@ -5,6 +5,8 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Como subir o projeto com uvicorn/gunicorn: veja DEPLOY_ASGI.md.
 """
 
 import os
@@ -55,11 +55,15 @@ SITE_ID = 1
 
 
 MIDDLEWARE = [
+    'pessoas.server_timing.ServerTimingMiddleware',  # cabeçalho Server-Timing (primeiro, para medir o total)
+    'pessoas.replicas.ReplicaMiddleware',  # leituras na réplica, mantendo read-your-writes
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pessoas.papeis.PapelUsuarioMiddleware',  # request.papel (médico, paciente, atendente, staff)
+    'pessoas.orcamento_consultas.OrcamentoConsultasMiddleware',  # avisa views com consultas SQL demais
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Middleware do allauth
@@ -69,7 +73,7 @@ ROOT_URLCONF = 'cadastro_pessoas.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'pessoas.server_timing.TemplatesCronometrados',  # DjangoTemplates + tempo no Server-Timing
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -99,9 +103,54 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
         },
+        # Reaproveita as conexões (inclusive as das threads que as views
+        # assíncronas usam para consultas em paralelo) em vez de abrir uma por uso
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Réplica de leitura (opcional): com DB_REPLICA_HOST definido, os dashboards e
+# listagens marcados com @ler_da_replica leem dela (veja pessoas/replicas.py).
+# Nos testes ela aponta para o banco principal
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.environ.get('DB_REPLICA_SQLITE'):
+    # Réplica num arquivo SQLite à parte, para testar o roteamento sem MySQL.
+    # Nada é replicado: os testes (ReplicaSqliteTests) gravam em cada banco
+    # o que esperam ler dele
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DB_REPLICA_SQLITE'],
+        'TEST': {'NAME': f"{os.environ['DB_REPLICA_SQLITE']}.teste"},
+    }
+DATABASE_ROUTERS = ['pessoas.replicas.RoteadorReplica']
+# Segundos em que um usuário que acabou de gravar continua lendo do principal
+# (deve cobrir o atraso da replicação)
+REPLICA_ATRASO_MAXIMO = 5
+
+CACHES = {
+    # Estatísticas do dashboard e páginas públicas. Em produção, um cache
+    # compartilhado entre os processos (redis/memcached): com o LocMem, a
+    # invalidação feita por um worker não chega aos outros e as estatísticas
+    # ficam só ESTATISTICAS_TIMEOUT_POR_PROCESSO segundos em cache
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Só os baldes e métricas do limite de tentativas (LIMITE_LOGIN_CACHE), para
+    # não disputarem espaço com as páginas em cache. Em produção, um cache
+    # compartilhado, ex.: {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    # 'LOCATION': 'redis://127.0.0.1:6379/1'}
+    'limite_login': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'limite_login',
+    },
+}
 
 
 # Password validation
@@ -154,7 +203,7 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 # Configurações do django-allauth
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  # Backend padrão do Django
+    'pessoas.backends.UsuarioComPerfilBackend',  # Backend padrão do Django, carregando o Perfil junto
     'allauth.account.auth_backends.AuthenticationBackend',  # Backend do allauth
 ]
 
@@ -187,3 +236,65 @@ ACCOUNT_AUTHENTICATION_METHOD = 'email'
 ACCOUNT_EMAIL_VERIFICATION = 'none'  # Desabilita verificação de email
 SOCIALACCOUNT_AUTO_SIGNUP = True
 SOCIALACCOUNT_LOGIN_ON_GET = True
+
+# Feed .ics da agenda dos médicos: consultas de até N dias atrás e N dias à frente
+AGENDA_ICS_DIAS_PASSADOS = 30
+AGENDA_ICS_DIAS_FUTUROS = 180
+
+# Lembretes de consultas (tarefa "lembretes_consultas", executada por "manage.py processar_tarefas")
+LEMBRETES_ANTECEDENCIA_HORAS = 24
+# Para onde os lembretes vão; troque pelo backend SMTP em produção
+LEMBRETES_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'SIMED <nao-responda@simed.com.br>'
+
+# Consultas concluídas ou canceladas há mais dias que isso vão para a tabela de
+# arquivo ("manage.py arquivar_consultas" ou a tarefa diária "arquivar_consultas")
+ARQUIVAMENTO_DIAS = 365
+
+# Número máximo de consultas SQL por requisição, pelo nome da URL (inclui as
+# 2 da sessão e do usuário). Verificado pelo OrcamentoConsultasMiddleware
+# (avisos no log em desenvolvimento) e pelos testes de pessoas/tests.py
+ORCAMENTO_CONSULTAS_ATIVO = DEBUG
+ORCAMENTO_CONSULTAS = {
+    'painel_paciente': 6,
+    'painel_medico': 4,
+    'buscar_relatorios': 4,
+    'painel_atendente': 5,
+    'horarios_livres_medico': 6,
+    'escrever_relatorio': 5,
+    'lista_medicamentos': 4,
+    'dashboard_consultas': 4,
+    'dashboard_ocupacao': 5,
+    'dashboard_pacientes': 4,
+    'dashboard_medicos': 4,
+    'dashboard_produtos': 4,
+    'editar_medicamento': 4,
+    'gerenciar_cargos': 5,
+    'api_consultas': 4,
+    'api_medicamentos': 4,
+    'api_medicos': 4,
+    'api_pacientes': 4,
+}
+
+# Perfilador de requisições lentas (ServerTimingMiddleware): a fração de
+# requisições sorteadas roda sob o cProfile, e as que passam do limite têm o
+# perfil (.prof) salvo no diretório. 0 desliga; ex.: 0.01 para 1% em produção
+PERFILADOR_TAXA_AMOSTRAGEM = 0
+PERFILADOR_LIMITE_MS = 500
+PERFILADOR_DIRETORIO = BASE_DIR / 'perfis'
+# Fora do DEBUG, o cabeçalho Server-Timing só vai nas respostas para a equipe
+# (is_staff). True o envia a todos (ex.: num ambiente de homologação)
+SERVER_TIMING_PUBLICO = False
+
+# Limite de tentativas de login e cadastro (pessoas/limite_login.py): baldes
+# de fichas por IP e por nome de usuário, no cache LIMITE_LOGIN_CACHE, com
+# (capacidade, fichas recuperadas por minuto). Sem fichas, a resposta é 429
+# antes de qualquer hash de senha. Com vários processos, o cache precisa ser
+# compartilhado (memcached/redis): com DEBUG = False o app não sobe se ele
+# for um LocMemCache, que limitaria cada processo à parte
+LIMITE_LOGIN_ATIVO = True
+LIMITE_LOGIN_CACHE = 'limite_login'
+LIMITE_LOGIN = {
+    'ip': (20, 10),
+    'usuario': (5, 1),
+}
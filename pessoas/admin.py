@@ -1,10 +1,13 @@
 
 from django.contrib import admin
 # Importe todos os modelos que você quer ver na área admin
-from .models import Perfil, Consulta, Medicamento
+from .models import Perfil, Consulta, ConsultaArquivada, Medicamento, RelatorioConsulta, Tarefa
 
 # Django vai mostrar uma interface para cada modelo registrado aqui
 admin.site.register(Perfil)
 admin.site.register(Consulta)
+admin.site.register(ConsultaArquivada)
+admin.site.register(RelatorioConsulta)
 admin.site.register(Medicamento) # <--- Adicione esta linha
+admin.site.register(Tarefa)
 # Register your models here.
@@ -0,0 +1,133 @@
+# pessoas/agenda_ics.py
+
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Consulta, Perfil
+from .ocupacao import limites_do_dia
+
+# Janela de consultas publicada no feed, em dias antes e depois de hoje
+DIAS_PASSADOS = getattr(settings, 'AGENDA_ICS_DIAS_PASSADOS', 30)
+DIAS_FUTUROS = getattr(settings, 'AGENDA_ICS_DIAS_FUTUROS', 180)
+# O token de sincronização "volta" este tanto no tempo, para não perder
+# alterações de transações que ainda não tinham sido confirmadas na leitura
+MARGEM_SINCRONIZACAO = timedelta(minutes=2)
+
+_SALT_SINCRONIZACAO = 'pessoas.agenda_ics.sincronizacao'
+_STATUS_ICS = {'agendada': 'CONFIRMED', 'concluida': 'CONFIRMED', 'cancelada': 'CANCELLED'}
+
+
+def gerar_token_agenda(perfil):
+    """Cria (ou troca) o link secreto do feed; o link anterior deixa de funcionar."""
+    perfil.token_agenda = secrets.token_urlsafe(32)
+    perfil.save(update_fields=['token_agenda'])
+    return perfil.token_agenda
+
+
+def marcar_agenda_alterada(medico_id, exclusao=False):
+    """
+    Troca a versão da agenda do médico (e com isso o ETag do feed).
+    Exclusões não aparecem numa sincronização incremental, então também
+    guardam o momento em que ocorreram para forçar o envio do feed completo.
+    """
+    campos = {'versao_agenda': F('versao_agenda') + 1}
+    if exclusao:
+        campos['agenda_excluida_em'] = timezone.now()
+    Perfil.objects.filter(usuario_id=medico_id).update(**campos)
+
+
+def janela_agenda(hoje=None):
+    hoje = hoje or timezone.localdate()
+    return hoje - timedelta(days=DIAS_PASSADOS), hoje + timedelta(days=DIAS_FUTUROS)
+
+
+def criar_token_sincronizacao(momento):
+    return signing.Signer(salt=_SALT_SINCRONIZACAO).sign(str(int(momento.timestamp() * 1_000_000)))
+
+
+def ler_token_sincronizacao(token):
+    """Momento guardado no token, ou None se o token for inválido."""
+    try:
+        micros = int(signing.Signer(salt=_SALT_SINCRONIZACAO).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+    return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+
+
+def etag_agenda(perfil, inicio, desde_token):
+    # A janela desliza todo dia, então o primeiro dia dela também faz parte do ETag
+    return f'"{perfil.pk}-{perfil.versao_agenda}-{inicio:%Y%m%d}-{desde_token or "completo"}"'
+
+
+def _escapar(texto):
+    return (
+        texto.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _dobrar(linha):
+    """Quebra linhas com mais de 75 octetos, como pede a RFC 5545."""
+    dados = linha.encode()
+    if len(dados) <= 75:
+        return linha
+    partes = []
+    while dados:
+        limite = 75 if not partes else 74
+        # Não corta um caractere UTF-8 ao meio
+        while limite < len(dados) and (dados[limite] & 0xC0) == 0x80:
+            limite -= 1
+        partes.append(dados[:limite].decode())
+        dados = dados[limite:]
+    return '\r\n '.join(partes)
+
+
+def _data_ics(momento):
+    return momento.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def consultas_do_feed(perfil, inicio, fim, desde=None):
+    consultas = Consulta.objects.filter(
+        medico_id=perfil.usuario_id,
+        data_hora__gte=limites_do_dia(inicio)[0],
+        data_hora__lt=limites_do_dia(fim)[1],
+    ).select_related('paciente').only(
+        'data_hora', 'duracao', 'status', 'atualizado_em', 'medico_id',
+        'paciente__username', 'paciente__first_name', 'paciente__last_name',
+    ).order_by('data_hora')
+    if desde is not None:
+        consultas = consultas.filter(atualizado_em__gt=desde)
+    return consultas
+
+
+def gerar_ics(perfil, consultas, token_sincronizacao):
+    """Monta o VCALENDAR com um VEVENT por consulta."""
+    linhas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//SIMED//Agenda do medico//PT-BR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:Consultas SIMED',
+        f'X-SIMED-SYNC-TOKEN:{token_sincronizacao}',
+    ]
+    for consulta in consultas:
+        paciente = consulta.paciente.get_full_name() or consulta.paciente.username
+        linhas += [
+            'BEGIN:VEVENT',
+            f'UID:consulta-{consulta.pk}@simed',
+            f'DTSTAMP:{_data_ics(consulta.atualizado_em)}',
+            f'LAST-MODIFIED:{_data_ics(consulta.atualizado_em)}',
+            f'DTSTART:{_data_ics(consulta.data_hora)}',
+            f'DTEND:{_data_ics(consulta.data_hora + consulta.duracao)}',
+            f'SUMMARY:{_escapar(f"Consulta - {paciente}")}',
+            f'STATUS:{_STATUS_ICS.get(consulta.status, "CONFIRMED")}',
+            'END:VEVENT',
+        ]
+    linhas.append('END:VCALENDAR')
+    return '\r\n'.join(_dobrar(linha) for linha in linhas) + '\r\n'
@@ -0,0 +1,380 @@
+# pessoas/api.py
+
+import json
+from collections import namedtuple
+from functools import wraps
+
+from django.db import transaction
+from django.http import JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404
+
+from .disponibilidade import HorarioIndisponivel, reservar_horario
+from .forms import (
+    AgendarConsultaAtendenteForm, AgendarConsultaForm, FiltroConsultasForm,
+    FiltroMedicamentosForm, RelatorioConsultaForm,
+)
+from .models import Consulta, Medicamento, User
+from .paginacao import paginar_por_cursor
+from .papeis import PAPEL_STAFF
+from .relatorios import RelatorioDesatualizado, salvar_relatorio, versao_do_relatorio
+from .replicas import ler_da_replica
+
+# Itens por página da API (?limite=), padrão e máximo
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 100
+
+# Um campo que pode ser pedido em ?fields=: as colunas que ele precisa (para o
+# only()), a relação a carregar no mesmo SELECT e como obter o valor do objeto
+Campo = namedtuple('Campo', 'colunas relacionado valor', defaults=(None, None))
+
+
+class ErroApi(Exception):
+    """Erro devolvido ao cliente como JSON: {"erro": mensagem, ...detalhes}."""
+
+    def __init__(self, mensagem, status=400, **detalhes):
+        super().__init__(mensagem)
+        self.status = status
+        self.detalhes = detalhes
+
+
+def endpoint_api(*papeis, metodos=('GET',)):
+    """
+    Decorator das views da API: exige login (401), um dos papéis informados
+    (403; sem papéis, qualquer usuário logado) e um dos métodos (405).
+    ErroApi levantado pela view vira a resposta JSON correspondente.
+    """
+    def decorator(view):
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'erro': 'Autenticação necessária.'}, status=401)
+            if papeis and request.papel not in papeis:
+                return JsonResponse({'erro': 'Acesso negado.'}, status=403)
+            if request.method not in metodos:
+                resposta = JsonResponse({'erro': 'Método não permitido.'}, status=405)
+                resposta['Allow'] = ', '.join(metodos)
+                return resposta
+            try:
+                return view(request, *args, **kwargs)
+            except ErroApi as erro:
+                return JsonResponse({'erro': str(erro), **erro.detalhes}, status=erro.status)
+        return _view
+    return decorator
+
+
+def _dados_requisicao(request):
+    """Corpo da requisição como dicionário (JSON ou formulário)."""
+    if request.content_type == 'application/json':
+        try:
+            dados = json.loads(request.body or b'{}')
+        except (UnicodeDecodeError, ValueError):
+            raise ErroApi('JSON inválido.')
+        if not isinstance(dados, dict):
+            raise ErroApi('O corpo deve ser um objeto JSON.')
+        return dados
+    if request.method == 'POST':
+        return request.POST
+    return QueryDict(request.body)
+
+
+def _erros_formulario(form):
+    return ErroApi('Dados inválidos.', erros=form.errors.get_json_data())
+
+
+def selecionar_campos(request, campos):
+    """Campos pedidos em ?fields=a,b (todos os permitidos se ausente)."""
+    pedidos = request.GET.get('fields')
+    if not pedidos:
+        return list(campos)
+    nomes = [nome.strip() for nome in pedidos.split(',') if nome.strip()]
+    desconhecidos = [nome for nome in nomes if nome not in campos]
+    if desconhecidos:
+        raise ErroApi('Campos desconhecidos.', campos=desconhecidos, disponiveis=list(campos))
+    return nomes
+
+
+def aplicar_campos(queryset, campos, nomes, campo_ordem=None):
+    """
+    Restringe o SELECT às colunas dos campos pedidos e junta as relações
+    necessárias, para que a listagem seja sempre uma única consulta.
+    """
+    colunas = {'id'}
+    if campo_ordem:
+        colunas.add(campo_ordem)
+    relacionados = set()
+    for nome in nomes:
+        colunas.update(campos[nome].colunas)
+        if campos[nome].relacionado:
+            relacionados.add(campos[nome].relacionado)
+    if relacionados:
+        queryset = queryset.select_related(*relacionados)
+    return queryset.only(*colunas)
+
+
+def serializar(objeto, campos, nomes):
+    return {nome: campos[nome].valor(objeto) for nome in nomes}
+
+
+def _limite(request):
+    try:
+        limite = int(request.GET.get('limite', LIMITE_PADRAO))
+    except ValueError:
+        raise ErroApi('limite deve ser um número inteiro.')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def resposta_paginada(request, queryset, campos, nomes, campo_ordem):
+    """Lista paginada por cursor: {"resultados": [...], "proximo_cursor", "proxima"}."""
+    pagina = paginar_por_cursor(
+        aplicar_campos(queryset, campos, nomes, campo_ordem),
+        request.GET.get('cursor'),
+        tamanho=_limite(request),
+        campo=campo_ordem,
+    )
+    proxima = None
+    if pagina.tem_proxima:
+        parametros = request.GET.copy()
+        parametros['cursor'] = pagina.proximo_cursor
+        proxima = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+    return JsonResponse({
+        'resultados': [serializar(objeto, campos, nomes) for objeto in pagina],
+        'proximo_cursor': pagina.proximo_cursor,
+        'proxima': proxima,
+    })
+
+
+# --- CAMPOS DE CADA RECURSO ---
+
+def _nome(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def _campo_usuario(relacao):
+    colunas = tuple(f'{relacao}__{coluna}' for coluna in ('username', 'first_name', 'last_name', 'email'))
+
+    def valor(consulta):
+        usuario = getattr(consulta, relacao)
+        return {'id': usuario.pk, 'username': usuario.username, 'nome': _nome(usuario), 'email': usuario.email}
+
+    return Campo(colunas, relacao, valor)
+
+
+CAMPOS_CONSULTA = {
+    'id': Campo(('id',), valor=lambda consulta: consulta.pk),
+    'data_hora': Campo(('data_hora',), valor=lambda consulta: consulta.data_hora),
+    'status': Campo(('status',), valor=lambda consulta: consulta.status),
+    'criado_em': Campo(('criado_em',), valor=lambda consulta: consulta.criado_em),
+    'atualizado_em': Campo(('atualizado_em',), valor=lambda consulta: consulta.atualizado_em),
+    'paciente': _campo_usuario('paciente'),
+    'medico': _campo_usuario('medico'),
+    # O texto fica em RelatorioConsulta: só entra no SELECT (JOIN) quando pedido
+    'relatorio': Campo(('relatorio_consulta__texto',), 'relatorio_consulta', lambda consulta: consulta.relatorio),
+    'versao_relatorio': Campo(
+        ('relatorio_consulta__versao',), 'relatorio_consulta',
+        lambda consulta: consulta.relatorio_consulta.versao if consulta.relatorio is not None else 0,
+    ),
+}
+
+CAMPOS_MEDICAMENTO = {
+    'id': Campo(('id',), valor=lambda medicamento: medicamento.pk),
+    'nome': Campo(('nome',), valor=lambda medicamento: medicamento.nome),
+    'valor': Campo(('valor',), valor=lambda medicamento: medicamento.valor),
+    'necessita_receita': Campo(('necessita_receita',), valor=lambda medicamento: medicamento.necessita_receita),
+    'foto': Campo(('foto',), valor=lambda medicamento: medicamento.foto.url if medicamento.foto else None),
+}
+
+_CAMPOS_USUARIO = {
+    'id': Campo(('id',), valor=lambda usuario: usuario.pk),
+    'username': Campo(('username',), valor=lambda usuario: usuario.username),
+    'nome': Campo(('username', 'first_name', 'last_name'), valor=_nome),
+    'email': Campo(('email',), valor=lambda usuario: usuario.email),
+}
+
+CAMPOS_MEDICO = {
+    **_CAMPOS_USUARIO,
+    'duracao_consulta': Campo(('perfil__duracao_consulta',), 'perfil', lambda medico: medico.perfil.duracao_consulta),
+    'inicio_expediente': Campo(('perfil__inicio_expediente',), 'perfil', lambda medico: medico.perfil.inicio_expediente),
+    'fim_expediente': Campo(('perfil__fim_expediente',), 'perfil', lambda medico: medico.perfil.fim_expediente),
+}
+
+CAMPOS_PACIENTE = {
+    **_CAMPOS_USUARIO,
+    'rg': Campo(('perfil__rg',), 'perfil', lambda paciente: paciente.perfil.rg),
+    'data_nascimento': Campo(('perfil__data_nascimento',), 'perfil', lambda paciente: paciente.perfil.data_nascimento),
+    'endereco': Campo(('perfil__endereco',), 'perfil', lambda paciente: paciente.perfil.endereco),
+}
+
+
+def _campos_consulta(request):
+    # O relatório é visível apenas para médicos e administradores
+    if request.papel in ('medico', PAPEL_STAFF):
+        return CAMPOS_CONSULTA
+    return {nome: campo for nome, campo in CAMPOS_CONSULTA.items() if nome not in ('relatorio', 'versao_relatorio')}
+
+
+def consultas_visiveis(request):
+    """Consultas que o usuário pode ver: as próprias (médico/paciente) ou todas."""
+    consultas = Consulta.objects.all()
+    if request.papel == 'medico':
+        return consultas.filter(medico=request.user)
+    if request.papel in ('atendente', PAPEL_STAFF):
+        return consultas
+    return consultas.filter(paciente=request.user)
+
+
+# --- VIEWS ---
+
+@endpoint_api(metodos=('GET', 'POST'))
+@ler_da_replica
+def consultas(request):
+    """
+    GET: consultas visíveis ao usuário, com os filtros do painel do atendente
+    (data_inicio, data_fim, medico, status), ?fields= e paginação por cursor.
+    POST: agenda uma consulta (medico, data_hora; atendentes e administradores
+    também informam paciente), com a mesma validação dos formulários do site.
+    """
+    campos = _campos_consulta(request)
+    if request.method == 'POST':
+        return _agendar(request, campos)
+
+    nomes = selecionar_campos(request, campos)
+    filtro_form = FiltroConsultasForm(request.GET)
+    if not filtro_form.is_valid():
+        raise _erros_formulario(filtro_form)
+    lista = filtro_form.filtrar(consultas_visiveis(request))
+    return resposta_paginada(request, lista, campos, nomes, 'data_hora')
+
+
+def _agendar(request, campos):
+    dados = _dados_requisicao(request)
+    if request.papel in ('atendente', PAPEL_STAFF):
+        form = AgendarConsultaAtendenteForm(dados)
+    elif request.papel == 'paciente':
+        form = AgendarConsultaForm(dados)
+    else:
+        raise ErroApi('Apenas pacientes, atendentes e administradores agendam consultas.', status=403)
+    if not form.is_valid():
+        raise _erros_formulario(form)
+
+    consulta = form.save(commit=False)
+    if request.papel == 'paciente':
+        consulta.paciente = request.user
+    try:
+        # Grava só se o horário continuar livre (protege contra agendamentos simultâneos)
+        reservar_horario(consulta)
+    except HorarioIndisponivel as erro:
+        form.add_error('data_hora', erro)
+        raise ErroApi('Horário indisponível.', status=409, erros=form.errors.get_json_data())
+    return JsonResponse(serializar(consulta, campos, list(campos)), status=201)
+
+
+@endpoint_api(metodos=('GET', 'PATCH'))
+def consulta_detalhe(request, consulta_id):
+    """
+    GET: uma consulta (com ?fields=).
+    PATCH: altera status e/ou relatorio, seguindo Consulta.TRANSICOES_STATUS
+    (409 para mudanças não permitidas). Pacientes só podem cancelar; reativar
+    uma cancelada (atendentes e administradores) reserva o horário de novo.
+    O relatório é escrito pelo médico da consulta e a marca como concluída
+    (consultas canceladas não recebem relatório). Com versao_relatorio,
+    responde 409 se o relatório mudou desde essa versão.
+    """
+    campos = _campos_consulta(request)
+    consulta = get_object_or_404(
+        consultas_visiveis(request).select_related('paciente', 'medico'), pk=consulta_id
+    )
+    if request.method == 'PATCH':
+        _alterar_consulta(request, consulta)
+        return JsonResponse(serializar(consulta, campos, list(campos)))
+    nomes = selecionar_campos(request, campos)
+    return JsonResponse(serializar(consulta, campos, nomes))
+
+
+def _alterar_consulta(request, consulta):
+    dados = _dados_requisicao(request)
+    status = dados.get('status')
+    if status is not None and status not in dict(Consulta.STATUS_CHOICES):
+        raise ErroApi('Status inválido.', opcoes=list(dict(Consulta.STATUS_CHOICES)))
+    if 'relatorio' not in dados and status is None:
+        raise ErroApi('Informe status e/ou relatorio.')
+    if 'relatorio' in dados and request.papel != 'medico':
+        raise ErroApi('Apenas o médico da consulta escreve o relatório.', status=403)
+
+    with transaction.atomic():
+        # O status é conferido com a linha travada: duas alterações simultâneas
+        # não conseguem, por exemplo, concluir e cancelar a mesma consulta
+        anterior = Consulta.objects.select_for_update().values_list('status', flat=True).get(pk=consulta.pk)
+        consulta.status = anterior
+        if status is not None and status != anterior:
+            _mudar_status(request, consulta, status)
+
+        if 'relatorio' in dados:
+            if consulta.status == 'cancelada':
+                raise ErroApi('Consultas canceladas não recebem relatório.', status=409, status_atual=anterior)
+            form = RelatorioConsultaForm({'relatorio': dados['relatorio'], 'versao': dados.get('versao_relatorio')})
+            if not form.is_valid():
+                raise _erros_formulario(form)
+            try:
+                salvar_relatorio(consulta, form.cleaned_data['relatorio'], form.cleaned_data['versao'])
+            except RelatorioDesatualizado:
+                raise ErroApi(
+                    'O relatório foi alterado desde a versão informada.', status=409,
+                    versao_relatorio=versao_do_relatorio(consulta),
+                )
+            consulta.status = 'concluida'
+
+        if anterior == 'cancelada' and consulta.status == 'agendada':
+            # Reativação: outro paciente pode ter ocupado o horário nesse meio tempo
+            try:
+                reservar_horario(consulta)
+            except HorarioIndisponivel as erro:
+                raise ErroApi('Horário indisponível.', status=409, erros={'data_hora': list(erro.messages)})
+        else:
+            consulta.save()
+
+
+def _mudar_status(request, consulta, status):
+    """
+    Confere se o papel pode fazer a mudança de status (403) e se ela é
+    permitida a partir do status atual (409, veja Consulta.TRANSICOES_STATUS).
+    """
+    if request.papel == 'paciente' and status != 'cancelada':
+        raise ErroApi('Pacientes podem apenas cancelar consultas.', status=403)
+    if request.papel == 'medico' and status == 'agendada':
+        raise ErroApi('Apenas atendentes e administradores reativam consultas.', status=403)
+    if status not in Consulta.TRANSICOES_STATUS[consulta.status]:
+        raise ErroApi(
+            f'Uma consulta {consulta.get_status_display().lower()} não pode passar para '
+            f'{dict(Consulta.STATUS_CHOICES)[status].lower()}.',
+            status=409, status_atual=consulta.status,
+        )
+    consulta.status = status
+
+@endpoint_api()
+@ler_da_replica
+def medicamentos(request):
+    """Catálogo de medicamentos, com os filtros do site (q, necessita_receita, valor_min, valor_max)."""
+    nomes = selecionar_campos(request, CAMPOS_MEDICAMENTO)
+    filtro_form = FiltroMedicamentosForm(request.GET)
+    if not filtro_form.is_valid():
+        raise _erros_formulario(filtro_form)
+    lista = filtro_form.filtrar(Medicamento.objects.all())
+    return resposta_paginada(request, lista, CAMPOS_MEDICAMENTO, nomes, 'nome')
+
+
+@endpoint_api()
+@ler_da_replica
+def medicos(request):
+    """Diretório de médicos (qualquer usuário logado, para escolher com quem agendar)."""
+    nomes = selecionar_campos(request, CAMPOS_MEDICO)
+    lista = User.objects.filter(perfil__tipo_usuario='medico')
+    return resposta_paginada(request, lista, CAMPOS_MEDICO, nomes, 'id')
+
+
+@endpoint_api('atendente', PAPEL_STAFF)
+@ler_da_replica
+def pacientes(request):
+    """Diretório de pacientes (atendentes e administradores)."""
+    nomes = selecionar_campos(request, CAMPOS_PACIENTE)
+    lista = User.objects.filter(perfil__tipo_usuario='paciente')
+    return resposta_paginada(request, lista, CAMPOS_PACIENTE, nomes, 'id')
@@ -7,3 +7,7 @@ class PessoasConfig(AppConfig):
     
     def ready(self):
         import pessoas.signals  # Importa os signals quando o app é carregado
+        import pessoas.lembretes  # Registra as tarefas da fila (pessoas.tarefas)
+        import pessoas.arquivamento
+        from pessoas.limite_login import verificar_configuracao
+        verificar_configuracao()
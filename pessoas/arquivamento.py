@@ -0,0 +1,77 @@
+# pessoas/arquivamento.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Consulta, ConsultaArquivada, RelatorioConsulta
+from .tarefas import tarefa
+
+# Só consultas encerradas são arquivadas; as agendadas continuam na tabela principal
+STATUS_ARQUIVAVEIS = ('concluida', 'cancelada')
+TAMANHO_LOTE_ARQUIVAMENTO = 1000
+
+
+def dias_para_arquivar():
+    """Idade mínima (em dias) das consultas arquivadas: settings.ARQUIVAMENTO_DIAS."""
+    return getattr(settings, 'ARQUIVAMENTO_DIAS', 365)
+
+
+def consultas_arquivaveis(dias=None):
+    limite = timezone.now() - timedelta(days=dias if dias is not None else dias_para_arquivar())
+    return Consulta.objects.filter(status__in=STATUS_ARQUIVAVEIS, data_hora__lt=limite)
+
+
+def _arquivar_lote(consultas, tamanho_lote):
+    with transaction.atomic():
+        # FOR UPDATE: ninguém altera a consulta entre a cópia e a exclusão
+        lote = list(consultas.order_by().select_for_update()[:tamanho_lote])
+        if not lote:
+            return 0
+        ids = [consulta.pk for consulta in lote]
+        textos = dict(RelatorioConsulta.objects.filter(consulta_id__in=ids).values_list('consulta_id', 'texto'))
+        ConsultaArquivada.objects.bulk_create([
+            ConsultaArquivada(
+                id=consulta.pk,
+                paciente_id=consulta.paciente_id,
+                medico_id=consulta.medico_id,
+                data_hora=consulta.data_hora,
+                status=consulta.status,
+                relatorio_comprimido=ConsultaArquivada.comprimir(textos.get(consulta.pk)),
+                criado_em=consulta.criado_em,
+            )
+            for consulta in lote
+        ])
+        # DELETE em SQL, sem os signals e a cascata do ORM: o resumo de ocupação
+        # e as estatísticas continuam contando as arquivadas, elas já saíram do
+        # feed .ics, e os relatórios ficam para a busca (RelatorioConsulta)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Consulta._meta.db_table)} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids
+            )
+    return len(lote)
+
+
+def arquivar_consultas(dias=None, tamanho_lote=TAMANHO_LOTE_ARQUIVAMENTO, progresso=None):
+    """
+    Move as consultas concluídas ou canceladas com mais de `dias` dias para
+    ConsultaArquivada, em lotes (cada lote em uma transação curta), e
+    devolve quantas foram movidas. Pode ser interrompido e rodado de novo.
+    """
+    consultas = consultas_arquivaveis(dias)
+    movidas = 0
+    while True:
+        quantidade = _arquivar_lote(consultas, tamanho_lote)
+        if not quantidade:
+            return movidas
+        movidas += quantidade
+        if progresso:
+            progresso(movidas)
+
+
+@tarefa('arquivar_consultas', intervalo=timedelta(days=1))
+def arquivar_consultas_diariamente():
+    arquivar_consultas()
+
@@ -0,0 +1,62 @@
+# pessoas/assincrono.py
+
+import asyncio
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.shortcuts import render
+
+
+def _em_conexao_propria(funcao):
+    def executar():
+        try:
+            return funcao()
+        finally:
+            # Cada thread tem a sua conexão: devolve-a (ou mantém, se
+            # CONN_MAX_AGE permitir) ao terminar, como no fim de uma requisição
+            close_old_connections()
+    return executar
+
+
+async def em_paralelo(*funcoes):
+    """
+    Executa funções síncronas independentes (consultas ao banco) ao mesmo
+    tempo, cada uma numa thread com a sua própria conexão, e devolve os
+    resultados na mesma ordem. O tempo total passa a ser o da consulta mais
+    lenta em vez da soma de todas.
+
+    Dentro de uma transação (ex.: ATOMIC_REQUESTS ou testes) as outras
+    conexões não enxergariam os dados ainda não confirmados, então as funções
+    rodam em sequência na conexão atual.
+    """
+    # As conexões são por thread: a da requisição é a da thread de sync_to_async
+    if await sync_to_async(lambda: connection.in_atomic_block)():
+        return [await sync_to_async(funcao)() for funcao in funcoes]
+    return await asyncio.gather(*(
+        sync_to_async(_em_conexao_propria(funcao), thread_sensitive=False)()
+        for funcao in funcoes
+    ))
+
+
+async def renderizar(request, template, contexto):
+    """render() para views assíncronas: o template pode acessar request.user e o banco."""
+    return await sync_to_async(render)(request, template, contexto)
+
+
+async def iterar_em_thread(iterador, itens_por_vez=500):
+    """
+    Transforma um gerador síncrono (que lê o banco) num iterador assíncrono,
+    para o StreamingHttpResponse no ASGI. Com um iterador síncrono o Django
+    no ASGI junta o conteúdo inteiro na memória antes de enviar; aqui os itens
+    são lidos em blocos na thread das views síncronas (a mesma conexão da
+    requisição) e enviados um bloco de cada vez.
+    """
+    iterador = iter(iterador)
+    proximo_bloco = sync_to_async(lambda: list(islice(iterador, itens_por_vez)))
+    while True:
+        bloco = await proximo_bloco()
+        if not bloco:
+            return
+        for item in bloco:
+            yield item
@@ -0,0 +1,20 @@
+# pessoas/backends.py
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class UsuarioComPerfilBackend(ModelBackend):
+    """
+    Igual ao ModelBackend, mas carrega o Perfil junto com o usuário (JOIN)
+    a cada requisição, então request.user.perfil não gera outra consulta.
+    """
+
+    def get_user(self, user_id):
+        try:
+            usuario = UserModel._default_manager.select_related('perfil').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
@@ -0,0 +1,204 @@
+# pessoas/benchmark.py
+
+import math
+import subprocess
+import time
+
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from . import urls as urls_pessoas
+from .agenda_ics import gerar_token_agenda
+from .models import Consulta, Medicamento, Perfil, User
+from .orcamento_consultas import medir_consultas
+from .papeis import PAPEL_STAFF
+
+# Papéis simulados; "anonimo" é o visitante sem login
+PAPEIS = (PAPEL_STAFF, 'atendente', 'medico', 'paciente', 'anonimo')
+
+# URLs que não são medidas, e o motivo
+URLS_IGNORADAS = {
+    'logout': 'encerraria a sessão do papel simulado',
+    'cancelar_consulta_admin': 'o GET cancela a consulta',
+}
+
+
+def percentil(valores, p):
+    """Percentil pelo método do posto mais próximo (valores não vazios)."""
+    ordenados = sorted(valores)
+    posicao = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[posicao]
+
+
+def _nomes_das_urls(padroes=None):
+    for padrao in padroes if padroes is not None else urls_pessoas.urlpatterns:
+        if isinstance(padrao, URLResolver):
+            yield from _nomes_das_urls(padrao.url_patterns)
+        elif isinstance(padrao, URLPattern) and padrao.name:
+            yield padrao.name, list(padrao.pattern.converters)
+
+
+def _usuario_do_papel(papel, criados):
+    """
+    Usuário usado para simular o papel (o de menor id). Se não houver, cria um
+    "benchmark_<papel>" e o acrescenta a `criados`, para ser apagado no fim.
+    """
+    if papel == PAPEL_STAFF:
+        usuario = User.objects.filter(is_staff=True).order_by('id').first()
+        if usuario:
+            return usuario
+        usuario = User.objects.create_user('benchmark_staff', is_staff=True)
+    else:
+        perfil = Perfil.objects.filter(tipo_usuario=papel, usuario__is_staff=False).select_related('usuario').order_by('id').first()
+        if perfil:
+            return perfil.usuario
+        usuario = User.objects.create_user(f'benchmark_{papel}')
+        Perfil.objects.filter(usuario=usuario).update(tipo_usuario=papel)
+    criados.append(usuario.pk)
+    return usuario
+
+
+class _Parametros:
+    """Valores dos parâmetros das URLs (<int:consulta_id>, <str:token>...), buscados uma vez."""
+
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+        self._cache = {}
+
+    def valor(self, nome):
+        if nome not in self._cache:
+            self._cache[nome] = self._buscar(nome)
+        return self._cache[nome]
+
+    def _buscar(self, nome):
+        medico, paciente = self.usuarios['medico'], self.usuarios['paciente']
+        if nome == 'consulta_id':
+            consulta = Consulta.objects.filter(medico=medico).order_by('id').first()
+            return consulta.pk if consulta else None
+        if nome == 'medico_id':
+            return medico.pk
+        if nome in ('paciente_id', 'user_id'):
+            return paciente.pk
+        if nome == 'medicamento_id':
+            return Medicamento.objects.order_by('id').values_list('id', flat=True).first()
+        if nome == 'token':
+            return medico.perfil.token_agenda or gerar_token_agenda(medico.perfil)
+        return None
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def executar_benchmark(repeticoes=10, aquecimento=1, papeis=PAPEIS, nomes=None, progresso=None):
+    """
+    Faz GET em cada URL de pessoas/urls.py como cada papel, usando o Client
+    de testes, e mede a latência (p50/p90/p99/máx, em ms) e o número de
+    consultas ao banco (em todas as conexões, inclusive a réplica e as threads
+    de em_paralelo) e o tempo gasto nelas. As primeiras `aquecimento` requisições não contam
+    (preenchem caches). Papéis sem usuário no banco usam um "benchmark_<papel>"
+    criado na hora e apagado no fim. Retorna um dicionário pronto para salvar
+    em JSON.
+    """
+    criados = []
+    resultados = []
+    ignoradas = []
+    try:
+        usuarios = {papel: _usuario_do_papel(papel, criados) for papel in papeis if papel != 'anonimo'}
+        for papel in ('medico', 'paciente'):
+            usuarios.setdefault(papel, _usuario_do_papel(papel, criados))
+        parametros = _Parametros(usuarios)
+
+        for nome, argumentos in _nomes_das_urls():
+            if nomes and nome not in nomes:
+                continue
+            if nome in URLS_IGNORADAS:
+                ignoradas.append({'url': nome, 'motivo': URLS_IGNORADAS[nome]})
+                continue
+            kwargs = {argumento: parametros.valor(argumento) for argumento in argumentos}
+            faltando = [argumento for argumento, valor in kwargs.items() if valor is None]
+            if faltando:
+                ignoradas.append({'url': nome, 'motivo': f'sem dados para {", ".join(faltando)}'})
+                continue
+            caminho = reverse(nome, kwargs=kwargs)
+
+            for papel in papeis:
+                # Erros viram resposta 500 no resultado em vez de interromper a medição
+                cliente = Client(raise_request_exception=False)
+                if papel != 'anonimo':
+                    cliente.force_login(usuarios[papel])
+                for _ in range(aquecimento):
+                    cliente.get(caminho)
+
+                tempos, consultas, tempos_sql = [], [], []
+                for _ in range(repeticoes):
+                    with medir_consultas() as medicao:
+                        inicio = time.perf_counter()
+                        resposta = cliente.get(caminho)
+                        if resposta.streaming:
+                            # Exportações: mede até o último byte
+                            for _ in resposta.streaming_content:
+                                pass
+                        tempos.append((time.perf_counter() - inicio) * 1000)
+                    consultas.append(medicao.total)
+                    tempos_sql.append(medicao.tempo_ms)
+
+                resultados.append({
+                    'url': nome,
+                    'caminho': caminho,
+                    'papel': papel,
+                    'status': resposta.status_code,
+                    'p50_ms': round(percentil(tempos, 50), 2),
+                    'p90_ms': round(percentil(tempos, 90), 2),
+                    'p99_ms': round(percentil(tempos, 99), 2),
+                    'max_ms': round(max(tempos), 2),
+                    'consultas_sql': max(consultas),
+                    'sql_p50_ms': round(percentil(tempos_sql, 50), 2),
+                })
+                if progresso:
+                    progresso(resultados[-1])
+    finally:
+        # Os usuários criados só para a medição não ficam no banco
+        User.objects.filter(pk__in=criados).delete()
+
+    return {
+        'gerado_em': timezone.now().isoformat(),
+        'commit': _commit_atual(),
+        'banco': connection.vendor,
+        'repeticoes': repeticoes,
+        'volumes': {
+            'usuarios': User.objects.count(),
+            'consultas': Consulta.objects.count(),
+            'medicamentos': Medicamento.objects.count(),
+        },
+        'resultados': resultados,
+        'ignoradas': ignoradas,
+    }
+
+
+def comparar_resultados(anterior, atual):
+    """
+    Compara dois resultados de executar_benchmark (ex.: de dois commits) e
+    devolve, por URL e papel, a variação do p50 e do número de consultas.
+    """
+    antes = {(item['url'], item['papel']): item for item in anterior['resultados']}
+    diferencas = []
+    for item in atual['resultados']:
+        base = antes.get((item['url'], item['papel']))
+        if base is None:
+            continue
+        diferencas.append({
+            'url': item['url'],
+            'papel': item['papel'],
+            'p50_ms': (base['p50_ms'], item['p50_ms']),
+            'variacao_p50': round((item['p50_ms'] - base['p50_ms']) / base['p50_ms'] * 100, 1) if base['p50_ms'] else None,
+            'consultas_sql': (base['consultas_sql'], item['consultas_sql']),
+        })
+    return diferencas
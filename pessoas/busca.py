@@ -0,0 +1,74 @@
+# pessoas/busca.py
+
+from django.db.models import Q
+
+from .models import User, Medicamento
+from .texto import normalizar_texto
+
+# Quantidade máxima de resultados devolvidos em uma busca por prefixo
+LIMITE_RESULTADOS = 20
+# Termos menores que isso casariam com boa parte da tabela
+TAMANHO_MINIMO_TERMO = 2
+
+
+def buscar_usuarios(termo, tipo_usuario, limite=LIMITE_RESULTADOS):
+    """
+    Busca usuários de um cargo pelo início do nome, sobrenome, usuário, e-mail ou RG.
+
+    Cada coluna é buscada por prefixo (LIKE 'termo%') num SELECT próprio, e os
+    SELECTs são unidos com UNION: assim cada um usa o índice da sua coluna, o
+    que um único WHERE com OR entre colunas de tabelas diferentes não permite.
+    O resultado é sempre limitado.
+    """
+    termo = (termo or '').strip()
+    if len(termo) < TAMANHO_MINIMO_TERMO:
+        return User.objects.none()
+
+    filtros = [
+        Q(username__istartswith=termo),
+        Q(first_name__istartswith=termo),
+        Q(last_name__istartswith=termo),
+        Q(email__istartswith=termo),
+        Q(perfil__rg__startswith=termo),
+    ]
+    # "Ana Sil" -> nome começando com "Ana" e sobrenome com "Sil"
+    nome, _, sobrenome = termo.partition(' ')
+    if sobrenome.strip():
+        filtros.append(Q(first_name__istartswith=nome, last_name__istartswith=sobrenome.strip()))
+
+    do_cargo = User.objects.filter(perfil__tipo_usuario=tipo_usuario)
+    buscas = [do_cargo.filter(filtro).values('pk', 'first_name', 'username') for filtro in filtros]
+    encontrados = buscas[0].union(*buscas[1:]).order_by('first_name', 'username')[:limite]
+    ids = [linha['pk'] for linha in encontrados]
+
+    return User.objects.filter(pk__in=ids).only(
+        'username', 'first_name', 'last_name', 'email'
+    ).order_by('first_name', 'username')
+
+
+def rotulo_usuario(usuario):
+    """Texto exibido para o usuário nas listas de sugestões."""
+    nome = usuario.get_full_name() or usuario.username
+    return f'{nome} ({usuario.email})' if usuario.email else nome
+
+
+def filtrar_medicamentos_por_nome(medicamentos, termo):
+    """
+    Filtra pelo início do nome, ignorando acentos e maiúsculas.
+
+    A comparação é feita na coluna indexada nome_busca, que guarda o nome já
+    normalizado, então "dipi" encontra "Dipirona Sódica" usando o índice.
+    """
+    termo = normalizar_texto(termo)
+    if not termo:
+        return medicamentos
+    return medicamentos.filter(nome_busca__startswith=termo)
+
+
+def buscar_medicamentos(termo, limite=LIMITE_RESULTADOS):
+    """Sugestões do catálogo (autocomplete): poucas colunas e resultado limitado."""
+    if len(normalizar_texto(termo)) < TAMANHO_MINIMO_TERMO:
+        return Medicamento.objects.none()
+    return filtrar_medicamentos_por_nome(Medicamento.objects.all(), termo).only(
+        'nome', 'valor', 'necessita_receita'
+    ).order_by('nome_busca')[:limite]
@@ -0,0 +1,145 @@
+# pessoas/busca_relatorios.py
+
+import re
+from collections import namedtuple
+
+from django.db import connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Consulta, ConsultaArquivada, RelatorioConsulta
+from .texto import normalizar_texto
+
+RESULTADOS_POR_PAGINA = 20
+# Termos menores são ignorados pelo FULLTEXT do MySQL (innodb_ft_min_token_size)
+TAMANHO_MINIMO_TERMO = 3
+TERMOS_MAXIMOS = 8
+TAMANHO_TRECHO = 240
+
+PaginaRelatorios = namedtuple('PaginaRelatorios', 'resultados numero tem_proxima')
+ResultadoRelatorio = namedtuple('ResultadoRelatorio', 'consulta trecho')
+
+_PALAVRA = re.compile(r'\w+')
+
+
+def termos_da_busca(busca):
+    """Palavras buscadas, sem acentos e repetições (as curtas demais ficam de fora)."""
+    termos = []
+    for palavra in _PALAVRA.findall(normalizar_texto(busca)):
+        if len(palavra) >= TAMANHO_MINIMO_TERMO and palavra not in termos:
+            termos.append(palavra)
+    return termos[:TERMOS_MAXIMOS]
+
+
+def _ids_mysql(cursor, escopo, termos, limite, deslocamento):
+    # BOOLEAN MODE: exige o escopo do médico e todos os termos (como prefixo)
+    busca = ' '.join([f'+{escopo}'] + [f'+{termo}*' for termo in termos])
+    cursor.execute(
+        'SELECT consulta_id FROM pessoas_relatorioconsulta '
+        'WHERE MATCH(texto, escopo) AGAINST (%s IN BOOLEAN MODE) '
+        'ORDER BY MATCH(texto, escopo) AGAINST (%s IN BOOLEAN MODE) DESC, consulta_id DESC '
+        'LIMIT %s OFFSET %s',
+        [busca, busca, limite, deslocamento],
+    )
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+def _ids_sqlite(cursor, escopo, termos, limite, deslocamento):
+    busca = ' AND '.join([f'escopo : "{escopo}"'] + [f'texto : "{termo}"*' for termo in termos])
+    cursor.execute(
+        'SELECT rowid FROM pessoas_relatorio_fts WHERE pessoas_relatorio_fts MATCH %s '
+        'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+        [busca, limite, deslocamento],
+    )
+    return [linha[0] for linha in cursor.fetchall()]
+
+
+_BUSCA_POR_BANCO = {'mysql': _ids_mysql, 'sqlite': _ids_sqlite}
+
+
+def _ids_sem_indice(medico_id, termos, limite, deslocamento):
+    # Outros bancos: sem índice de texto, dos mais novos para os mais antigos.
+    # Pelo escopo, e não pela consulta: os relatórios das arquivadas também entram
+    relatorios = RelatorioConsulta.objects.filter(escopo=RelatorioConsulta.escopo_do_medico(medico_id))
+    for termo in termos:
+        relatorios = relatorios.filter(texto__icontains=termo)
+    ids = relatorios.order_by('-consulta_id').values_list('consulta_id', flat=True)
+    return list(ids[deslocamento:deslocamento + limite])
+
+
+def buscar_relatorios(medico_id, busca, pagina=1, por_pagina=RESULTADOS_POR_PAGINA):
+    """
+    Busca nos relatórios das consultas do médico, arquivadas ou não, pelo
+    índice de texto completo, e devolve uma página de resultados ordenados
+    por relevância, cada um com o trecho do relatório que contém os termos.
+    """
+    termos = termos_da_busca(busca)
+    if not termos:
+        return PaginaRelatorios([], pagina, False)
+
+    banco = router.db_for_read(RelatorioConsulta)
+    conexao = connections[banco]
+    deslocamento = (pagina - 1) * por_pagina
+    # Um a mais que o tamanho da página indica se há próxima
+    buscar_ids = _BUSCA_POR_BANCO.get(conexao.vendor)
+    if buscar_ids:
+        with conexao.cursor() as cursor:
+            ids = buscar_ids(
+                cursor, RelatorioConsulta.escopo_do_medico(medico_id), termos, por_pagina + 1, deslocamento
+            )
+    else:
+        ids = _ids_sem_indice(medico_id, termos, por_pagina + 1, deslocamento)
+    tem_proxima = len(ids) > por_pagina
+    ids = ids[:por_pagina]
+
+    consultas = Consulta.objects.using(banco).filter(pk__in=ids, medico_id=medico_id).select_related(
+        'paciente', 'relatorio_consulta'
+    ).in_bulk()
+    textos = {pk: consulta.relatorio for pk, consulta in consultas.items()}
+    arquivadas = [pk for pk in ids if pk not in consultas]
+    if arquivadas:
+        # O texto vem do RelatorioConsulta, que o arquivamento mantém, sem descomprimir a cópia
+        consultas.update(
+            ConsultaArquivada.objects.using(banco).filter(pk__in=arquivadas, medico_id=medico_id)
+            .select_related('paciente').defer('relatorio_comprimido').in_bulk()
+        )
+        textos.update(
+            RelatorioConsulta.objects.using(banco).filter(consulta_id__in=arquivadas).values_list('consulta_id', 'texto')
+        )
+    resultados = [
+        ResultadoRelatorio(consultas[pk], trecho_destacado(textos[pk], termos))
+        for pk in ids if pk in consultas
+    ]
+    return PaginaRelatorios(resultados, pagina, tem_proxima)
+
+
+def trecho_destacado(texto, termos, tamanho=TAMANHO_TRECHO):
+    """
+    Trecho do texto em volta da primeira ocorrência dos termos, com as palavras
+    encontradas em <mark> (comparação sem acentos, por prefixo). HTML seguro.
+    """
+    texto = texto or ''
+    palavras = list(_PALAVRA.finditer(texto))
+    encontradas = [
+        palavra for palavra in palavras
+        if any(normalizar_texto(palavra.group()).startswith(termo) for termo in termos)
+    ]
+    inicio = 0
+    if encontradas and encontradas[0].start() > tamanho // 3:
+        inicio = encontradas[0].start() - tamanho // 3
+        # Começa numa palavra inteira
+        espaco = texto.find(' ', inicio)
+        inicio = espaco + 1 if 0 <= espaco < encontradas[0].start() else inicio
+    fim = min(inicio + tamanho, len(texto))
+
+    partes = ['…' if inicio > 0 else '']
+    posicao = inicio
+    for palavra in encontradas:
+        if palavra.start() < inicio or palavra.end() > fim:
+            continue
+        partes.append(escape(texto[posicao:palavra.start()]))
+        partes.append(f'<mark>{escape(palavra.group())}</mark>')
+        posicao = palavra.end()
+    partes.append(escape(texto[posicao:fim]))
+    partes.append('…' if fim < len(texto) else '')
+    return mark_safe(''.join(partes))
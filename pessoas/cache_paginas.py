@@ -0,0 +1,79 @@
+# pessoas/cache_paginas.py
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+# Tempo que uma página institucional fica no cache
+PAGINAS_PUBLICAS_TIMEOUT = 600
+
+
+def _variante(request):
+    """
+    Identifica a versão do cabeçalho que a página terá.
+
+    Visitantes anônimos compartilham a mesma versão. Para usuários logados o
+    cabeçalho mostra o nome e um formulário de logout com o token CSRF, então
+    a versão depende do usuário e do segredo CSRF (que muda a cada login).
+    """
+    if not request.user.is_authenticated:
+        return 'anonimo'
+    segredo_csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'usuario:{request.user.pk}:{hashlib.sha256(segredo_csrf.encode()).hexdigest()[:16]}'
+
+
+def pagina_publica_em_cache(view):
+    """
+    Decorator para páginas institucionais (sem dados além do cabeçalho).
+
+    O HTML renderizado é guardado no cache junto com ETag e Last-Modified;
+    requisições seguintes não passam pelo template e GETs condicionais
+    (If-None-Match / If-Modified-Since) recebem 304 sem corpo.
+    """
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        variante = _variante(request)
+        chave = f'pagina_publica:{request.path}:{variante}'
+        entrada = cache.get(chave)
+        if entrada is None:
+            resposta = view(request, *args, **kwargs)
+            if resposta.status_code != 200 or resposta.streaming:
+                return resposta
+            conteudo = resposta.content
+            entrada = {
+                'conteudo': conteudo,
+                'content_type': resposta['Content-Type'],
+                'etag': quote_etag(hashlib.md5(conteudo, usedforsecurity=False).hexdigest()),
+                'last_modified': int(time.time()),
+            }
+            cache.set(chave, entrada, PAGINAS_PUBLICAS_TIMEOUT)
+        else:
+            resposta = None
+
+        condicional = get_conditional_response(
+            request, etag=entrada['etag'], last_modified=entrada['last_modified']
+        )
+        if condicional is not None:
+            resposta = condicional
+        elif resposta is None:
+            resposta = HttpResponse(entrada['conteudo'], content_type=entrada['content_type'])
+
+        resposta['ETag'] = entrada['etag']
+        resposta['Last-Modified'] = http_date(entrada['last_modified'])
+        patch_vary_headers(resposta, ('Cookie',))
+        if variante == 'anonimo':
+            patch_cache_control(resposta, public=True, max_age=PAGINAS_PUBLICAS_TIMEOUT)
+        else:
+            patch_cache_control(resposta, private=True, max_age=0)
+        return resposta
+
+    return _view
@@ -0,0 +1,173 @@
+# pessoas/catalogo.py
+
+import csv
+import re
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Medicamento
+from .texto import normalizar_texto
+
+# Nomes consultados por vez no banco (limite do IN) e linhas por UPDATE em lote
+TAMANHO_LOTE_SINCRONIZACAO = 500
+
+VALORES_SIM = {'sim', 's', 'true', '1', 'x'}
+VALORES_NAO = {'nao', 'não', 'n', 'false', '0'}
+
+
+class RelatorioSincronizacao:
+    """
+    Resultado da comparação da tabela do fornecedor com o catálogo.
+    alteracoes: (nome, campo, valor anterior, valor novo) de cada campo alterado.
+    """
+
+    def __init__(self):
+        self.lidas = 0
+        self.alteracoes = []
+        self.medicamentos_alterados = 0
+        self.nao_encontrados = []
+        self.erros = []
+        self.aplicado = False
+
+
+# Formatos de preço aceitos; os demais (ex.: "1,234.56" ou "1.234") são ambíguos e recusados
+_FORMATOS_VALOR = (
+    (re.compile(r'\d+'), None),
+    (re.compile(r'\d+,\d{1,2}'), ','),
+    (re.compile(r'\d+\.\d{1,2}'), '.'),
+    (re.compile(r'\d{1,3}(\.\d{3})+,\d{1,2}'), ','),
+)
+# Maior valor que cabe em Medicamento.valor (max_digits/decimal_places)
+_CAMPO_VALOR = Medicamento._meta.get_field('valor')
+VALOR_MAXIMO = Decimal(10) ** (_CAMPO_VALOR.max_digits - _CAMPO_VALOR.decimal_places) - Decimal('0.01')
+
+
+def _valor(texto):
+    """
+    Aceita '12', '12.50', '12,50' e '1.234,56' (com ou sem 'R$'). Levanta
+    ValueError para formatos ambíguos, mais de duas casas decimais e valores
+    fora da faixa de Medicamento.valor.
+    """
+    texto = texto.replace('R$', '').strip()
+    for formato, separador_decimal in _FORMATOS_VALOR:
+        if formato.fullmatch(texto):
+            break
+    else:
+        raise ValueError(f"formato de valor não reconhecido: {texto!r}")
+    if separador_decimal == ',':
+        texto = texto.replace('.', '').replace(',', '.')
+    valor = Decimal(texto)
+    if valor < Decimal('0.01'):
+        raise ValueError("o valor deve ser de pelo menos R$ 0,01")
+    if valor > VALOR_MAXIMO:
+        raise ValueError(f"o valor passa do máximo de {VALOR_MAXIMO}")
+    return valor
+
+
+def _receita(texto):
+    texto = texto.strip().lower()
+    if not texto:
+        return None
+    if texto in VALORES_SIM:
+        return True
+    if texto in VALORES_NAO:
+        return False
+    raise ValueError
+
+
+def ler_tabela_precos(arquivo, relatorio):
+    """
+    Lê o CSV do fornecedor (colunas nome, valor e, opcional, necessita_receita;
+    separador ';' ou ',') e gera {nome normalizado: (nome, valor, necessita_receita)}.
+    Linhas inválidas vão para relatorio.erros.
+    """
+    cabecalho = arquivo.readline()
+    delimitador = ';' if cabecalho.count(';') >= cabecalho.count(',') else ','
+    colunas = [coluna.strip().lower() for coluna in next(csv.reader([cabecalho], delimiter=delimitador), [])]
+    if 'nome' not in colunas or 'valor' not in colunas:
+        raise ValueError("A tabela precisa de um cabeçalho com as colunas 'nome' e 'valor'.")
+
+    tabela = {}
+    for numero, linha in enumerate(csv.DictReader(arquivo, fieldnames=colunas, delimiter=delimitador), start=2):
+        relatorio.lidas += 1
+        nome = (linha.get('nome') or '').strip()
+        if not nome:
+            relatorio.erros.append((numero, "nome vazio"))
+            continue
+        try:
+            valor = _valor(linha.get('valor') or '')
+        except ValueError as erro:
+            relatorio.erros.append((numero, f"valor inválido para {nome}: {erro}"))
+            continue
+        try:
+            receita = _receita(linha.get('necessita_receita') or '')
+        except ValueError:
+            relatorio.erros.append((numero, f"necessita_receita inválido para {nome}: {linha.get('necessita_receita')}"))
+            continue
+        # A comparação com o catálogo ignora acentos e maiúsculas, como o
+        # collation do MySQL: "dipirona" e "Dipirona" são o mesmo medicamento
+        chave = normalizar_texto(nome)
+        if chave in tabela:
+            relatorio.erros.append((numero, f"{nome} aparece mais de uma vez na tabela"))
+            continue
+        tabela[chave] = (nome, valor, receita)
+    return tabela
+
+
+def _comparar(tabela, relatorio, tamanho_lote):
+    """
+    Busca no banco apenas os medicamentos citados na tabela (em lotes, pela
+    coluna indexada nome_busca, lendo só as colunas comparadas) e devolve os
+    que mudaram.
+    """
+    alterados = []
+    encontrados = set()
+    nomes = iter(tabela)
+    while True:
+        lote = list(islice(nomes, tamanho_lote))
+        if not lote:
+            break
+        atuais = Medicamento.objects.filter(nome_busca__in=lote).values_list(
+            'pk', 'nome', 'nome_busca', 'valor', 'necessita_receita'
+        )
+        for pk, nome, chave, valor_atual, receita_atual in atuais:
+            encontrados.add(chave)
+            _, valor, receita = tabela[chave]
+            medicamento = Medicamento(pk=pk, nome=nome, valor=valor_atual, necessita_receita=receita_atual)
+            mudou = False
+            if valor != valor_atual:
+                relatorio.alteracoes.append((nome, 'valor', valor_atual, valor))
+                medicamento.valor = valor
+                mudou = True
+            if receita is not None and receita != receita_atual:
+                relatorio.alteracoes.append((nome, 'necessita_receita', receita_atual, receita))
+                medicamento.necessita_receita = receita
+                mudou = True
+            if mudou:
+                alterados.append(medicamento)
+
+    relatorio.nao_encontrados = sorted(tabela[chave][0] for chave in set(tabela) - encontrados)
+    return alterados
+
+
+def sincronizar_precos(arquivo, aplicar=True, tamanho_lote=TAMANHO_LOTE_SINCRONIZACAO):
+    """
+    Compara a tabela de preços do fornecedor com o catálogo e grava apenas
+    valor / necessita_receita dos medicamentos que mudaram, com bulk_update
+    numa única transação. Medicamentos que não existem no catálogo não são
+    criados, só listados no relatório. Com aplicar=False só gera o relatório.
+    """
+    relatorio = RelatorioSincronizacao()
+    tabela = ler_tabela_precos(arquivo, relatorio)
+    alterados = _comparar(tabela, relatorio, tamanho_lote)
+    relatorio.medicamentos_alterados = len(alterados)
+
+    if aplicar and alterados:
+        # bulk_update não chama save() nem os signals: nome_busca e as
+        # miniaturas não dependem desses campos
+        with transaction.atomic():
+            Medicamento.objects.bulk_update(alterados, ['valor', 'necessita_receita'], batch_size=tamanho_lote)
+    relatorio.aplicado = aplicar
+    return relatorio
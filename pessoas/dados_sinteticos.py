@@ -0,0 +1,263 @@
+# pessoas/dados_sinteticos.py
+
+import math
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .estatisticas import invalidar_estatisticas_consultas
+from .models import Consulta, Medicamento, Perfil, RelatorioConsulta, User
+from .ocupacao import reconstruir_ocupacao
+from .texto import normalizar_texto
+
+# Usuários gerados se chamam "sint_<cargo>_<n>", para não colidir com os reais
+PREFIXO = 'sint'
+TAMANHO_LOTE_PADRAO = 5000
+# Agenda simulada: consultas de 30 minutos entre 8h e 18h, de segunda a sexta
+HORARIOS_DO_DIA = [time(8 + minutos // 60, minutos % 60) for minutos in range(0, 600, 30)]
+DIAS_FUTUROS = 60
+
+NOMES = [
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+    'Karina', 'Lucas', 'Mariana', 'Nicolas', 'Otávio', 'Patrícia', 'Rafael', 'Sofia', 'Thiago', 'Vitória',
+    'Amanda', 'Caio', 'Letícia', 'Mateus', 'Beatriz', 'Gustavo', 'Larissa', 'Pedro', 'Camila', 'Rodrigo',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+]
+RUAS = ['Rua das Flores', 'Avenida Brasil', 'Rua XV de Novembro', 'Rua São João', 'Avenida Paulista', 'Rua da Paz']
+PRINCIPIOS_ATIVOS = [
+    'Dipirona', 'Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Azitromicina', 'Losartana', 'Omeprazol',
+    'Metformina', 'Sinvastatina', 'Atenolol', 'Captopril', 'Loratadina', 'Dexametasona', 'Prednisona',
+    'Cefalexina', 'Clonazepam', 'Fluoxetina', 'Sertralina', 'Levotiroxina', 'Hidroclorotiazida',
+    'Ciprofloxacino', 'Diclofenaco', 'Nimesulida', 'Ranitidina', 'Enalapril', 'Anlodipino', 'Insulina',
+    'Salbutamol', 'Budesonida', 'Cetirizina',
+]
+DOSAGENS = ['5mg', '10mg', '20mg', '25mg', '40mg', '50mg', '100mg', '200mg', '250mg', '400mg', '500mg', '750mg']
+FORMAS = ['comprimido', 'cápsula', 'gotas', 'xarope', 'suspensão', 'pomada', 'injetável', 'spray', 'sachê', 'solução']
+LABORATORIOS = ['EMS', 'Medley', 'Eurofarma', 'Neo Química', 'Aché', 'Sanofi', 'Germed', 'Prati-Donaduzzi']
+TRECHOS_RELATORIO = [
+    'Paciente relata dor de cabeça recorrente.', 'Pressão arterial dentro do normal.',
+    'Solicitados exames de sangue de rotina.', 'Prescrito repouso e hidratação.',
+    'Retorno em 30 dias para reavaliação.', 'Sem alterações significativas no exame físico.',
+    'Paciente apresenta quadro gripal leve.', 'Encaminhado para avaliação com especialista.',
+    'Ajustada a dose da medicação de uso contínuo.', 'Orientações sobre alimentação e atividade física.',
+]
+
+
+def _lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def gerar_usuarios(tipo_usuario, quantidade, aleatorio, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Cria usuários de um cargo (com Perfil) em lotes e devolve os ids criados.
+    bulk_create não dispara o signal criar_perfil_usuario: os perfis também
+    são criados em lote.
+    """
+    prefixo = f'{PREFIXO}_{tipo_usuario}_'
+    inicio = User.objects.filter(username__startswith=prefixo).count()
+    senha_inutilizavel = make_password(None)
+    ids = []
+    for numeros in _lotes(range(inicio, inicio + quantidade), tamanho_lote):
+        usuarios = []
+        for numero in numeros:
+            nome, sobrenome = aleatorio.choice(NOMES), aleatorio.choice(SOBRENOMES)
+            usuarios.append(User(
+                username=f'{prefixo}{numero}',
+                first_name=nome,
+                last_name=sobrenome,
+                email=f'{normalizar_texto(nome)}.{normalizar_texto(sobrenome)}.{tipo_usuario}{numero}@exemplo.com',
+                password=senha_inutilizavel,
+            ))
+        User.objects.bulk_create(usuarios)
+        criados = list(User.objects.filter(username__in=[u.username for u in usuarios]).values_list('id', flat=True))
+        Perfil.objects.bulk_create([
+            Perfil(
+                usuario_id=usuario_id,
+                tipo_usuario=tipo_usuario,
+                rg=str(aleatorio.randrange(10_000_000, 99_999_999)),
+                data_nascimento=date(1940, 1, 1) + timedelta(days=aleatorio.randrange(365 * 65)),
+                endereco=f'{aleatorio.choice(RUAS)}, {aleatorio.randrange(1, 3000)}',
+            )
+            for usuario_id in criados
+        ])
+        ids.extend(criados)
+    return ids
+
+
+def _dias_uteis(primeiro, quantidade):
+    dia = primeiro
+    dias = []
+    while len(dias) < quantidade:
+        if dia.weekday() < 5:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+
+def _consultas_do_medico(medico_id, quantidade, dias, paciente_ids, hoje, aleatorio):
+    """
+    Consultas sem conflito de horário: sorteia horários distintos da agenda do
+    médico, fora dos que ele já tem no banco (de uma execução anterior, por
+    exemplo). Com a agenda cheia, gera menos que `quantidade`.
+    """
+    inicio = timezone.make_aware(datetime.combine(dias[0], time.min))
+    fim = timezone.make_aware(datetime.combine(dias[-1] + timedelta(days=1), time.min))
+    ocupados = set(
+        Consulta.objects.filter(medico_id=medico_id, data_hora__gte=inicio, data_hora__lt=fim)
+        .values_list('data_hora', flat=True)
+    )
+    horarios = [
+        timezone.make_aware(datetime.combine(dia, horario)) for dia in dias for horario in HORARIOS_DO_DIA
+    ]
+    livres = [data_hora for data_hora in horarios if data_hora not in ocupados]
+    for data_hora in aleatorio.sample(livres, min(quantidade, len(livres))):
+        dia = timezone.localtime(data_hora).date()
+        if dia < hoje:
+            status = 'concluida' if aleatorio.random() < 0.8 else 'cancelada'
+        else:
+            status = 'agendada' if aleatorio.random() < 0.9 else 'cancelada'
+        consulta = Consulta(
+            paciente_id=aleatorio.choice(paciente_ids),
+            medico_id=medico_id,
+            data_hora=data_hora,
+            status=status,
+        )
+        if status == 'concluida':
+            consulta.texto_relatorio = ' '.join(aleatorio.sample(TRECHOS_RELATORIO, 3))
+        yield consulta
+
+
+def _criar_relatorios(consultas):
+    """Relatórios das consultas concluídas de um lote recém-criado."""
+    com_relatorio = [consulta for consulta in consultas if hasattr(consulta, 'texto_relatorio')]
+    if not com_relatorio:
+        return
+    if com_relatorio[0].pk is None:
+        # O MySQL não devolve os ids no bulk_create: busca pelo médico e horário,
+        # únicos no banco porque _consultas_do_medico pula os horários já ocupados
+        ids = dict(
+            ((medico_id, data_hora), pk) for pk, medico_id, data_hora in Consulta.objects.filter(
+                medico_id__in={consulta.medico_id for consulta in com_relatorio},
+                data_hora__in={consulta.data_hora for consulta in com_relatorio},
+            ).values_list('pk', 'medico_id', 'data_hora')
+        )
+        for consulta in com_relatorio:
+            consulta.pk = ids[consulta.medico_id, consulta.data_hora]
+    RelatorioConsulta.objects.bulk_create([
+        RelatorioConsulta(
+            consulta_id=consulta.pk,
+            texto=consulta.texto_relatorio,
+            escopo=RelatorioConsulta.escopo_do_medico(consulta.medico_id),
+        )
+        for consulta in com_relatorio
+    ])
+
+
+def gerar_consultas(quantidade, medico_ids, paciente_ids, aleatorio,
+                    tamanho_lote=TAMANHO_LOTE_PADRAO, progresso=None):
+    """
+    Distribui as consultas entre os médicos, do passado até DIAS_FUTUROS à
+    frente. O período é o necessário para cada médico ter a agenda ~2/3 cheia.
+    """
+    if not quantidade or not medico_ids or not paciente_ids:
+        return 0
+    por_medico = math.ceil(quantidade / len(medico_ids))
+    dias_necessarios = max(math.ceil(por_medico * 1.5 / len(HORARIOS_DO_DIA)), 20)
+    hoje = timezone.localdate()
+    # Começa no passado o suficiente para que os dias úteis terminem ~DIAS_FUTUROS à frente
+    primeiro = hoje - timedelta(days=math.ceil(dias_necessarios * 7 / 5) - DIAS_FUTUROS)
+    dias = _dias_uteis(primeiro, dias_necessarios)
+
+    def todas():
+        restantes = quantidade
+        for medico_id in medico_ids:
+            quantas = min(por_medico, restantes)
+            if quantas <= 0:
+                return
+            restantes -= quantas
+            yield from _consultas_do_medico(medico_id, quantas, dias, paciente_ids, hoje, aleatorio)
+
+    criadas = 0
+    for lote in _lotes(todas(), tamanho_lote):
+        # bulk_create não passa pelos signals: o resumo de ocupação é reconstruído no fim
+        Consulta.objects.bulk_create(lote)
+        _criar_relatorios(lote)
+        criadas += len(lote)
+        if progresso:
+            progresso('consultas', criadas, quantidade)
+    return criadas
+
+
+def gerar_medicamentos(quantidade, aleatorio, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Cria medicamentos com nomes únicos (princípio ativo, dosagem, forma e laboratório)."""
+    combinacoes = [
+        f'{principio} {dosagem} {forma} ({laboratorio})'
+        for principio in PRINCIPIOS_ATIVOS
+        for dosagem in DOSAGENS
+        for forma in FORMAS
+        for laboratorio in LABORATORIOS
+    ]
+    aleatorio.shuffle(combinacoes)
+    nomes = combinacoes[:quantidade]
+    # Acima do número de combinações, numera os nomes
+    nomes += [f'{aleatorio.choice(PRINCIPIOS_ATIVOS)} genérico {numero}' for numero in range(quantidade - len(nomes))]
+
+    criados = 0
+    for lote in _lotes(nomes, tamanho_lote):
+        # bulk_create não chama save(): nome_busca é preenchido aqui
+        Medicamento.objects.bulk_create([
+            Medicamento(
+                nome=nome,
+                nome_busca=normalizar_texto(nome),
+                valor=Decimal(aleatorio.randrange(500, 30000)) / 100,
+                necessita_receita=aleatorio.random() < 0.4,
+            )
+            for nome in lote
+        ], ignore_conflicts=True)
+        criados += len(lote)
+    return criados
+
+
+def gerar_dados(pacientes=0, medicos=0, atendentes=0, consultas=0, medicamentos=0,
+                tamanho_lote=TAMANHO_LOTE_PADRAO, semente=None, progresso=None):
+    """
+    Popula o banco com dados sintéticos para testes de carga.
+    As consultas usam todos os médicos e pacientes existentes (gerados ou não).
+    Retorna um dicionário com o que foi criado.
+    """
+    aleatorio = random.Random(semente)
+    criados = {}
+
+    def etapa(nome, quantidade, funcao):
+        criados[nome] = funcao()
+        if progresso:
+            progresso(nome, len(criados[nome]) if isinstance(criados[nome], list) else criados[nome], quantidade)
+
+    etapa('medicos', medicos, lambda: gerar_usuarios('medico', medicos, aleatorio, tamanho_lote))
+    etapa('pacientes', pacientes, lambda: gerar_usuarios('paciente', pacientes, aleatorio, tamanho_lote))
+    etapa('atendentes', atendentes, lambda: gerar_usuarios('atendente', atendentes, aleatorio, tamanho_lote))
+    etapa('medicamentos', medicamentos, lambda: gerar_medicamentos(medicamentos, aleatorio, tamanho_lote))
+
+    if consultas:
+        medico_ids = list(Perfil.objects.filter(tipo_usuario='medico').values_list('usuario_id', flat=True))
+        paciente_ids = list(Perfil.objects.filter(tipo_usuario='paciente').values_list('usuario_id', flat=True))
+        criados['consultas'] = gerar_consultas(
+            consultas, medico_ids, paciente_ids, aleatorio, tamanho_lote, progresso
+        )
+        reconstruir_ocupacao()
+        invalidar_estatisticas_consultas()
+
+    return {nome: len(valor) if isinstance(valor, list) else valor for nome, valor in criados.items()}
@@ -0,0 +1,160 @@
+# pessoas/disponibilidade.py
+
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.utils import timezone
+
+from .models import Consulta, Perfil
+
+# Intervalo máximo aceito na busca de horários livres
+MAX_DIAS_BUSCA = 31
+# Limite para a duração de uma consulta: ela cabe no expediente de um dia
+# (AgendaMedicoForm). Só as que começam até esse tempo antes podem sobrepor
+DURACAO_MAXIMA = timedelta(days=1)
+
+
+class HorarioIndisponivel(ValidationError):
+    """O horário pedido está fora do expediente ou conflita com outra consulta."""
+
+
+class AgendaMedico:
+    """Configuração de agenda de um médico (duração da consulta e expediente)."""
+
+    def __init__(self, duracao_consulta, inicio_expediente, fim_expediente):
+        self.duracao = timedelta(minutes=duracao_consulta)
+        self.inicio_expediente = inicio_expediente
+        self.fim_expediente = fim_expediente
+
+    @classmethod
+    def do_medico(cls, medico, bloquear=False):
+        """
+        Lê a agenda do perfil do médico. Com bloquear=True a linha do perfil fica
+        travada (SELECT ... FOR UPDATE) até o fim da transação, o que serializa
+        os agendamentos concorrentes para o mesmo médico.
+        """
+        perfis = Perfil.objects.filter(usuario=medico)
+        if bloquear:
+            perfis = perfis.select_for_update()
+        valores = perfis.values('duracao_consulta', 'inicio_expediente', 'fim_expediente').first()
+        if valores is None:
+            # Sem perfil: usa os valores padrão do modelo
+            padrao = Perfil()
+            return cls(padrao.duracao_consulta, padrao.inicio_expediente, padrao.fim_expediente)
+        return cls(**valores)
+
+    def dentro_do_expediente(self, data_hora):
+        local = timezone.localtime(data_hora)
+        inicio = datetime.combine(local.date(), self.inicio_expediente)
+        fim = datetime.combine(local.date(), self.fim_expediente)
+        local = local.replace(tzinfo=None)
+        return inicio <= local and local + self.duracao <= fim
+
+
+def consultas_conflitantes(medico, data_hora, duracao, ignorar_id=None):
+    """
+    Consultas não canceladas do médico que se sobrepõem ao horário pedido,
+    cada uma com a própria duração (inicio < fim pedido e fim > inicio pedido).
+
+    A faixa em (medico, data_hora), atendida pelo índice
+    consulta_medico_data_idx, limita as candidatas às que começam até
+    DURACAO_MAXIMA antes; o fim de cada uma é comparado em seguida.
+    """
+    conflitos = Consulta.objects.alias(
+        fim=ExpressionWrapper(F('data_hora') + F('duracao'), output_field=DateTimeField()),
+    ).filter(
+        medico=medico,
+        data_hora__gt=data_hora - DURACAO_MAXIMA,
+        data_hora__lt=data_hora + duracao,
+        fim__gt=data_hora,
+    ).exclude(status='cancelada')
+    if ignorar_id:
+        conflitos = conflitos.exclude(pk=ignorar_id)
+    return conflitos
+
+
+def validar_horario(medico, data_hora, ignorar_id=None, agenda=None):
+    """Levanta HorarioIndisponivel se a consulta não puder ser marcada nesse horário."""
+    agenda = agenda or AgendaMedico.do_medico(medico)
+    if data_hora < timezone.now():
+        raise HorarioIndisponivel("Não é possível agendar uma consulta no passado.")
+    if not agenda.dentro_do_expediente(data_hora):
+        raise HorarioIndisponivel(
+            "Horário fora do expediente do médico (%(inicio)s às %(fim)s).",
+            params={
+                'inicio': agenda.inicio_expediente.strftime('%H:%M'),
+                'fim': agenda.fim_expediente.strftime('%H:%M'),
+            },
+        )
+    if consultas_conflitantes(medico, data_hora, agenda.duracao, ignorar_id).exists():
+        raise HorarioIndisponivel("O médico já tem uma consulta nesse horário.")
+
+
+def reservar_horario(consulta):
+    """
+    Salva a consulta garantindo que o horário continua livre.
+
+    A verificação e o INSERT acontecem na mesma transação, com o perfil do
+    médico travado, então duas requisições disputando o mesmo horário não
+    conseguem gravar as duas consultas.
+    """
+    with transaction.atomic():
+        agenda = AgendaMedico.do_medico(consulta.medico_id, bloquear=True)
+        validar_horario(consulta.medico_id, consulta.data_hora, ignorar_id=consulta.pk, agenda=agenda)
+        consulta.duracao = agenda.duracao
+        consulta.save()
+    return consulta
+
+
+def _blocos_ocupados(consultas):
+    """
+    Junta os intervalos (inicio, duracao), ordenados pelo início, em blocos
+    disjuntos. Devolve (inícios, fins): as duas listas ficam ordenadas.
+    """
+    inicios, fins = [], []
+    for inicio, duracao in consultas:
+        fim = inicio + duracao
+        if fins and inicio <= fins[-1]:
+            fins[-1] = max(fins[-1], fim)
+        else:
+            inicios.append(inicio)
+            fins.append(fim)
+    return inicios, fins
+
+
+def _sobrepoe(horario, duracao, inicios, fins):
+    # O último bloco que começa antes do fim do horário é o que termina mais tarde
+    posicao = bisect_left(inicios, horario + duracao)
+    return posicao > 0 and fins[posicao - 1] > horario
+
+
+def horarios_livres(medico, data_inicio, data_fim):
+    """
+    Lista os horários livres do médico entre data_inicio e data_fim (inclusive).
+
+    Só as datas/horas das consultas do próprio intervalo são lidas do banco.
+    """
+    agenda = AgendaMedico.do_medico(medico)
+    inicio = timezone.make_aware(datetime.combine(data_inicio, agenda.inicio_expediente))
+    fim = timezone.make_aware(datetime.combine(data_fim, agenda.fim_expediente))
+    inicios, fins = _blocos_ocupados(
+        Consulta.objects.filter(
+            medico=medico, data_hora__gt=inicio - DURACAO_MAXIMA, data_hora__lt=fim
+        ).exclude(status='cancelada').order_by('data_hora').values_list('data_hora', 'duracao')
+    )
+
+    agora = timezone.now()
+    livres = []
+    dia = data_inicio
+    while dia <= data_fim:
+        horario = timezone.make_aware(datetime.combine(dia, agenda.inicio_expediente))
+        fim_dia = timezone.make_aware(datetime.combine(dia, agenda.fim_expediente))
+        while horario + agenda.duracao <= fim_dia:
+            if horario >= agora and not _sobrepoe(horario, agenda.duracao, inicios, fins):
+                livres.append(horario)
+            horario += agenda.duracao
+        dia += timedelta(days=1)
+    return livres
@@ -0,0 +1,90 @@
+# pessoas/estatisticas.py
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .limite_login import BACKENDS_POR_PROCESSO
+from .models import OcupacaoDiaria
+
+# Tempo máximo no cache; os signals de Consulta invalidam antes disso
+ESTATISTICAS_TIMEOUT = 300
+# Com um cache por processo (LocMem, o padrão do settings), a invalidação só
+# vale no worker que gravou: nos outros as estatísticas antigas ficam até
+# expirar, então o tempo é curto. Em produção, use um cache compartilhado
+ESTATISTICAS_TIMEOUT_POR_PROCESSO = 30
+
+
+def _chave_cache(hoje):
+    # A data faz parte da chave porque "atendimentos de hoje" muda à meia-noite
+    return f'estatisticas_consultas:{hoje.isoformat()}'
+
+
+def timeout_estatisticas():
+    """Segundos no cache: ESTATISTICAS_TIMEOUT só se o cache padrão for compartilhado."""
+    if settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND'] in BACKENDS_POR_PROCESSO:
+        return ESTATISTICAS_TIMEOUT_POR_PROCESSO
+    return ESTATISTICAS_TIMEOUT
+
+
+def calcular_estatisticas_consultas(hoje=None):
+    """
+    Calcula as estatísticas do dashboard de consultas em um único SELECT.
+
+    A leitura é feita no resumo OcupacaoDiaria (não na tabela de consultas),
+    com agregação condicional agrupada por médico; os totais gerais são a soma
+    das linhas e o profissional mais ocupado é a linha com mais consultas agendadas.
+
+    Lê sempre do banco principal, mesmo sob @ler_da_replica: o resultado fica
+    ESTATISTICAS_TIMEOUT segundos no cache, e logo depois da invalidação a
+    réplica atrasada ainda teria os totais de antes da escrita.
+    """
+    hoje = hoje or timezone.localdate()
+
+    linhas = OcupacaoDiaria.objects.using(DEFAULT_DB_ALIAS).order_by().values(
+        'medico', 'medico__first_name', 'medico__last_name'
+    ).annotate(
+        consultas=Sum('total'),
+        concluidas=Sum('total', filter=Q(status='concluida'), default=0),
+        agendadas=Sum('total', filter=Q(status='agendada'), default=0),
+        canceladas=Sum('total', filter=Q(status='cancelada'), default=0),
+        hoje=Sum('total', filter=Q(data=hoje), default=0),
+    )
+
+    estatisticas = {
+        'total_consultas': 0,
+        'consultas_realizadas': 0,
+        'consultas_agendadas': 0,
+        'consultas_canceladas': 0,
+        'max_atendimentos_dia': 0,
+        'profissional_nome': 'N/A',
+    }
+    mais_agendadas = 0
+    for linha in linhas:
+        estatisticas['total_consultas'] += linha['consultas']
+        estatisticas['consultas_realizadas'] += linha['concluidas']
+        estatisticas['consultas_agendadas'] += linha['agendadas']
+        estatisticas['consultas_canceladas'] += linha['canceladas']
+        estatisticas['max_atendimentos_dia'] += linha['hoje']
+        if linha['agendadas'] > mais_agendadas:
+            mais_agendadas = linha['agendadas']
+            estatisticas['profissional_nome'] = f"{linha['medico__first_name']} {linha['medico__last_name']}"
+    return estatisticas
+
+
+def obter_estatisticas_consultas():
+    """Retorna as estatísticas do cache, calculando-as apenas quando necessário."""
+    hoje = timezone.localdate()
+    chave = _chave_cache(hoje)
+    estatisticas = cache.get(chave)
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas_consultas(hoje)
+        cache.set(chave, estatisticas, timeout_estatisticas())
+    return estatisticas
+
+
+def invalidar_estatisticas_consultas():
+    """Descarta as estatísticas em cache (chamado quando uma Consulta muda)."""
+    cache.delete(_chave_cache(timezone.localdate()))
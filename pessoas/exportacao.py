@@ -0,0 +1,165 @@
+# pessoas/exportacao.py
+
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .paginacao import paginar_por_cursor
+
+# Consultas lidas do banco por vez durante a exportação
+TAMANHO_LOTE_EXPORTACAO = 2000
+
+CABECALHO = ['ID', 'Data e hora', 'Status', 'Paciente', 'E-mail do paciente', 'Médico']
+
+
+def _nome(usuario):
+    return usuario.get_full_name() or usuario.username
+
+
+def linhas_consultas(consultas, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Gera as linhas da exportação (cabeçalho incluído), lendo as consultas em lotes.
+
+    Os lotes usam a paginação por (data_hora, id): cada SELECT traz no máximo
+    tamanho_lote linhas, então a memória usada não depende do período exportado
+    (o MySQL não tem cursores do lado do servidor no Django).
+    """
+    consultas = consultas.select_related('paciente', 'medico').only(
+        'data_hora', 'status',
+        'paciente__username', 'paciente__first_name', 'paciente__last_name', 'paciente__email',
+        'medico__username', 'medico__first_name', 'medico__last_name',
+    )
+    yield CABECALHO
+    cursor = None
+    while True:
+        pagina = paginar_por_cursor(consultas, cursor, tamanho=tamanho_lote)
+        for consulta in pagina:
+            yield [
+                str(consulta.pk),
+                timezone.localtime(consulta.data_hora).strftime('%d/%m/%Y %H:%M'),
+                consulta.get_status_display(),
+                _nome(consulta.paciente),
+                consulta.paciente.email,
+                _nome(consulta.medico),
+            ]
+        if not pagina.tem_proxima:
+            break
+        cursor = pagina.proximo_cursor
+
+
+class _Eco:
+    """Arquivo falso: write() devolve o texto em vez de guardá-lo (usado com csv.writer)."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas):
+    """Transforma as linhas em pedaços de CSV, um por linha, prontos para streaming."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    # BOM para o Excel reconhecer o arquivo como UTF-8
+    yield '\ufeff'
+    for linha in linhas:
+        yield escritor.writerow(linha)
+
+
+class _BufferZip:
+    """
+    Destino de escrita do zipfile que acumula os bytes até serem consumidos.
+    Não tem seek(), então o zipfile grava em modo streaming (data descriptors).
+    """
+
+    def __init__(self):
+        self.pedacos = []
+        self.posicao = 0
+
+    def write(self, dados):
+        self.pedacos.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def consumir(self):
+        dados = b''.join(self.pedacos)
+        self.pedacos = []
+        return dados
+
+
+_XLSX_ARQUIVOS_FIXOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Consultas" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _linha_xlsx(numero, valores):
+    celulas = ''.join(
+        f'<c t="inlineStr"><is><t>{escape(valor)}</t></is></c>' for valor in valores
+    )
+    return f'<row r="{numero}">{celulas}</row>'
+
+
+def gerar_xlsx(linhas, linhas_por_pedaco=500):
+    """
+    Monta uma planilha XLSX (SpreadsheetML mínimo, sem dependências externas)
+    e a entrega em pedaços enquanto as linhas são geradas.
+    """
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in _XLSX_ARQUIVOS_FIXOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        yield buffer.consumir()
+
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            pendentes = []
+            for numero, valores in enumerate(linhas, start=1):
+                pendentes.append(_linha_xlsx(numero, valores))
+                if len(pendentes) >= linhas_por_pedaco:
+                    planilha.write(''.join(pendentes).encode())
+                    pendentes = []
+                    yield buffer.consumir()
+            planilha.write(''.join(pendentes).encode())
+            planilha.write(b'</sheetData></worksheet>')
+    yield buffer.consumir()
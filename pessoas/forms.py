@@ -1,8 +1,15 @@
 # pessoas/forms.py
 
+from datetime import datetime, time, timedelta
+
 from django import forms
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import Medicamento, Perfil, Consulta
+from .busca import filtrar_medicamentos_por_nome, rotulo_usuario
+from .disponibilidade import validar_horario, HorarioIndisponivel
+from .server_timing import cronometro
 from django.contrib.auth import authenticate
 
 class LoginUsuarioForm(forms.Form):
@@ -26,7 +33,9 @@ class LoginUsuarioForm(forms.Form):
         password = cleaned_data.get('password')
 
         if username and password:
-            user = authenticate(username=username, password=password)
+            # O hash da senha é lento de propósito; aparece como "auth" no Server-Timing
+            with cronometro('auth'):
+                user = authenticate(username=username, password=password)
             if user is None:
                 raise forms.ValidationError("Nome de usuário ou senha incorretos.")
             cleaned_data['user'] = user
@@ -105,8 +114,55 @@ class PerfilForm(forms.ModelForm):
             'data_nascimento': forms.DateInput(attrs={'type': 'date'}),
         }
 
+# Campo de busca (typeahead) de usuários, usado no lugar de um <select> com a tabela inteira.
+# As sugestões vêm da view buscar_usuarios; o id escolhido vai em um campo oculto.
+class BuscaUsuarioWidget(forms.Widget):
+    template_name = "pessoas/widgets/busca_usuario.html"
+
+    class Media:
+        js = ["script/busca_usuario.js"]
+
+    def __init__(self, tipo_usuario, attrs=None):
+        super().__init__(attrs)
+        self.tipo_usuario = tipo_usuario
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["url_busca"] = f'{reverse("buscar_usuarios")}?tipo={self.tipo_usuario}'
+        # Ao reexibir o formulário, mostra o nome do usuário já escolhido
+        rotulo = ""
+        if value not in (None, ""):
+            usuario = User.objects.filter(pk=value).only("username", "first_name", "last_name", "email").first() if str(value).isdigit() else None
+            if usuario:
+                rotulo = rotulo_usuario(usuario)
+        context["widget"]["rotulo"] = rotulo
+        return context
+
+# Validação de horário compartilhada pelos formulários de agendamento
+class ValidarHorarioMixin:
+    def clean(self):
+        cleaned_data = super().clean()
+        medico = cleaned_data.get("medico")
+        data_hora = cleaned_data.get("data_hora")
+        if medico and data_hora:
+            try:
+                validar_horario(medico, data_hora, ignorar_id=self.instance.pk)
+            except HorarioIndisponivel as erro:
+                self.add_error("data_hora", erro)
+        return cleaned_data
+
+def carregar_escolhas(campo):
+    """
+    Lê as opções de um ModelChoiceField. Atribuídas a campo.choices, o campo
+    é renderizado sem consultar o banco de novo (views assíncronas carregam as
+    opções junto com as outras consultas da página).
+    """
+    escolhas = [("", campo.empty_label)] if campo.empty_label is not None else []
+    escolhas += [(campo.prepare_value(objeto), campo.label_from_instance(objeto)) for objeto in campo.queryset]
+    return escolhas
+
 # Formulário para agendar uma nova consulta (para o paciente)
-class AgendarConsultaForm(forms.ModelForm):
+class AgendarConsultaForm(ValidarHorarioMixin, forms.ModelForm):
     # O campo "medico" será um dropdown com todos os usuários que são médicos
     medico = forms.ModelChoiceField(queryset=User.objects.filter(perfil__tipo_usuario="medico"))
     data_hora = forms.DateTimeField(widget=forms.DateTimeInput(attrs={"type": "datetime-local"}))
@@ -116,15 +172,17 @@ class AgendarConsultaForm(forms.ModelForm):
         fields = ["medico", "data_hora"]
 
 # Formulário para agendar uma nova consulta (para o atendente)
-class AgendarConsultaAtendenteForm(forms.ModelForm):
+class AgendarConsultaAtendenteForm(ValidarHorarioMixin, forms.ModelForm):
     # O atendente precisa selecionar o paciente
     paciente = forms.ModelChoiceField(
         queryset=User.objects.filter(perfil__tipo_usuario="paciente"),
+        widget=BuscaUsuarioWidget("paciente"),
         label="Paciente"
     )
     # O atendente precisa selecionar o médico
     medico = forms.ModelChoiceField(
         queryset=User.objects.filter(perfil__tipo_usuario="medico"),
+        widget=BuscaUsuarioWidget("medico"),
         label="Médico"
     )
     data_hora = forms.DateTimeField(
@@ -136,14 +194,119 @@ class AgendarConsultaAtendenteForm(forms.ModelForm):
         model = Consulta
         fields = ["paciente", "medico", "data_hora"]
 
-# Formulário para o médico escrever o relatório
-class RelatorioConsultaForm(forms.ModelForm):
+# Filtros (via GET) da lista de consultas do painel do atendente
+class FiltroConsultasForm(forms.Form):
+    data_inicio = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+        label="De"
+    )
+    data_fim = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+        label="Até"
+    )
+    medico = forms.ModelChoiceField(
+        queryset=User.objects.filter(perfil__tipo_usuario="medico").order_by("first_name"),
+        required=False,
+        label="Médico"
+    )
+    status = forms.ChoiceField(
+        choices=(("", "Todos"),) + Consulta.STATUS_CHOICES,
+        required=False,
+        label="Status"
+    )
+
+    def filtrar(self, consultas):
+        """Aplica os filtros preenchidos ao queryset de consultas."""
+        dados = self.cleaned_data
+        # Compara com o início de cada dia (e não com data_hora__date) para aproveitar o índice
+        if dados.get("data_inicio"):
+            inicio = datetime.combine(dados["data_inicio"], time.min)
+            consultas = consultas.filter(data_hora__gte=timezone.make_aware(inicio))
+        if dados.get("data_fim"):
+            fim = datetime.combine(dados["data_fim"] + timedelta(days=1), time.min)
+            consultas = consultas.filter(data_hora__lt=timezone.make_aware(fim))
+        if dados.get("medico"):
+            consultas = consultas.filter(medico=dados["medico"])
+        if dados.get("status"):
+            consultas = consultas.filter(status=dados["status"])
+        return consultas
+
+# Busca e filtros (via GET) do catálogo de medicamentos
+class FiltroMedicamentosForm(forms.Form):
+    RECEITA_CHOICES = (
+        ("", "Todos"),
+        ("sim", "Com receita"),
+        ("nao", "Sem receita"),
+    )
+    q = forms.CharField(
+        required=False,
+        max_length=200,
+        widget=forms.TextInput(attrs={"placeholder": "Buscar medicamento", "class": "form-control"}),
+        label="Nome"
+    )
+    necessita_receita = forms.ChoiceField(choices=RECEITA_CHOICES, required=False, label="Receita")
+    valor_min = forms.DecimalField(required=False, min_value=0, decimal_places=2, label="Valor mínimo")
+    valor_max = forms.DecimalField(required=False, min_value=0, decimal_places=2, label="Valor máximo")
+
+    def filtrar(self, medicamentos):
+        """Aplica a busca e os filtros preenchidos ao queryset de medicamentos."""
+        dados = self.cleaned_data
+        if dados.get("q"):
+            medicamentos = filtrar_medicamentos_por_nome(medicamentos, dados["q"])
+        if dados.get("necessita_receita"):
+            medicamentos = medicamentos.filter(necessita_receita=dados["necessita_receita"] == "sim")
+        if dados.get("valor_min") is not None:
+            medicamentos = medicamentos.filter(valor__gte=dados["valor_min"])
+        if dados.get("valor_max") is not None:
+            medicamentos = medicamentos.filter(valor__lte=dados["valor_max"])
+        return medicamentos
+
+# Upload da tabela de preços do fornecedor (dashboard de produtos)
+class SincronizarPrecosForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Tabela do fornecedor (CSV)",
+        help_text="Colunas: nome, valor e, opcional, necessita_receita (sim/não).",
+    )
+    simular = forms.BooleanField(required=False, label="Apenas simular (não gravar)")
+
+# Formulário para o médico escrever o relatório (gravado com salvar_relatorio)
+class RelatorioConsultaForm(forms.Form):
+    relatorio = forms.CharField(required=False, widget=forms.Textarea(attrs={"rows": 5}))
+    # Versão do relatório que o médico abriu para editar (0 se ainda não havia relatório)
+    versao = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput)
+
+# Expediente e duração das consultas, editados pelo próprio médico no painel
+class AgendaMedicoForm(forms.ModelForm):
     class Meta:
-        model = Consulta
-        fields = ["relatorio"]
+        model = Perfil
+        fields = ["duracao_consulta", "inicio_expediente", "fim_expediente"]
         widgets = {
-            "relatorio": forms.Textarea(attrs={"rows": 5}),
+            "inicio_expediente": forms.TimeInput(attrs={"type": "time"}, format="%H:%M"),
+            "fim_expediente": forms.TimeInput(attrs={"type": "time"}, format="%H:%M"),
         }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        duracao = cleaned_data.get("duracao_consulta")
+        inicio = cleaned_data.get("inicio_expediente")
+        fim = cleaned_data.get("fim_expediente")
+        if duracao == 0:
+            self.add_error("duracao_consulta", "A duração deve ser de pelo menos um minuto.")
+        elif duracao and inicio and fim:
+            dia = timezone.localdate()
+            if datetime.combine(dia, inicio) + timedelta(minutes=duracao) > datetime.combine(dia, fim):
+                raise forms.ValidationError("O expediente precisa comportar pelo menos uma consulta.")
+        return cleaned_data
+
+# Busca do médico nos relatórios das suas consultas
+class BuscaRelatoriosForm(forms.Form):
+    q = forms.CharField(
+        required=False, max_length=200, label="Buscar nos relatórios",
+        widget=forms.TextInput(attrs={"placeholder": "Ex.: pressão arterial"}),
+    )
+
 class MedicamentoForm(forms.ModelForm):
     class Meta:
         model = Medicamento
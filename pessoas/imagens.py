@@ -0,0 +1,111 @@
+# pessoas/imagens.py
+
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Larguras geradas para cada foto: 1x e 2x da exibição no catálogo (100px)
+LARGURAS_MINIATURA = (100, 200)
+# Formato -> (extensão, opções do Pillow)
+FORMATOS_MINIATURA = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 6}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+
+def caminho_miniatura(nome_foto, largura, formato):
+    """
+    'medicamentos/caixa.png' -> 'medicamentos/miniaturas/caixa_png_100.webp'
+
+    A extensão original faz parte do nome, senão caixa.png e caixa.jpg
+    gravariam as mesmas miniaturas.
+    """
+    pasta, arquivo = posixpath.split(nome_foto)
+    base, extensao_original = posixpath.splitext(arquivo)
+    if extensao_original:
+        base = f'{base}_{extensao_original[1:]}'
+    extensao = FORMATOS_MINIATURA[formato][0]
+    return posixpath.join(pasta, 'miniaturas', f'{base}_{largura}.{extensao}')
+
+
+def _preparar(imagem, formato):
+    # JPEG não tem transparência: aplica a imagem sobre um fundo branco
+    if formato == 'jpeg' and imagem.mode in ('RGBA', 'LA', 'P'):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    if imagem.mode not in ('RGB', 'RGBA'):
+        return imagem.convert('RGB')
+    return imagem
+
+
+def gerar_miniaturas(campo_foto):
+    """
+    Gera as miniaturas (WebP e JPEG, em cada largura) de um ImageField
+    e as grava no mesmo storage da foto original. Retorna os caminhos gerados.
+    """
+    storage = campo_foto.storage
+    with storage.open(campo_foto.name, 'rb') as arquivo:
+        original = Image.open(arquivo)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    gerados = []
+    for largura in LARGURAS_MINIATURA:
+        miniatura = original.copy()
+        # Mantém a proporção dentro de um quadrado largura x largura
+        miniatura.thumbnail((largura, largura), Image.Resampling.LANCZOS)
+        for formato, (_, opcoes) in FORMATOS_MINIATURA.items():
+            buffer = BytesIO()
+            _preparar(miniatura, formato).save(buffer, **opcoes)
+            caminho = caminho_miniatura(campo_foto.name, largura, formato)
+            # Sobrescreve em vez de deixar o storage criar "nome_abc123.webp"
+            if storage.exists(caminho):
+                storage.delete(caminho)
+            gerados.append(storage.save(caminho, ContentFile(buffer.getvalue())))
+    return gerados
+
+
+def remover_miniaturas(storage, nome_foto):
+    """Apaga do storage as miniaturas geradas para a foto."""
+    for largura in LARGURAS_MINIATURA:
+        for formato in FORMATOS_MINIATURA:
+            caminho = caminho_miniatura(nome_foto, largura, formato)
+            if storage.exists(caminho):
+                storage.delete(caminho)
+
+
+def atualizar_miniaturas_medicamento(medicamento):
+    """
+    Deixa as miniaturas do medicamento de acordo com a foto atual: gera as da
+    foto nova, apaga as da foto anterior e grava em miniaturas_de qual foto
+    elas representam. Retorna True se novas miniaturas foram geradas.
+    """
+    foto = medicamento.foto
+    nome_atual = foto.name if foto else ''
+    if medicamento.miniaturas_de == nome_atual:
+        return False
+
+    if medicamento.miniaturas_de:
+        remover_miniaturas(foto.storage, medicamento.miniaturas_de)
+
+    gerou = False
+    if foto:
+        try:
+            gerar_miniaturas(foto)
+            gerou = True
+        except (OSError, Image.DecompressionBombError):
+            # Arquivo ausente ou que o Pillow não reconhece: o template usa a foto original
+            logger.warning('Não foi possível gerar miniaturas para %s', nome_atual, exc_info=True)
+            nome_atual = ''
+
+    # update() em vez de save() para não disparar os signals de novo
+    type(medicamento).objects.filter(pk=medicamento.pk).update(miniaturas_de=nome_atual)
+    medicamento.miniaturas_de = nome_atual
+    return gerou
@@ -0,0 +1,205 @@
+# pessoas/importacao.py
+
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+
+from .models import Perfil, User
+
+# Linhas gravadas por transação (um bulk_create de User e um de Perfil)
+TAMANHO_LOTE_IMPORTACAO = 500
+
+# Colunas aceitas no CSV; apenas "username" é obrigatória
+COLUNAS = ('username', 'first_name', 'last_name', 'email', 'senha', 'rg', 'data_nascimento', 'endereco')
+# Colunas recusadas se passarem do tamanho do campo: no MySQL em modo estrito
+# o bulk_create falharia com DataError no meio da importação
+TAMANHOS_MAXIMOS = {
+    'username': User._meta.get_field('username').max_length,
+    'email': User._meta.get_field('email').max_length,
+    'rg': Perfil._meta.get_field('rg').max_length,
+    'endereco': Perfil._meta.get_field('endereco').max_length,
+}
+
+
+class ResultadoImportacao:
+    """Contadores da importação e os erros encontrados (número da linha, mensagem)."""
+
+    def __init__(self):
+        self.lidas = 0
+        self.criados = 0
+        self.ignorados = 0
+        self.erros = []
+
+
+def _iniciar_processo():
+    # Em sistemas que iniciam os processos com "spawn" o Django precisa ser configurado
+    django.setup()
+
+
+def _data_nascimento(valor):
+    if not valor:
+        return None
+    data = parse_date(valor)
+    if data is None:
+        data = datetime.strptime(valor, '%d/%m/%Y').date()
+    return data
+
+
+def _validar_linha(linha):
+    """Normaliza uma linha do CSV ou levanta ValueError com o motivo."""
+    dados = {coluna: (linha.get(coluna) or '').strip() for coluna in COLUNAS}
+    if not dados['username']:
+        raise ValueError("username vazio")
+    for coluna, tamanho in TAMANHOS_MAXIMOS.items():
+        if len(dados[coluna]) > tamanho:
+            raise ValueError(f"{coluna} com mais de {tamanho} caracteres")
+    dados['email'] = dados['email'].lower()
+    if dados['email']:
+        try:
+            validate_email(dados['email'])
+        except ValidationError:
+            raise ValueError(f"e-mail inválido: {dados['email']}")
+    try:
+        dados['data_nascimento'] = _data_nascimento(dados['data_nascimento'])
+    except ValueError:
+        raise ValueError(f"data de nascimento inválida: {dados['data_nascimento']}")
+    return dados
+
+
+def _filtrar_existentes(dados_lote, resultado):
+    """
+    Remove do lote quem já existe no banco (mesmo username ou e-mail), com uma
+    consulta por coluna para o lote inteiro em vez de uma por pessoa.
+    Devolve os pares (número da linha, dados) restantes.
+    """
+    usernames = {dados['username'] for _, dados in dados_lote}
+    emails = {dados['email'] for _, dados in dados_lote if dados['email']}
+    usernames_existentes = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    emails_existentes = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+    novos = []
+    for numero, dados in dados_lote:
+        if dados['username'] in usernames_existentes:
+            resultado.ignorados += 1
+            resultado.erros.append((numero, f"usuário {dados['username']} já existe"))
+        elif dados['email'] and dados['email'] in emails_existentes:
+            resultado.ignorados += 1
+            resultado.erros.append((numero, f"e-mail {dados['email']} já cadastrado"))
+        else:
+            novos.append((numero, dados))
+    return novos
+
+
+def _gravar_lote(novos, senhas):
+    """Insere os usuários e os perfis de paciente do lote numa única transação."""
+    usuarios = [
+        User(
+            username=dados['username'],
+            first_name=dados['first_name'][:150],
+            last_name=dados['last_name'][:150],
+            email=dados['email'],
+            password=senha,
+        )
+        for dados, senha in zip(novos, senhas)
+    ]
+    with transaction.atomic():
+        # bulk_create não dispara post_save, então criar_perfil_usuario não roda
+        # e os perfis são criados aqui, também em lote
+        User.objects.bulk_create(usuarios)
+        # Nem todo banco devolve as chaves no bulk_create (MySQL): busca pelos usernames
+        ids = dict(
+            User.objects.filter(username__in=[dados['username'] for dados in novos])
+            .values_list('username', 'id')
+        )
+        Perfil.objects.bulk_create(
+            [
+                Perfil(
+                    usuario_id=ids[dados['username']],
+                    tipo_usuario='paciente',
+                    rg=dados['rg'] or None,
+                    data_nascimento=dados['data_nascimento'],
+                    endereco=dados['endereco'] or None,
+                )
+                for dados in novos
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def _gravar_um_a_um(novos, senhas, resultado):
+    for (numero, dados), senha in zip(novos, senhas):
+        try:
+            _gravar_lote([dados], [senha])
+        except IntegrityError:
+            resultado.ignorados += 1
+            resultado.erros.append((numero, f"usuário {dados['username']} já existe"))
+        else:
+            resultado.criados += 1
+
+
+def importar_pacientes(arquivo, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, processos=None,
+                       delimitador=',', progresso=None):
+    """
+    Importa pacientes de um CSV (arquivo aberto em modo texto) em lotes.
+
+    Linhas com senha têm o hash calculado num pool de processos (o PBKDF2 é o
+    custo dominante e ocupa só CPU); linhas sem senha recebem uma senha
+    inutilizável e o paciente define a sua pelo "esqueci minha senha".
+    Usuários cujo username ou e-mail já existem são ignorados.
+    progresso(resultado) é chamado ao fim de cada lote.
+    """
+    resultado = ResultadoImportacao()
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    if not leitor.fieldnames or 'username' not in leitor.fieldnames:
+        raise ValueError("O CSV precisa de um cabeçalho com a coluna 'username'.")
+    linhas = enumerate(leitor, start=2)
+
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as pool:
+        while True:
+            lote = list(islice(linhas, tamanho_lote))
+            if not lote:
+                break
+            resultado.lidas += len(lote)
+
+            dados_lote = []
+            vistos = set()
+            for numero, linha in lote:
+                try:
+                    dados = _validar_linha(linha)
+                except ValueError as erro:
+                    resultado.ignorados += 1
+                    resultado.erros.append((numero, str(erro)))
+                    continue
+                chaves = {dados['username'], dados['email']} - {''}
+                if chaves & vistos:
+                    resultado.ignorados += 1
+                    resultado.erros.append((numero, "repetido no próprio arquivo"))
+                    continue
+                vistos |= chaves
+                dados_lote.append((numero, dados))
+
+            novos = _filtrar_existentes(dados_lote, resultado) if dados_lote else []
+            if novos:
+                com_senha = [dados['senha'] for _, dados in novos if dados['senha']]
+                hashes = iter(pool.map(make_password, com_senha, chunksize=max(1, len(com_senha) // 16)))
+                senhas = [next(hashes) if dados['senha'] else make_password(None) for _, dados in novos]
+                try:
+                    _gravar_lote([dados for _, dados in novos], senhas)
+                    resultado.criados += len(novos)
+                except IntegrityError:
+                    # Alguém foi cadastrado com o mesmo username depois de
+                    # _filtrar_existentes: grava o lote uma linha por vez
+                    _gravar_um_a_um(novos, senhas, resultado)
+
+            if progresso:
+                progresso(resultado)
+
+    return resultado
@@ -0,0 +1,67 @@
+# pessoas/lembretes.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Consulta
+from .tarefas import tarefa
+
+# Lembra as consultas que acontecem nas próximas N horas
+ANTECEDENCIA = timedelta(hours=getattr(settings, 'LEMBRETES_ANTECEDENCIA_HORAS', 24))
+# E-mails enviados por conexão com o servidor de e-mail
+TAMANHO_LOTE_LEMBRETES = 100
+
+
+def consultas_a_lembrar(agora=None):
+    """Consultas agendadas dentro da antecedência cujo paciente ainda não foi avisado."""
+    agora = agora or timezone.now()
+    return Consulta.objects.filter(
+        status='agendada',
+        data_hora__gte=agora,
+        data_hora__lt=agora + ANTECEDENCIA,
+        lembrete_enviado_em__isnull=True,
+    ).exclude(paciente__email='').select_related('paciente', 'medico').only(
+        'data_hora',
+        'paciente__username', 'paciente__first_name', 'paciente__last_name', 'paciente__email',
+        'medico__username', 'medico__first_name', 'medico__last_name',
+    ).order_by('data_hora', 'id')
+
+
+def _mensagem(consulta, conexao):
+    contexto = {'consulta': consulta, 'data_hora': timezone.localtime(consulta.data_hora)}
+    return EmailMessage(
+        subject=f"Lembrete: consulta em {contexto['data_hora']:%d/%m/%Y às %H:%M}",
+        body=render_to_string('pessoas/emails/lembrete_consulta.txt', contexto),
+        to=[consulta.paciente.email],
+        connection=conexao,
+    )
+
+
+@tarefa('lembretes_consultas', intervalo=timedelta(minutes=15))
+def enviar_lembretes(tamanho_lote=TAMANHO_LOTE_LEMBRETES):
+    """
+    Envia por e-mail os lembretes das próximas consultas, em lotes.
+
+    O envio usa LEMBRETES_EMAIL_BACKEND (padrão: o EMAIL_BACKEND do projeto),
+    então pode ir para o console, para arquivos ou para SMTP. Cada lote é
+    marcado como enviado logo após sair; se o envio falhar, a tarefa é
+    repetida e retoma dos lotes que ainda não saíram.
+    """
+    enviados = 0
+    conexao = get_connection(getattr(settings, 'LEMBRETES_EMAIL_BACKEND', None))
+    with conexao:
+        while True:
+            lote = list(consultas_a_lembrar()[:tamanho_lote])
+            if not lote:
+                break
+            conexao.send_messages([_mensagem(consulta, conexao) for consulta in lote])
+            # update() não passa pelos signals nem muda atualizado_em: não é uma alteração da consulta
+            Consulta.objects.filter(pk__in=[consulta.pk for consulta in lote]).update(
+                lembrete_enviado_em=timezone.now()
+            )
+            enviados += len(lote)
+    return enviados
@@ -0,0 +1,175 @@
+# pessoas/limite_login.py
+
+import hashlib
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# (capacidade, tentativas recuperadas por minuto) de cada balde
+LIMITE_LOGIN_PADRAO = {
+    'ip': (20, 10),
+    'usuario': (5, 1),
+}
+# Segundos a mais no cache além do necessário para o balde encher de novo
+_FOLGA_EXPIRACAO = 60
+METRICAS = ('aceitas', 'rejeitadas_ip', 'rejeitadas_usuario')
+# Os contadores expiram uma semana depois de criados (ou de zerar_metricas)
+METRICAS_EXPIRACAO = 7 * 24 * 60 * 60
+# Caches que não são compartilhados entre processos: cada worker teria os
+# próprios baldes, multiplicando o limite pelo número de workers
+BACKENDS_POR_PROCESSO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def alias_cache():
+    """Alias em CACHES dos baldes e das métricas (settings.LIMITE_LOGIN_CACHE)."""
+    return getattr(settings, 'LIMITE_LOGIN_CACHE', 'limite_login')
+
+
+def _cache():
+    return caches[alias_cache()]
+
+
+def verificar_configuracao():
+    """
+    Chamado no AppConfig.ready: fora do DEBUG, recusa ligar o limite com um
+    cache que não existe ou que não é compartilhado entre os processos.
+    """
+    if settings.DEBUG or not getattr(settings, 'LIMITE_LOGIN_ATIVO', True):
+        return
+    alias = alias_cache()
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(f"LIMITE_LOGIN_ATIVO exige o cache '{alias}' em CACHES.")
+    backend = settings.CACHES[alias]['BACKEND']
+    if backend in BACKENDS_POR_PROCESSO:
+        raise ImproperlyConfigured(
+            f"O cache '{alias}' ({backend}) não é compartilhado entre os processos: "
+            "use memcached ou redis em produção, ou LIMITE_LOGIN_ATIVO = False."
+        )
+
+
+def limites():
+    """Capacidade e recarga dos baldes por IP e por usuário (settings.LIMITE_LOGIN)."""
+    return {**LIMITE_LOGIN_PADRAO, **getattr(settings, 'LIMITE_LOGIN', {})}
+
+
+def ip_do_cliente(request):
+    # Atrás de um proxy reverso, ele deve entregar o IP real do cliente em REMOTE_ADDR
+    return request.META.get('REMOTE_ADDR') or 'desconhecido'
+
+
+def _chave_balde(escopo, tipo, valor):
+    # Hash: o nome de usuário vem do formulário e pode ter caracteres inválidos para o memcached
+    resumo = hashlib.sha256(valor.encode()).hexdigest()[:32]
+    return f'limite_login:{escopo}:{tipo}:{resumo}'
+
+
+def _chave_metrica(escopo, metrica):
+    return f'limite_login:metricas:{escopo}:{metrica}'
+
+
+def _retirar(baldes, chaves, agora):
+    """
+    Recarrega os baldes pelo tempo decorrido e tira uma ficha de cada.
+
+    Devolve (tipo do balde vazio, segundos até ter ficha) ou None se todos
+    tinham ficha. Se algum está vazio, nenhum é consumido: um IP bloqueado
+    não gasta as tentativas do usuário que ele está atacando, e vice-versa.
+    """
+    configuracao = limites()
+    novos = {}
+    for tipo, chave in chaves.items():
+        capacidade, por_minuto = configuracao[tipo]
+        fichas, ultima = baldes.get(chave, (capacidade, agora))
+        fichas = min(capacidade, fichas + (agora - ultima) * por_minuto / 60)
+        if fichas < 1:
+            return tipo, math.ceil((1 - fichas) * 60 / por_minuto)
+        # Expira quando o balde estaria cheio de novo (igual a não existir)
+        timeout = math.ceil((capacidade - fichas + 1) * 60 / por_minuto) + _FOLGA_EXPIRACAO
+        novos[chave] = ((fichas - 1, agora), timeout)
+
+    for chave, (balde, timeout) in novos.items():
+        _cache().set(chave, balde, timeout)
+    return None
+
+
+def _contar(escopo, metrica):
+    chave = _chave_metrica(escopo, metrica)
+    cache = _cache()
+    # add + incr: o incr é atômico no memcached/redis e mantém a expiração; o add só cria a chave
+    cache.add(chave, 0, METRICAS_EXPIRACAO)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        # A chave expirou (ou foi despejada) entre o add e o incr
+        cache.set(chave, 1, METRICAS_EXPIRACAO)
+
+
+def metricas(escopo):
+    """
+    Tentativas aceitas e rejeitadas (por IP e por usuário) do escopo, desde o
+    último zerar_metricas ou a expiração dos contadores (METRICAS_EXPIRACAO).
+    """
+    valores = _cache().get_many([_chave_metrica(escopo, metrica) for metrica in METRICAS])
+    return {metrica: valores.get(_chave_metrica(escopo, metrica), 0) for metrica in METRICAS}
+
+
+def zerar_metricas(escopo):
+    _cache().delete_many([_chave_metrica(escopo, metrica) for metrica in METRICAS])
+
+
+def verificar_tentativa(escopo, ip, usuario=None):
+    """
+    Consome uma tentativa dos baldes do IP e (se informado) do nome de usuário.
+    Devolve None se a tentativa pode seguir, ou os segundos que o cliente deve
+    esperar (Retry-After).
+
+    Ler e gravar os baldes não é atômico; numa rajada simultânea algumas
+    tentativas a mais podem passar, mas o número continua limitado.
+    """
+    chaves = {'ip': _chave_balde(escopo, 'ip', ip)}
+    if usuario:
+        chaves['usuario'] = _chave_balde(escopo, 'usuario', usuario.strip().casefold())
+    recusa = _retirar(_cache().get_many(list(chaves.values())), chaves, time.time())
+    if recusa is None:
+        _contar(escopo, 'aceitas')
+        return None
+    tipo, espera = recusa
+    _contar(escopo, f'rejeitadas_{tipo}')
+    logger.warning('Tentativa de %s recusada (limite por %s): ip=%s', escopo, tipo, ip)
+    return espera
+
+
+def limitar_tentativas(escopo, campo_usuario=None):
+    """
+    Decorator para views que fazem hash de senha (login, cadastro): cada POST
+    consome uma ficha do balde do IP e, com `campo_usuario`, do balde do nome
+    de usuário enviado. Sem fichas, responde 429 antes de chegar ao formulário,
+    e portanto sem calcular nenhum hash. Desligado com LIMITE_LOGIN_ATIVO = False.
+    """
+    def decorator(view):
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            if request.method == 'POST' and getattr(settings, 'LIMITE_LOGIN_ATIVO', True):
+                usuario = request.POST.get(campo_usuario) if campo_usuario else None
+                espera = verificar_tentativa(escopo, ip_do_cliente(request), usuario)
+                if espera is not None:
+                    resposta = HttpResponse(
+                        f'Muitas tentativas. Tente novamente em {espera} segundos.',
+                        status=429, content_type='text/plain; charset=utf-8',
+                    )
+                    resposta['Retry-After'] = str(espera)
+                    return resposta
+            return view(request, *args, **kwargs)
+        return _view
+    return decorator
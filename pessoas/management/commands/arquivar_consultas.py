@@ -0,0 +1,41 @@
+# pessoas/management/commands/arquivar_consultas.py
+
+from django.core.management.base import BaseCommand
+
+from pessoas.arquivamento import (
+    TAMANHO_LOTE_ARQUIVAMENTO, arquivar_consultas, consultas_arquivaveis, dias_para_arquivar,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as consultas concluídas ou canceladas mais antigas que --dias para a "
+        "tabela de consultas arquivadas (relatório comprimido)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=None,
+            help=f"Idade mínima das consultas, em dias (padrão: ARQUIVAMENTO_DIAS = {dias_para_arquivar()}).",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE_ARQUIVAMENTO,
+            help=f"Consultas movidas por transação (padrão: {TAMANHO_LOTE_ARQUIVAMENTO}).",
+        )
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Só informa quantas consultas seriam arquivadas.",
+        )
+
+    def handle(self, *args, **options):
+        if options['simular']:
+            total = consultas_arquivaveis(options['dias']).count()
+            self.stdout.write(f"{total} consultas seriam arquivadas.")
+            return
+
+        movidas = arquivar_consultas(
+            dias=options['dias'],
+            tamanho_lote=options['lote'],
+            progresso=lambda movidas: self.stdout.write(f"{movidas} consultas arquivadas..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Arquivamento concluído: {movidas} consultas movidas."))
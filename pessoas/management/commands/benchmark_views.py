@@ -0,0 +1,67 @@
+# pessoas/management/commands/benchmark_views.py
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from pessoas.benchmark import PAPEIS, comparar_resultados, executar_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p90/p99) e número de consultas SQL de cada URL do app, "
+        "como cada papel, e salva o resultado em JSON para comparar entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=10, help="Requisições medidas por URL e papel (padrão: 10).")
+        parser.add_argument('--aquecimento', type=int, default=1, help="Requisições descartadas antes de medir (padrão: 1).")
+        parser.add_argument('--papeis', nargs='+', choices=PAPEIS, default=list(PAPEIS))
+        parser.add_argument('--urls', nargs='+', default=None, help="Nomes das URLs a medir (padrão: todas).")
+        parser.add_argument('--saida', default='benchmark.json', help="Arquivo JSON de resultado (padrão: benchmark.json).")
+        parser.add_argument('--comparar', default=None, help="JSON de uma execução anterior para comparar.")
+
+    def handle(self, *args, **options):
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as arquivo:
+                    anterior = json.load(arquivo)
+            except (OSError, ValueError) as erro:
+                raise CommandError(f"Não foi possível ler {options['comparar']}: {erro}")
+
+        def progresso(item):
+            self.stdout.write(
+                f"{item['url']:<28} {item['papel']:<10} {item['status']}  "
+                f"p50 {item['p50_ms']:>8.2f} ms  p99 {item['p99_ms']:>8.2f} ms  {item['consultas_sql']} SQL ({item['sql_p50_ms']:.2f} ms)"
+            )
+
+        # O Client de testes usa o host "testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            resultado = executar_benchmark(
+                repeticoes=options['repeticoes'],
+                aquecimento=options['aquecimento'],
+                papeis=options['papeis'],
+                nomes=options['urls'],
+                progresso=progresso,
+            )
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+        for item in resultado['ignoradas']:
+            self.stdout.write(self.style.WARNING(f"{item['url']} ignorada: {item['motivo']}"))
+        self.stdout.write(self.style.SUCCESS(f"Resultado salvo em {options['saida']}."))
+
+        if anterior:
+            self.stdout.write("\nComparação com a execução anterior (p50 e consultas SQL):")
+            for item in comparar_resultados(anterior, resultado):
+                antes, depois = item['p50_ms']
+                sql_antes, sql_depois = item['consultas_sql']
+                variacao = f"{item['variacao_p50']:+.1f}%" if item['variacao_p50'] is not None else 'n/d'
+                estilo = self.style.ERROR if sql_depois > sql_antes else (lambda texto: texto)
+                self.stdout.write(estilo(
+                    f"{item['url']:<28} {item['papel']:<10} {antes:.2f} -> {depois:.2f} ms ({variacao})  "
+                    f"SQL {sql_antes} -> {sql_depois}"
+                ))
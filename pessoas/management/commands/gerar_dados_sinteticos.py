@@ -0,0 +1,45 @@
+# pessoas/management/commands/gerar_dados_sinteticos.py
+
+from django.core.management.base import BaseCommand
+
+from pessoas.dados_sinteticos import TAMANHO_LOTE_PADRAO, gerar_dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula o banco com dados sintéticos para testes de carga "
+        "(padrão: 100 mil pacientes, 500 médicos, 2 milhões de consultas e 20 mil medicamentos). "
+        "Não use no banco de produção."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100_000)
+        parser.add_argument('--medicos', type=int, default=500)
+        parser.add_argument('--atendentes', type=int, default=20)
+        parser.add_argument('--consultas', type=int, default=2_000_000)
+        parser.add_argument('--medicamentos', type=int, default=20_000)
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE_PADRAO,
+            help=f"Linhas inseridas por vez (padrão: {TAMANHO_LOTE_PADRAO}).",
+        )
+        parser.add_argument(
+            '--semente', type=int, default=None,
+            help="Semente do gerador aleatório, para repetir exatamente os mesmos dados.",
+        )
+
+    def handle(self, *args, **options):
+        def progresso(etapa, feitos, total):
+            self.stdout.write(f"{etapa}: {feitos}/{total}")
+
+        criados = gerar_dados(
+            pacientes=options['pacientes'],
+            medicos=options['medicos'],
+            atendentes=options['atendentes'],
+            consultas=options['consultas'],
+            medicamentos=options['medicamentos'],
+            tamanho_lote=options['lote'],
+            semente=options['semente'],
+            progresso=progresso,
+        )
+        resumo = ', '.join(f"{quantidade} {nome}" for nome, quantidade in criados.items())
+        self.stdout.write(self.style.SUCCESS(f"Dados sintéticos criados: {resumo}."))
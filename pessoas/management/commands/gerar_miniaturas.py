@@ -0,0 +1,36 @@
+# pessoas/management/commands/gerar_miniaturas.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from pessoas.imagens import atualizar_miniaturas_medicamento
+from pessoas.models import Medicamento
+
+
+class Command(BaseCommand):
+    help = "Gera as miniaturas (WebP e JPEG) das fotos de medicamentos que ainda não as têm."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas', action='store_true',
+            help="Regera as miniaturas de todas as fotos, mesmo as já processadas.",
+        )
+
+    def handle(self, *args, **options):
+        medicamentos = Medicamento.objects.exclude(foto='').exclude(foto__isnull=True)
+        if options['todas']:
+            medicamentos.update(miniaturas_de='')
+        else:
+            medicamentos = medicamentos.exclude(miniaturas_de=F('foto'))
+
+        geradas = falhas = 0
+        for medicamento in medicamentos.only('foto', 'miniaturas_de').iterator(chunk_size=200):
+            if atualizar_miniaturas_medicamento(medicamento):
+                geradas += 1
+            else:
+                falhas += 1
+                self.stderr.write(f"Falha ao processar a foto de {medicamento.pk}: {medicamento.foto.name}")
+            if (geradas + falhas) % 100 == 0:
+                self.stdout.write(f"{geradas + falhas} fotos processadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas geradas para {geradas} medicamentos ({falhas} falhas)."))
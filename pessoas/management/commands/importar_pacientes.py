@@ -0,0 +1,54 @@
+# pessoas/management/commands/importar_pacientes.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pessoas.importacao import TAMANHO_LOTE_IMPORTACAO, importar_pacientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa pacientes de um CSV (colunas: username, first_name, last_name, email, "
+        "senha, rg, data_nascimento, endereco). Apenas username é obrigatória."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo CSV (UTF-8, com cabeçalho).")
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO,
+            help=f"Quantidade de pacientes gravados por transação (padrão: {TAMANHO_LOTE_IMPORTACAO}).",
+        )
+        parser.add_argument(
+            '--processos', type=int, default=None,
+            help="Processos usados para calcular os hashes das senhas (padrão: um por CPU).",
+        )
+        parser.add_argument(
+            '--delimitador', default=',',
+            help="Separador de colunas do CSV (padrão: vírgula).",
+        )
+
+    def handle(self, *args, **options):
+        def progresso(resultado):
+            self.stdout.write(
+                f"{resultado.lidas} linhas lidas: {resultado.criados} criados, "
+                f"{resultado.ignorados} ignorados"
+            )
+
+        try:
+            # utf-8-sig aceita arquivos exportados pelo Excel (com BOM)
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                resultado = importar_pacientes(
+                    arquivo,
+                    tamanho_lote=options['lote'],
+                    processos=options['processos'],
+                    delimitador=options['delimitador'],
+                    progresso=progresso,
+                )
+        except (OSError, ValueError) as erro:
+            raise CommandError(str(erro))
+
+        for numero, mensagem in sorted(resultado.erros):
+            self.stderr.write(f"Linha {numero}: {mensagem}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída: {resultado.criados} pacientes criados, "
+            f"{resultado.ignorados} linhas ignoradas."
+        ))
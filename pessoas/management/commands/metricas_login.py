@@ -0,0 +1,31 @@
+# pessoas/management/commands/metricas_login.py
+
+from django.core.management.base import BaseCommand
+
+from pessoas.limite_login import metricas, zerar_metricas
+
+ESCOPOS = ('login', 'cadastro')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra as tentativas de login e cadastro aceitas e recusadas pelo limite de tentativas "
+        "(os contadores expiram uma semana depois de criados)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--zerar', action='store_true',
+            help="Zera os contadores depois de mostrá-los.",
+        )
+
+    def handle(self, *args, **options):
+        for escopo in ESCOPOS:
+            valores = metricas(escopo)
+            recusadas = valores['rejeitadas_ip'] + valores['rejeitadas_usuario']
+            self.stdout.write(
+                f"{escopo}: {valores['aceitas']} aceitas, {recusadas} recusadas "
+                f"({valores['rejeitadas_ip']} por IP, {valores['rejeitadas_usuario']} por usuário)"
+            )
+            if options['zerar']:
+                zerar_metricas(escopo)
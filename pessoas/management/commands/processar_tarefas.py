@@ -0,0 +1,50 @@
+# pessoas/management/commands/processar_tarefas.py
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pessoas.tarefas import agendar_periodicas, executar_tarefa, liberar_travadas, reservar_tarefas
+
+
+class Command(BaseCommand):
+    help = "Worker da fila de tarefas: executa as tarefas pendentes (ex.: lembretes de consultas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=10,
+            help="Quantidade de tarefas reservadas por vez (padrão: 10).",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5,
+            help="Segundos de espera quando não há tarefas (padrão: 5).",
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help="Executa as tarefas vencidas e termina (útil com cron).",
+        )
+
+    def handle(self, *args, **options):
+        self.parar = False
+        # Termina a tarefa em andamento antes de sair (Ctrl+C / systemd stop)
+        signal.signal(signal.SIGTERM, self._pedir_parada)
+        signal.signal(signal.SIGINT, self._pedir_parada)
+
+        agendar_periodicas()
+        while not self.parar:
+            close_old_connections()
+            liberar_travadas()
+            tarefas = reservar_tarefas(options['lote'])
+            for tarefa in tarefas:
+                ok = executar_tarefa(tarefa)
+                estilo = self.style.SUCCESS if ok else self.style.WARNING
+                self.stdout.write(estilo(f"{tarefa} após {tarefa.tentativas} tentativa(s)"))
+            if options['uma_vez'] and not tarefas:
+                break
+            if not tarefas:
+                time.sleep(options['intervalo'])
+
+    def _pedir_parada(self, *args):
+        self.parar = True
@@ -0,0 +1,19 @@
+# pessoas/management/commands/reconstruir_ocupacao.py
+
+from django.core.management.base import BaseCommand
+
+from pessoas.ocupacao import reconstruir_ocupacao
+
+
+class Command(BaseCommand):
+    help = "Reconstrói do zero o resumo diário de ocupação (OcupacaoDiaria) a partir das consultas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help="Quantidade de linhas inseridas por vez (padrão: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        criadas = reconstruir_ocupacao(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Resumo de ocupação reconstruído: {criadas} linhas."))
@@ -0,0 +1,40 @@
+# pessoas/management/commands/sincronizar_precos.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pessoas.catalogo import sincronizar_precos
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza valor e necessita_receita dos medicamentos a partir da tabela do "
+        "fornecedor (CSV com as colunas nome, valor e, opcional, necessita_receita)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho do arquivo CSV (UTF-8, com cabeçalho).")
+        parser.add_argument(
+            '--simular', action='store_true',
+            help="Apenas mostra o que mudaria, sem gravar nada.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                relatorio = sincronizar_precos(arquivo, aplicar=not options['simular'])
+        except (OSError, ValueError) as erro:
+            raise CommandError(str(erro))
+
+        for nome, campo, anterior, novo in relatorio.alteracoes:
+            self.stdout.write(f"{nome}: {campo} {anterior} -> {novo}")
+        for nome in relatorio.nao_encontrados:
+            self.stderr.write(f"Não encontrado no catálogo: {nome}")
+        for numero, mensagem in relatorio.erros:
+            self.stderr.write(f"Linha {numero}: {mensagem}")
+
+        resumo = (
+            f"{relatorio.lidas} linhas lidas, {relatorio.medicamentos_alterados} medicamentos "
+            f"{'alterados' if relatorio.aplicado else 'seriam alterados'}, "
+            f"{len(relatorio.nao_encontrados)} não encontrados, {len(relatorio.erros)} linhas inválidas."
+        )
+        self.stdout.write(self.style.SUCCESS(resumo))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def popular_ocupacao(apps, schema_editor):
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    OcupacaoDiaria = apps.get_model('pessoas', 'OcupacaoDiaria')
+    banco = schema_editor.connection.alias
+    agrupado = Consulta.objects.using(banco).order_by().annotate(
+        dia=TruncDate('data_hora')
+    ).values('dia', 'medico', 'status').annotate(total=Count('id'))
+    OcupacaoDiaria.objects.using(banco).bulk_create(
+        [
+            OcupacaoDiaria(data=linha['dia'], medico_id=linha['medico'], status=linha['status'], total=linha['total'])
+            for linha in agrupado.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0004_perfil_data_nascimento_perfil_endereco_perfil_rg'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('status', models.CharField(choices=[('agendada', 'Agendada'), ('concluida', 'Concluída'), ('cancelada', 'Cancelada')], max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacao_diaria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['data'],
+                'constraints': [models.UniqueConstraint(fields=('data', 'medico', 'status'), name='ocupacao_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(popular_ocupacao, migrations.RunPython.noop),
+    ]
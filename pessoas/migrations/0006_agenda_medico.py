@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:42
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0005_ocupacaodiaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='duracao_consulta',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Duração de cada consulta, em minutos (apenas médicos).'),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='fim_expediente',
+            field=models.TimeField(default=datetime.time(18, 0), help_text='Horário em que o último atendimento deve terminar (apenas médicos).'),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='inicio_expediente',
+            field=models.TimeField(default=datetime.time(8, 0), help_text='Horário do primeiro atendimento (apenas médicos).'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['medico', 'data_hora'], name='consulta_medico_data_idx'),
+        ),
+    ]
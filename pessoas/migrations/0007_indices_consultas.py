@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0006_agenda_medico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['paciente', 'data_hora'], name='consulta_paciente_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['data_hora', 'id'], name='consulta_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['status', 'data_hora'], name='consulta_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfil',
+            index=models.Index(fields=['tipo_usuario', 'usuario'], name='perfil_tipo_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+# A tabela de usuários (auth_user) pertence ao app auth do Django, então os
+# índices usados na busca de usuários por prefixo (pessoas/busca.py) são
+# criados aqui em SQL puro. Eles NÃO fazem parte do estado das migrações:
+# não aparecem em User._meta.indexes, o makemigrations não os conhece e uma
+# migração que recrie auth_user (ex.: ALTER no SQLite) os descarta em
+# silêncio. Nesse caso, recrie-os na mesma migração. O teste
+# BuscaUsuariosTests.test_indices_de_auth_user confere que existem.
+INDICES_USUARIO = {
+    'pessoas_user_first_name_idx': 'first_name',
+    'pessoas_user_last_name_idx': 'last_name',
+    'pessoas_user_email_idx': 'email',
+}
+
+
+def criar_indices(apps, schema_editor):
+    for nome, coluna in INDICES_USUARIO.items():
+        schema_editor.execute(f'CREATE INDEX {nome} ON auth_user ({coluna})')
+
+
+def remover_indices(apps, schema_editor):
+    # O MySQL exige a tabela no DROP INDEX; SQLite e PostgreSQL não a aceitam
+    sufixo = ' ON auth_user' if schema_editor.connection.vendor == 'mysql' else ''
+    for nome in INDICES_USUARIO:
+        schema_editor.execute(f'DROP INDEX {nome}{sufixo}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0007_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='perfil',
+            index=models.Index(fields=['rg'], name='perfil_rg_idx'),
+        ),
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
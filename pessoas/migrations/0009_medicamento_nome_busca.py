@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:44
+
+from django.db import migrations, models
+
+from pessoas.texto import normalizar_texto
+
+
+def preencher_nome_busca(apps, schema_editor):
+    Medicamento = apps.get_model('pessoas', 'Medicamento')
+    banco = schema_editor.connection.alias
+    medicamentos = list(Medicamento.objects.using(banco).only('nome'))
+    for medicamento in medicamentos:
+        medicamento.nome_busca = normalizar_texto(medicamento.nome)
+    Medicamento.objects.using(banco).bulk_update(medicamentos, ['nome_busca'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0008_indices_busca_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicamento',
+            name='nome_busca',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+    ]
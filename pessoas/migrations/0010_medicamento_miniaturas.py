@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0009_medicamento_nome_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicamento',
+            name='miniaturas_de',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def preencher_atualizado_em(apps, schema_editor):
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    Consulta.objects.using(schema_editor.connection.alias).update(atualizado_em=models.F('criado_em'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0010_medicamento_miniaturas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfil',
+            name='token_agenda',
+            field=models.CharField(blank=True, editable=False, max_length=43, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='versao_agenda',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='agenda_excluida_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_atualizado_em, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['medico', 'atualizado_em'], name='consulta_medico_atualiz_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0012_tarefas_lembretes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('data_hora', models.DateTimeField()),
+                ('status', models.CharField(choices=[('agendada', 'Agendada'), ('concluida', 'Concluída'), ('cancelada', 'Cancelada')], max_length=10)),
+                ('relatorio_comprimido', models.BinaryField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField()),
+                ('arquivada_em', models.DateTimeField(auto_now_add=True)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consultas_arquivadas_como_medico', to=settings.AUTH_USER_MODEL)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consultas_arquivadas_como_paciente', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'consultas arquivadas',
+                'ordering': ['-data_hora'],
+                'indexes': [models.Index(fields=['medico', 'data_hora'], name='arquivada_medico_data_idx'), models.Index(fields=['paciente', 'data_hora'], name='arquivada_paciente_data_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TAMANHO_LOTE = 1000
+
+
+def mover_relatorios(apps, schema_editor):
+    """Copia os relatórios preenchidos de Consulta para RelatorioConsulta, em lotes."""
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    RelatorioConsulta = apps.get_model('pessoas', 'RelatorioConsulta')
+    banco = schema_editor.connection.alias
+    com_relatorio = Consulta.objects.using(banco).exclude(relatorio__isnull=True).exclude(relatorio='').order_by('id')
+    ultimo_id = 0
+    while True:
+        lote = list(com_relatorio.filter(id__gt=ultimo_id).values_list('id', 'relatorio')[:TAMANHO_LOTE])
+        if not lote:
+            break
+        RelatorioConsulta.objects.using(banco).bulk_create([
+            RelatorioConsulta(consulta_id=consulta_id, texto=texto) for consulta_id, texto in lote
+        ])
+        ultimo_id = lote[-1][0]
+
+
+def devolver_relatorios(apps, schema_editor):
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    RelatorioConsulta = apps.get_model('pessoas', 'RelatorioConsulta')
+    banco = schema_editor.connection.alias
+    for consulta_id, texto in RelatorioConsulta.objects.using(banco).values_list('consulta_id', 'texto').iterator(chunk_size=TAMANHO_LOTE):
+        Consulta.objects.using(banco).filter(id=consulta_id).update(relatorio=texto)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0013_consultas_arquivadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioConsulta',
+            fields=[
+                ('consulta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='relatorio_consulta', serialize=False, to='pessoas.consulta')),
+                ('texto', models.TextField(blank=True, help_text='Relatório a ser preenchido pelo médico após a consulta.')),
+                ('versao', models.PositiveIntegerField(default=1)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(mover_relatorios, devolver_relatorios),
+        migrations.RemoveField(
+            model_name='consulta',
+            name='relatorio',
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:13
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Cast, Concat
+
+# Índice de texto completo dos relatórios (veja pessoas/busca_relatorios.py).
+# MySQL: índice FULLTEXT em (texto, escopo). SQLite (testes): tabela FTS5 com
+# o conteúdo da própria pessoas_relatorioconsulta, mantida por triggers.
+# Atenção: no SQLite, migrações que recriam pessoas_relatorioconsulta apagam
+# os triggers; recrie-os (e rode o "rebuild") na mesma migração.
+SQL_MYSQL = [
+    'CREATE FULLTEXT INDEX relatorio_busca_ft ON pessoas_relatorioconsulta (texto, escopo)',
+]
+SQL_MYSQL_REVERSO = [
+    'DROP INDEX relatorio_busca_ft ON pessoas_relatorioconsulta',
+]
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE pessoas_relatorio_fts USING fts5(
+        texto, escopo,
+        content='pessoas_relatorioconsulta', content_rowid='consulta_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER pessoas_relatorio_fts_ai AFTER INSERT ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(rowid, texto, escopo) VALUES (new.consulta_id, new.texto, new.escopo);
+    END""",
+    """CREATE TRIGGER pessoas_relatorio_fts_ad AFTER DELETE ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts, rowid, texto, escopo)
+        VALUES ('delete', old.consulta_id, old.texto, old.escopo);
+    END""",
+    """CREATE TRIGGER pessoas_relatorio_fts_au AFTER UPDATE ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts, rowid, texto, escopo)
+        VALUES ('delete', old.consulta_id, old.texto, old.escopo);
+        INSERT INTO pessoas_relatorio_fts(rowid, texto, escopo) VALUES (new.consulta_id, new.texto, new.escopo);
+    END""",
+    "INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts) VALUES ('rebuild')",
+]
+SQL_SQLITE_REVERSO = [
+    'DROP TRIGGER pessoas_relatorio_fts_ai',
+    'DROP TRIGGER pessoas_relatorio_fts_ad',
+    'DROP TRIGGER pessoas_relatorio_fts_au',
+    'DROP TABLE pessoas_relatorio_fts',
+]
+
+
+def preencher_escopo(apps, schema_editor):
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    RelatorioConsulta = apps.get_model('pessoas', 'RelatorioConsulta')
+    medico_id = Subquery(Consulta.objects.filter(pk=OuterRef('consulta_id')).values('medico_id')[:1])
+    RelatorioConsulta.objects.using(schema_editor.connection.alias).update(
+        escopo=Concat(models.Value('medico'), Cast(medico_id, models.CharField()))
+    )
+
+
+def _executar(comandos_por_banco):
+    def executar(apps, schema_editor):
+        for sql in comandos_por_banco.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return executar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0014_relatorio_consulta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatorioconsulta',
+            name='escopo',
+            field=models.CharField(blank=True, editable=False, max_length=30),
+        ),
+        migrations.RunPython(preencher_escopo, migrations.RunPython.noop),
+        migrations.RunPython(
+            _executar({'mysql': SQL_MYSQL, 'sqlite': SQL_SQLITE}),
+            _executar({'mysql': SQL_MYSQL_REVERSO, 'sqlite': SQL_SQLITE_REVERSO}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0015_busca_relatorios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='chave_periodica',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:46
+
+import datetime
+from django.db import migrations, models
+
+
+def preencher_duracao(apps, schema_editor):
+    """As consultas já marcadas ficam com a duração atual da agenda do médico."""
+    Consulta = apps.get_model('pessoas', 'Consulta')
+    Perfil = apps.get_model('pessoas', 'Perfil')
+    banco = schema_editor.connection.alias
+    duracoes = Perfil.objects.using(banco).filter(tipo_usuario='medico').exclude(duracao_consulta=30)
+    for medico_id, minutos in duracoes.values_list('usuario_id', 'duracao_consulta'):
+        Consulta.objects.using(banco).filter(medico_id=medico_id).update(duracao=datetime.timedelta(minutes=minutos))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0017_tarefa_chave_periodica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='duracao',
+            field=models.DurationField(default=datetime.timedelta(seconds=1800)),
+        ),
+        migrations.RunPython(preencher_duracao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# No SQLite, o AlterField recria pessoas_relatorioconsulta e apaga os triggers
+# que mantêm a tabela FTS5 da busca (0015_busca_relatorios): eles são
+# recriados aqui, nos dois sentidos. No MySQL o índice FULLTEXT continua.
+GATILHOS_SQLITE = [
+    """CREATE TRIGGER pessoas_relatorio_fts_ai AFTER INSERT ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(rowid, texto, escopo) VALUES (new.consulta_id, new.texto, new.escopo);
+    END""",
+    """CREATE TRIGGER pessoas_relatorio_fts_ad AFTER DELETE ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts, rowid, texto, escopo)
+        VALUES ('delete', old.consulta_id, old.texto, old.escopo);
+    END""",
+    """CREATE TRIGGER pessoas_relatorio_fts_au AFTER UPDATE ON pessoas_relatorioconsulta BEGIN
+        INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts, rowid, texto, escopo)
+        VALUES ('delete', old.consulta_id, old.texto, old.escopo);
+        INSERT INTO pessoas_relatorio_fts(rowid, texto, escopo) VALUES (new.consulta_id, new.texto, new.escopo);
+    END""",
+    "INSERT INTO pessoas_relatorio_fts(pessoas_relatorio_fts) VALUES ('rebuild')",
+]
+
+
+def recriar_gatilhos(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in GATILHOS_SQLITE:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pessoas', '0018_consulta_duracao'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recriar_gatilhos),
+        migrations.AlterField(
+            model_name='relatorioconsulta',
+            name='consulta',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='relatorio_consulta', serialize=False, to='pessoas.consulta'),
+        ),
+        migrations.RunPython(recriar_gatilhos, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
 # pessoas/models.py
 
+import zlib
+from datetime import time, timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User # Importa o modelo de usuário padrão do Django
 
 # Modelo para estender o User padrão com o tipo de perfil (Médico ou Paciente)
@@ -16,10 +21,26 @@ class Perfil(models.Model):
     data_nascimento = models.DateField(null=True, blank=True)
     rg = models.CharField(max_length=20, null=True, blank=True)
     endereco = models.CharField(max_length=255, null=True, blank=True)
+    # Agenda do médico: usada para validar agendamentos e calcular horários livres
+    duracao_consulta = models.PositiveSmallIntegerField(default=30, help_text="Duração de cada consulta, em minutos (apenas médicos).")
+    inicio_expediente = models.TimeField(default=time(8, 0), help_text="Horário do primeiro atendimento (apenas médicos).")
+    fim_expediente = models.TimeField(default=time(18, 0), help_text="Horário em que o último atendimento deve terminar (apenas médicos).")
+    # Feed .ics da agenda do médico: link secreto e controle de alterações
+    token_agenda = models.CharField(max_length=43, unique=True, null=True, blank=True, editable=False)
+    versao_agenda = models.PositiveIntegerField(default=0, editable=False)
+    agenda_excluida_em = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f'{self.usuario.username} - {self.get_tipo_usuario_display()}'
 
+    class Meta:
+        indexes = [
+            # Listagens por cargo (User.objects.filter(perfil__tipo_usuario=...))
+            models.Index(fields=['tipo_usuario', 'usuario'], name='perfil_tipo_usuario_idx'),
+            # Busca de pacientes pelo RG
+            models.Index(fields=['rg'], name='perfil_rg_idx'),
+        ]
+
 # Modelo para armazenar as consultas
 class Consulta(models.Model):
     STATUS_CHOICES = (
@@ -27,24 +48,147 @@ class Consulta(models.Model):
         ('concluida', 'Concluída'),
         ('cancelada', 'Cancelada'),
     )
+    # Mudanças de status permitidas. Concluída é definitiva; reativar uma
+    # cancelada exige que o horário ainda esteja livre (reservar_horario)
+    TRANSICOES_STATUS = {
+        'agendada': {'concluida', 'cancelada'},
+        'cancelada': {'agendada'},
+        'concluida': set(),
+    }
     paciente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultas_como_paciente')
     medico = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultas_como_medico')
     data_hora = models.DateTimeField()
+    # Duração da agenda do médico quando a consulta foi marcada (reservar_horario):
+    # ele pode mudá-la depois, e as consultas já marcadas mantêm a sua
+    duracao = models.DurationField(default=timedelta(minutes=30))
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='agendada')
-    relatorio = models.TextField(blank=True, null=True, help_text="Relatório a ser preenchido pelo médico após a consulta.")
     criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    # Preenchido pela tarefa de lembretes quando o e-mail ao paciente é enviado
+    lembrete_enviado_em = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Veja ConsultaArquivada
+    arquivada = False
+
+    @property
+    def relatorio(self):
+        """
+        Texto do relatório (ou None). Fica em RelatorioConsulta para que as
+        listagens não tragam o texto: acessar aqui faz uma consulta, a não ser
+        com select_related('relatorio_consulta').
+        """
+        try:
+            return self.relatorio_consulta.texto
+        except ObjectDoesNotExist:
+            return None
 
     def __str__(self):
         return f'Consulta de {self.paciente.username} com Dr(a). {self.medico.last_name} em {self.data_hora.strftime("%d/%m/%Y %H:%M")}'
 
     class Meta:
         ordering = ['-data_hora']
+        indexes = [
+            # Painel do médico e verificação de conflito de horários de cada médico
+            models.Index(fields=['medico', 'data_hora'], name='consulta_medico_data_idx'),
+            # Painel do paciente
+            models.Index(fields=['paciente', 'data_hora'], name='consulta_paciente_data_idx'),
+            # Listagem paginada por (data_hora, id) no painel do atendente
+            models.Index(fields=['data_hora', 'id'], name='consulta_data_idx'),
+            # Dashboards e filtros por status em um intervalo de datas
+            models.Index(fields=['status', 'data_hora'], name='consulta_status_data_idx'),
+            # Sincronização incremental do feed .ics do médico
+            models.Index(fields=['medico', 'atualizado_em'], name='consulta_medico_atualiz_idx'),
+        ]
+
+# Relatório escrito pelo médico após a consulta, separado de Consulta para
+# que as listagens de consultas não carreguem textos longos.
+class RelatorioConsulta(models.Model):
+    # Sem chave estrangeira no banco: o relatório continua aqui (e na busca de
+    # texto completo) quando a consulta é arquivada, com o mesmo id em
+    # ConsultaArquivada. Excluir a consulta pelo ORM ainda exclui o relatório
+    consulta = models.OneToOneField(
+        Consulta, on_delete=models.CASCADE, primary_key=True, related_name='relatorio_consulta', db_constraint=False,
+    )
+    texto = models.TextField(blank=True, help_text="Relatório a ser preenchido pelo médico após a consulta.")
+    # Incrementada a cada alteração: quem salva com uma versão antiga é avisado
+    # em vez de sobrescrever a alteração de outra pessoa
+    versao = models.PositiveIntegerField(default=1)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    # Palavra "medico<id>" indexada junto com o texto na busca de texto completo,
+    # para que a busca de cada médico só percorra os relatórios dele
+    escopo = models.CharField(max_length=30, blank=True, editable=False)
+
+    @staticmethod
+    def escopo_do_medico(medico_id):
+        return f'medico{medico_id}'
+
+    def __str__(self):
+        return f'Relatório da consulta #{self.consulta_id} (versão {self.versao})'
+
+# Consultas antigas (concluídas ou canceladas) movidas para fora da tabela de
+# consultas pelo comando "python manage.py arquivar_consultas", com uma cópia
+# comprimida do relatório (o RelatorioConsulta fica, para a busca). Os painéis
+# de histórico leem as duas tabelas.
+class ConsultaArquivada(models.Model):
+    # Mantém o id da consulta original (links e referências continuam valendo)
+    id = models.BigIntegerField(primary_key=True)
+    paciente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultas_arquivadas_como_paciente')
+    medico = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultas_arquivadas_como_medico')
+    data_hora = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Consulta.STATUS_CHOICES)
+    relatorio_comprimido = models.BinaryField(null=True, blank=True)
+    criado_em = models.DateTimeField()
+    arquivada_em = models.DateTimeField(auto_now_add=True)
+
+    # Permite aos templates diferenciar das consultas ativas
+    arquivada = True
+
+    @staticmethod
+    def comprimir(texto):
+        return None if texto is None else zlib.compress(texto.encode('utf-8'), 9)
+
+    @property
+    def relatorio(self):
+        if self.relatorio_comprimido is None:
+            return None
+        return zlib.decompress(bytes(self.relatorio_comprimido)).decode('utf-8')
+
+    def __str__(self):
+        return f'Consulta arquivada de {self.paciente.username} com Dr(a). {self.medico.last_name} em {self.data_hora.strftime("%d/%m/%Y %H:%M")}'
+
+    class Meta:
+        ordering = ['-data_hora']
+        verbose_name_plural = 'consultas arquivadas'
+        indexes = [
+            models.Index(fields=['medico', 'data_hora'], name='arquivada_medico_data_idx'),
+            models.Index(fields=['paciente', 'data_hora'], name='arquivada_paciente_data_idx'),
+        ]
+
+# Tabela de resumo (materializada) com a quantidade de consultas por dia, médico e status.
+# É mantida pelos signals de Consulta e pode ser reconstruída com
+# "python manage.py reconstruir_ocupacao".
+class OcupacaoDiaria(models.Model):
+    data = models.DateField()
+    medico = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ocupacao_diaria')
+    status = models.CharField(max_length=10, choices=Consulta.STATUS_CHOICES)
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.data:%d/%m/%Y} - {self.medico.username} - {self.get_status_display()}: {self.total}'
+
+    class Meta:
+        ordering = ['data']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'medico', 'status'], name='ocupacao_diaria_unica'),
+        ]
 
         # pessoas/models.py
 
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator # Importe o validator
+from .imagens import LARGURAS_MINIATURA, caminho_miniatura
+from .texto import normalizar_texto
 
 class Medicamento(models.Model):
     """
@@ -71,9 +215,79 @@ class Medicamento(models.Model):
         default=True, 
         help_text="Marque esta opção se o medicamento exige receita médica."
     )
+    # Nome sem acentos e em minúsculas, indexado para a busca do catálogo
+    nome_busca = models.CharField(max_length=200, db_index=True, editable=False, default='')
+    # Nome da foto para a qual as miniaturas (WebP/JPEG) já foram geradas
+    miniaturas_de = models.CharField(max_length=100, blank=True, editable=False, default='')
 
     def __str__(self):
         return self.nome
 
+    @property
+    def tem_miniaturas(self):
+        return bool(self.foto) and self.miniaturas_de == self.foto.name
+
+    def _srcset(self, formato):
+        # "url_100 1x, url_200 2x"
+        menor = LARGURAS_MINIATURA[0]
+        return ', '.join(
+            f'{self.foto.storage.url(caminho_miniatura(self.foto.name, largura, formato))} {largura // menor}x'
+            for largura in LARGURAS_MINIATURA
+        )
+
+    @property
+    def miniatura_url(self):
+        return self.foto.storage.url(caminho_miniatura(self.foto.name, LARGURAS_MINIATURA[0], 'jpeg'))
+
+    @property
+    def srcset_webp(self):
+        return self._srcset('webp')
+
+    @property
+    def srcset_jpeg(self):
+        return self._srcset('jpeg')
+
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar_texto(self.nome)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nome' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nome_busca'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['nome'] # Ordena os medicamentos por nome em ordem alfabética
+
+
+# Fila de tarefas em segundo plano, guardada no próprio banco (sem broker externo).
+# As tarefas são executadas por "python manage.py processar_tarefas".
+class Tarefa(models.Model):
+    STATUS_CHOICES = (
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    )
+    tipo = models.CharField(max_length=100, help_text="Nome com que a função foi registrada em pessoas.tarefas.")
+    dados = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente')
+    executar_em = models.DateTimeField(default=timezone.now)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=5)
+    ultimo_erro = models.TextField(blank=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    # O tipo, na execução ainda não terminada de uma tarefa periódica (NULL nas
+    # demais). Por ser única, cada tipo periódico tem no máximo uma execução
+    # na fila, mesmo com vários workers agendando ao mesmo tempo
+    chave_periodica = models.CharField(max_length=100, null=True, blank=True, unique=True, editable=False)
+
+    def __str__(self):
+        return f'{self.tipo} #{self.pk} ({self.get_status_display()})'
+
     class Meta:
-        ordering = ['nome'] # Ordena os medicamentos por nome em ordem alfabética
\ No newline at end of file
+        ordering = ['executar_em']
+        indexes = [
+            # Próximas tarefas pendentes a executar (consulta do worker)
+            models.Index(fields=['status', 'executar_em'], name='tarefa_status_executar_idx'),
+        ]
@@ -0,0 +1,98 @@
+# pessoas/ocupacao.py
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Consulta, ConsultaArquivada, OcupacaoDiaria, Perfil
+
+
+def dia_da_consulta(data_hora):
+    """Dia (no fuso horário atual) ao qual a consulta pertence no resumo."""
+    return timezone.localtime(data_hora).date()
+
+
+def limites_do_dia(dia):
+    """Início e fim (exclusivo) do dia, para filtrar data_hora usando o índice."""
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def atualizar_ocupacao(medico_id, dia):
+    """
+    Recalcula as linhas do resumo de um médico em um dia.
+
+    Só as consultas daquele médico naquele dia são contadas, então o custo não
+    depende do tamanho da tabela de consultas. As arquivadas continuam contando.
+    A contagem e a gravação ficam na mesma transação, com o perfil do médico
+    travado (como em reservar_horario): duas gravações simultâneas para o
+    mesmo médico não conseguem gravar uma contagem antiga por último.
+    """
+    inicio, fim = limites_do_dia(dia)
+    with transaction.atomic():
+        list(Perfil.objects.select_for_update().filter(usuario_id=medico_id).values_list('pk', flat=True))
+        contagens = Counter()
+        for modelo in (Consulta, ConsultaArquivada):
+            contagens.update(dict(
+                modelo.objects.filter(
+                    medico_id=medico_id, data_hora__gte=inicio, data_hora__lt=fim
+                ).order_by().values_list('status').annotate(Count('id'))
+            ))
+
+        OcupacaoDiaria.objects.filter(medico_id=medico_id, data=dia).exclude(
+            status__in=contagens
+        ).delete()
+        if contagens:
+            OcupacaoDiaria.objects.bulk_create(
+                [
+                    OcupacaoDiaria(medico_id=medico_id, data=dia, status=status, total=total)
+                    for status, total in contagens.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['data', 'medico', 'status'],
+                update_fields=['total'],
+            )
+
+
+def reconstruir_ocupacao(tamanho_lote=1000):
+    """Apaga e recria todo o resumo a partir das consultas (ativas e arquivadas). Retorna o número de linhas."""
+    contagens = Counter()
+    for modelo in (Consulta, ConsultaArquivada):
+        agrupado = modelo.objects.order_by().annotate(
+            dia=TruncDate('data_hora')
+        ).values('dia', 'medico', 'status').annotate(total=Count('id'))
+        for linha in agrupado.iterator(chunk_size=tamanho_lote):
+            contagens[linha['dia'], linha['medico'], linha['status']] += linha['total']
+
+    criadas = 0
+    with transaction.atomic():
+        OcupacaoDiaria.objects.all().delete()
+        lote = []
+        for (dia, medico_id, status), total in contagens.items():
+            lote.append(OcupacaoDiaria(data=dia, medico_id=medico_id, status=status, total=total))
+            if len(lote) >= tamanho_lote:
+                OcupacaoDiaria.objects.bulk_create(lote)
+                criadas += len(lote)
+                lote = []
+        OcupacaoDiaria.objects.bulk_create(lote)
+        criadas += len(lote)
+    return criadas
+
+
+def ocupacao_por_medico(dia):
+    """Consultas de cada médico no dia, separadas por status, lidas apenas do resumo."""
+    linhas = OcupacaoDiaria.objects.filter(data=dia).select_related('medico').only(
+        'status', 'total', 'medico__username', 'medico__first_name', 'medico__last_name'
+    ).order_by('medico__first_name', 'medico__username')
+
+    por_medico = {}
+    for linha in linhas:
+        item = por_medico.setdefault(linha.medico_id, {
+            'medico': linha.medico, 'agendada': 0, 'concluida': 0, 'cancelada': 0,
+        })
+        item[linha.status] = linha.total
+    return list(por_medico.values())
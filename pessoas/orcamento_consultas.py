@@ -0,0 +1,178 @@
+# pessoas/orcamento_consultas.py
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# A mesma consulta (só com parâmetros diferentes) repetida a partir daqui
+# costuma ser um laço fazendo uma consulta por linha (N+1)
+REPETICOES_SUSPEITAS = 3
+
+# Medições em andamento no contexto atual (requisição, teste...). É uma
+# ContextVar: vale também nas threads de sync_to_async e de em_paralelo
+_medicoes = ContextVar('medicoes_consultas', default=())
+
+
+class MedicaoConsultas:
+    """Consultas SQL executadas durante um trecho de código."""
+
+    def __init__(self):
+        self.consultas = []  # (sql, duração em segundos)
+
+    @property
+    def total(self):
+        return len(self.consultas)
+
+    @property
+    def tempo_ms(self):
+        return sum(duracao for _, duracao in self.consultas) * 1000
+
+    def duplicadas(self, minimo=2):
+        """Consultas iguais a menos dos parâmetros, com o número de repetições (mais repetidas primeiro)."""
+        contagem = Counter(_normalizar(sql) for sql, _ in self.consultas)
+        return [(sql, vezes) for sql, vezes in contagem.most_common() if vezes >= minimo]
+
+    def relatorio(self):
+        linhas = [f'{self.total} consultas SQL em {self.tempo_ms:.1f} ms']
+        for sql, vezes in self.duplicadas():
+            linhas.append(f'  {vezes}x {sql}')
+        return '\n'.join(linhas)
+
+
+def _normalizar(sql):
+    # O SQL chega com os marcadores (%s) em vez dos valores; só o tamanho
+    # das listas de IN (...) muda entre chamadas do mesmo código
+    return re.sub(r'\((?:%s, )+%s\)', '(%s, ...)', sql)
+
+
+def _registrar(execute, sql, params, many, context):
+    medicoes = _medicoes.get()
+    if not medicoes:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        for medicao in medicoes:
+            medicao.consultas.append((sql, duracao))
+
+
+def _instalar(conexao):
+    if _registrar not in conexao.execute_wrappers:
+        conexao.execute_wrappers.append(_registrar)
+
+
+@receiver(connection_created)
+def instalar_na_nova_conexao(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+@contextmanager
+def medir_consultas():
+    """
+    Conta e cronometra as consultas SQL feitas dentro do bloco:
+
+        with medir_consultas() as medicao:
+            ...
+        medicao.total, medicao.tempo_ms, medicao.duplicadas()
+
+    Funciona sem DEBUG (não depende de connection.queries) e blocos podem
+    ser aninhados.
+    """
+    # Conexões abertas antes deste módulo ser importado não passaram pelo signal
+    for conexao in connections.all(initialized_only=True):
+        _instalar(conexao)
+    medicao = MedicaoConsultas()
+    token = _medicoes.set(_medicoes.get() + (medicao,))
+    try:
+        yield medicao
+    finally:
+        _medicoes.reset(token)
+
+
+def orcamento_da_url(nome_url):
+    """Número máximo de consultas declarado para a URL em settings.ORCAMENTO_CONSULTAS (ou None)."""
+    return getattr(settings, 'ORCAMENTO_CONSULTAS', {}).get(nome_url)
+
+
+def verificar_orcamento(nome_url, medicao):
+    """Registra no log as requisições acima do orçamento e as consultas repetidas demais."""
+    orcamento = orcamento_da_url(nome_url)
+    if orcamento is not None and medicao.total > orcamento:
+        logger.warning('%s excedeu o orçamento de %s consultas: %s', nome_url, orcamento, medicao.relatorio())
+        return
+    suspeitas = medicao.duplicadas(REPETICOES_SUSPEITAS)
+    if suspeitas:
+        logger.warning(
+            '%s repetiu consultas (possível N+1):\n%s', nome_url,
+            '\n'.join(f'  {vezes}x {sql}' for sql, vezes in suspeitas),
+        )
+
+
+class OrcamentoConsultasMiddleware:
+    """
+    Mede as consultas SQL de cada requisição e avisa no log (logger
+    pessoas.orcamento_consultas) quando a view passa do orçamento declarado
+    em ORCAMENTO_CONSULTAS ou repete a mesma consulta. Só age com
+    ORCAMENTO_CONSULTAS_ATIVO (por padrão, igual a DEBUG).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.ativo = getattr(settings, 'ORCAMENTO_CONSULTAS_ATIVO', settings.DEBUG)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.ativo:
+            return self.get_response(request)
+        with medir_consultas() as medicao:
+            resposta = self.get_response(request)
+        self._verificar(request, medicao)
+        return resposta
+
+    async def __acall__(self, request):
+        if not self.ativo:
+            return await self.get_response(request)
+        with medir_consultas() as medicao:
+            resposta = await self.get_response(request)
+        self._verificar(request, medicao)
+        return resposta
+
+    def _verificar(self, request, medicao):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match and resolver_match.url_name:
+            verificar_orcamento(resolver_match.url_name, medicao)
+
+
+class OrcamentoConsultasTestMixin:
+    """Para TestCase: falha o teste quando a view passa do orçamento de consultas."""
+
+    def assertDentroDoOrcamento(self, url, usuario=None):
+        if usuario is not None:
+            self.client.force_login(usuario)
+        with medir_consultas() as medicao:
+            resposta = self.client.get(url)
+        nome_url = resposta.resolver_match.url_name
+        orcamento = orcamento_da_url(nome_url)
+        if orcamento is None:
+            self.fail(f'{nome_url} não tem orçamento declarado em ORCAMENTO_CONSULTAS')
+        if medicao.total > orcamento:
+            self.fail(f'{url} ({nome_url}) excedeu o orçamento de {orcamento}: {medicao.relatorio()}')
+        return resposta
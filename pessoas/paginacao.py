@@ -0,0 +1,91 @@
+# pessoas/paginacao.py
+
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorInvalido(ValueError):
+    """Cursor recebido na URL que não pôde ser decodificado."""
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    # O DjangoJSONEncoder corta os microssegundos, o que faria a página repetir itens
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valor, pk):
+    """Transforma o par (valor, id) do último item da página em um token opaco."""
+    bruto = json.dumps([valor, pk], cls=_CursorEncoder)
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+
+def decodificar_cursor(cursor, campo):
+    """Converte o token de volta no par (valor, id), usando o tipo do campo do modelo."""
+    try:
+        valor, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return campo.to_python(valor), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, ValidationError) as erro:
+        raise CursorInvalido(cursor) from erro
+
+
+class PaginaCursor:
+    """Uma página de resultados e o cursor para buscar a próxima."""
+
+    def __init__(self, itens, proximo_cursor):
+        self.itens = itens
+        self.proximo_cursor = proximo_cursor
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+def paginar_por_cursor(queryset, cursor=None, tamanho=50, campo='data_hora', decrescente=False):
+    """
+    Paginação por chave (keyset) sobre (campo, id).
+
+    Em vez de OFFSET, cada página começa logo depois do último item da anterior,
+    então o custo da consulta não cresce conforme o usuário avança nas páginas.
+    Cursores inválidos são tratados como ausentes (primeira página).
+    """
+    campo_modelo = queryset.model._meta.get_field(campo)
+    if decrescente:
+        queryset = queryset.order_by(f'-{campo}', '-id')
+    else:
+        queryset = queryset.order_by(campo, 'id')
+
+    if cursor:
+        try:
+            valor, pk = decodificar_cursor(cursor, campo_modelo)
+        except CursorInvalido:
+            pass
+        else:
+            comparacao = 'lt' if decrescente else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{campo}__{comparacao}': valor})
+                | Q(**{campo: valor, f'id__{comparacao}': pk})
+            )
+
+    # Busca um item a mais só para saber se existe próxima página
+    itens = list(queryset[:tamanho + 1])
+    proximo_cursor = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor(getattr(ultimo, campo_modelo.attname), ultimo.pk)
+    return PaginaCursor(itens, proximo_cursor)
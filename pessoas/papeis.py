@@ -0,0 +1,94 @@
+# pessoas/papeis.py
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+from .models import Perfil
+
+# Papéis possíveis: os cargos de Perfil mais o administrador (is_staff)
+PAPEL_STAFF = 'staff'
+
+
+def papel_do_usuario(request):
+    """
+    Papel do usuário logado ('staff', 'medico', 'paciente', 'atendente' ou None).
+
+    Lido sempre do banco: com o UsuarioComPerfilBackend o perfil já veio no
+    mesmo SELECT do usuário e o papel sai sem custo; nas sessões abertas por
+    outros backends (ex.: allauth) custa uma consulta ao perfil. Não é guardado
+    na sessão nem no cache, então um usuário rebaixado perde o acesso já na
+    próxima requisição.
+    """
+    usuario = request.user
+    if not usuario.is_authenticated:
+        return None
+    if usuario.is_staff:
+        return PAPEL_STAFF
+    try:
+        return usuario.perfil.tipo_usuario
+    except Perfil.DoesNotExist:
+        return None
+
+
+def papel_requerido(*papeis):
+    """
+    Decorator de view: exige login e um dos papéis informados; caso contrário
+    redireciona para o painel (que leva cada usuário ao seu lugar).
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def _view_async(request, *args, **kwargs):
+                # request.user e request.papel consultam o banco: avaliados fora do event loop
+                negado = await sync_to_async(_acesso_negado)(request, papeis)
+                if negado is not None:
+                    return negado
+                return await view(request, *args, **kwargs)
+            return _view_async
+
+        @wraps(view)
+        @login_required
+        def _view(request, *args, **kwargs):
+            if request.papel not in papeis:
+                return redirect('painel')
+            return view(request, *args, **kwargs)
+        return _view
+    return decorator
+
+
+def _acesso_negado(request, papeis):
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if request.papel not in papeis:
+        return redirect('painel')
+    return None
+
+
+class PapelUsuarioMiddleware:
+    """
+    Disponibiliza request.papel, calculado só quando usado (compare com == ou in).
+    Deve vir depois do AuthenticationMiddleware. Funciona em WSGI e ASGI; em
+    views assíncronas avalie request.papel dentro de sync_to_async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.papel = SimpleLazyObject(lambda: papel_do_usuario(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.papel = SimpleLazyObject(lambda: papel_do_usuario(request))
+        return await self.get_response(request)
@@ -0,0 +1,44 @@
+# pessoas/relatorios.py
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RelatorioConsulta
+
+
+class RelatorioDesatualizado(Exception):
+    """O relatório foi alterado por outra pessoa depois de aberto para edição."""
+
+
+def versao_do_relatorio(consulta):
+    """Versão atual do relatório da consulta (0 se ainda não foi escrito)."""
+    return RelatorioConsulta.objects.filter(consulta=consulta).values_list('versao', flat=True).first() or 0
+
+
+def salvar_relatorio(consulta, texto, versao=None):
+    """
+    Grava o relatório da consulta e devolve a nova versão.
+
+    Com `versao` (a que o médico abriu para editar), só grava se ninguém
+    alterou o relatório nesse meio tempo; senão levanta RelatorioDesatualizado.
+    Sem `versao`, sobrescreve.
+    """
+    escopo = RelatorioConsulta.escopo_do_medico(consulta.medico_id)
+    atual = RelatorioConsulta.objects.filter(consulta=consulta)
+    if versao is not None:
+        atual = atual.filter(versao=versao)
+    # O índice de busca (FULLTEXT/FTS5) é atualizado pelo próprio banco a cada gravação
+    if atual.update(texto=texto, escopo=escopo, versao=F('versao') + 1, atualizado_em=timezone.now()):
+        return RelatorioConsulta.objects.values_list('versao', flat=True).get(consulta=consulta)
+
+    if versao:
+        # Pediu uma versão que não é mais a atual
+        raise RelatorioDesatualizado
+    try:
+        with transaction.atomic():
+            RelatorioConsulta.objects.create(consulta=consulta, texto=texto, escopo=escopo)
+    except IntegrityError:
+        # Outro relatório foi criado ao mesmo tempo
+        raise RelatorioDesatualizado
+    return 1
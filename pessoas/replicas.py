@@ -0,0 +1,161 @@
+# pessoas/replicas.py
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie que mantém as leituras no banco principal logo depois de uma escrita
+COOKIE_PRIMARIO = 'ler_do_primario'
+
+
+class _EstadoRequisicao:
+    def __init__(self, fixado_no_primario=False):
+        self.ler_da_replica = False
+        # Escreveu nesta requisição, ou numa anterior há menos de REPLICA_ATRASO_MAXIMO
+        self.escreveu = False
+        self.fixado_no_primario = fixado_no_primario
+
+
+# Estado da requisição atual. É um objeto mutável numa ContextVar: as threads
+# de sync_to_async e de em_paralelo enxergam (e marcam) o mesmo estado
+_estado = ContextVar('estado_replica', default=None)
+
+
+def alias_replica():
+    """Alias da réplica em DATABASES (settings.REPLICA_BANCO), ou None se não houver réplica."""
+    alias = getattr(settings, 'REPLICA_BANCO', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def banco_de_leitura():
+    """
+    Banco de onde ler agora: a réplica dentro de usar_replica(), a não ser
+    que a requisição já tenha escrito (ou escrito há pouco) ou esteja numa
+    transação; nesses casos o principal, para ler o que acabou de gravar.
+    """
+    replica = alias_replica()
+    estado = _estado.get()
+    if (
+        replica is None or estado is None or not estado.ler_da_replica
+        or estado.escreveu or estado.fixado_no_primario
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+    return replica
+
+
+@contextmanager
+def usar_replica():
+    """Manda as leituras do bloco para a réplica (também fora de requisições, ex.: comandos)."""
+    estado = _estado.get()
+    token = None
+    if estado is None:
+        estado = _EstadoRequisicao()
+        token = _estado.set(estado)
+    anterior = estado.ler_da_replica
+    estado.ler_da_replica = True
+    try:
+        yield
+    finally:
+        estado.ler_da_replica = anterior
+        if token is not None:
+            _estado.reset(token)
+
+
+def ler_da_replica(view):
+    """
+    Decorator para views só de leitura (dashboards, listagens, exportações):
+    as consultas de GET/HEAD vão para a réplica. Outros métodos ficam no
+    principal, já que podem ler para validar o que vão gravar.
+    """
+    def usa_replica(request):
+        return request.method in ('GET', 'HEAD')
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def _view_assincrona(request, *args, **kwargs):
+            if not usa_replica(request):
+                return await view(request, *args, **kwargs)
+            with usar_replica():
+                return await view(request, *args, **kwargs)
+        return _view_assincrona
+
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        if not usa_replica(request):
+            return view(request, *args, **kwargs)
+        with usar_replica():
+            return view(request, *args, **kwargs)
+    return _view
+
+
+class RoteadorReplica:
+    """
+    Roteador de bancos (DATABASE_ROUTERS): escritas sempre no principal;
+    leituras na réplica só quando banco_de_leitura() permitir.
+    """
+
+    def db_for_read(self, model, **hints):
+        return banco_de_leitura()
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado.escreveu = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica tem os mesmos dados do principal
+        bancos = {DEFAULT_DB_ALIAS, alias_replica()}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Guarda o estado da réplica de cada requisição. Depois de uma escrita,
+    define um cookie curto (REPLICA_ATRASO_MAXIMO segundos) para que as
+    próximas requisições do mesmo usuário (ex.: o redirect depois de um POST)
+    leiam do principal enquanto a réplica ainda pode estar atrasada.
+    Deve vir antes do SessionMiddleware, para contar as escritas da sessão.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        estado = _EstadoRequisicao(fixado_no_primario=COOKIE_PRIMARIO in request.COOKIES)
+        token = _estado.set(estado)
+        try:
+            resposta = self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._marcar_escrita(estado, resposta)
+
+    async def __acall__(self, request):
+        estado = _EstadoRequisicao(fixado_no_primario=COOKIE_PRIMARIO in request.COOKIES)
+        token = _estado.set(estado)
+        try:
+            resposta = await self.get_response(request)
+        finally:
+            _estado.reset(token)
+        return self._marcar_escrita(estado, resposta)
+
+    def _marcar_escrita(self, estado, resposta):
+        if estado.escreveu and alias_replica():
+            resposta.set_cookie(
+                COOKIE_PRIMARIO, '1', max_age=getattr(settings, 'REPLICA_ATRASO_MAXIMO', 5),
+                httponly=True, samesite='Lax',
+            )
+        return resposta
@@ -0,0 +1,173 @@
+# pessoas/server_timing.py
+
+import cProfile
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils import timezone
+
+from .orcamento_consultas import medir_consultas
+
+logger = logging.getLogger(__name__)
+
+# Tempos da requisição atual (nome -> segundos). ContextVar: vale também nas
+# threads de sync_to_async, onde as views assíncronas renderizam
+_tempos = ContextVar('tempos_requisicao', default=None)
+_trava = threading.Lock()
+# Só um cProfile ativo por processo: no Python 3.12+ um segundo enable() em
+# outra thread levanta ValueError. Sorteada com o perfilador ocupado, a
+# requisição segue sem perfil
+_trava_perfilador = threading.Lock()
+
+
+@contextmanager
+def cronometro(nome):
+    """
+    Soma o tempo do bloco à métrica `nome` do Server-Timing da requisição
+    atual. Fora de uma requisição medida não faz nada.
+    """
+    tempos = _tempos.get()
+    if tempos is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        with _trava:
+            tempos[nome] = tempos.get(nome, 0) + duracao
+
+
+class _TemplateCronometrado(Template):
+    def render(self, context=None, request=None):
+        with cronometro('template'):
+            return super().render(context, request)
+
+
+class TemplatesCronometrados(DjangoTemplates):
+    """Backend de templates do Django que mede o tempo de renderização para o Server-Timing."""
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return _TemplateCronometrado(template.template, self)
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return _TemplateCronometrado(template.template, self)
+
+
+def cabecalho_server_timing(tempos, medicao, total):
+    """
+    Monta o cabeçalho, ex.: db;dur=12.3;desc="8 consultas", template;dur=40.1, total;dur=61.0.
+    O tempo de template inclui as consultas feitas durante a renderização, e o
+    de db é a soma das consultas (as de em_paralelo rodam ao mesmo tempo).
+    """
+    metricas = [f'db;dur={medicao.tempo_ms:.1f};desc="{medicao.total} consultas"']
+    for nome in ('template', 'auth'):
+        if nome in tempos:
+            metricas.append(f'{nome};dur={tempos[nome] * 1000:.1f}')
+    metricas.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metricas)
+
+
+def _exibir_cabecalho(usuario):
+    """O Server-Timing expõe detalhes internos: só em DEBUG, para a equipe ou com SERVER_TIMING_PUBLICO."""
+    if settings.DEBUG or getattr(settings, 'SERVER_TIMING_PUBLICO', False):
+        return True
+    return bool(usuario and usuario.is_staff)
+
+
+def _nome_da_url(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.url_name if resolver_match and resolver_match.url_name else 'sem_nome'
+
+
+def salvar_perfil(perfilador, request, total):
+    """
+    Grava o perfil em PERFILADOR_DIRETORIO como <data>_<url>_<ms>ms.prof
+    (formato do pstats). Para ver como flamegraph: "flameprof arquivo.prof"
+    ou "snakeviz arquivo.prof".
+    """
+    diretorio = Path(settings.PERFILADOR_DIRETORIO)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    nome = f"{timezone.now():%Y%m%d_%H%M%S_%f}_{_nome_da_url(request)}_{total * 1000:.0f}ms.prof"
+    perfilador.dump_stats(diretorio / nome)
+    logger.info('Requisição lenta %s (%.0f ms): perfil salvo em %s', request.path, total * 1000, nome)
+
+
+class ServerTimingMiddleware:
+    """
+    Adiciona o cabeçalho Server-Timing (db, template, auth e total) às
+    respostas, visível na aba Network do navegador. Fora do DEBUG, só nas
+    respostas para a equipe (is_staff), a menos que SERVER_TIMING_PUBLICO
+    seja True. Deve ser o primeiro middleware, para o total incluir os demais.
+
+    Com PERFILADOR_TAXA_AMOSTRAGEM > 0, essa fração das requisições roda sob
+    o cProfile e as mais lentas que PERFILADOR_LIMITE_MS têm o perfil salvo.
+    Só as requisições sorteadas pagam o custo do cProfile. As views
+    assíncronas não são perfiladas (o cProfile mede uma thread só).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.taxa_amostragem = getattr(settings, 'PERFILADOR_TAXA_AMOSTRAGEM', 0)
+        self.limite = getattr(settings, 'PERFILADOR_LIMITE_MS', 500) / 1000
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        perfilador = None
+        if self.taxa_amostragem and random.random() < self.taxa_amostragem and _trava_perfilador.acquire(blocking=False):
+            perfilador = cProfile.Profile()
+        token = _tempos.set({})
+        inicio = time.perf_counter()
+        try:
+            with medir_consultas() as medicao:
+                if perfilador:
+                    try:
+                        perfilador.enable()
+                    except ValueError:
+                        # Outra ferramenta de perfil já está ativa no processo
+                        _trava_perfilador.release()
+                        perfilador = None
+                try:
+                    resposta = self.get_response(request)
+                finally:
+                    if perfilador:
+                        perfilador.disable()
+                        _trava_perfilador.release()
+            total = time.perf_counter() - inicio
+            if _exibir_cabecalho(getattr(request, 'user', None)):
+                resposta['Server-Timing'] = cabecalho_server_timing(_tempos.get(), medicao, total)
+        finally:
+            _tempos.reset(token)
+        if perfilador and total >= self.limite:
+            salvar_perfil(perfilador, request, total)
+        return resposta
+
+    async def __acall__(self, request):
+        token = _tempos.set({})
+        inicio = time.perf_counter()
+        try:
+            with medir_consultas() as medicao:
+                resposta = await self.get_response(request)
+            total = time.perf_counter() - inicio
+            usuario = await request.auser() if hasattr(request, 'auser') else None
+            if _exibir_cabecalho(usuario):
+                resposta['Server-Timing'] = cabecalho_server_timing(_tempos.get(), medicao, total)
+        finally:
+            _tempos.reset(token)
+        return resposta
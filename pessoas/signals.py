@@ -1,10 +1,14 @@
 # pessoas/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from allauth.socialaccount.signals import pre_social_login
-from .models import Perfil
+from .models import Perfil, Consulta, ConsultaArquivada, Medicamento, RelatorioConsulta
+from .agenda_ics import marcar_agenda_alterada
+from .estatisticas import invalidar_estatisticas_consultas
+from .imagens import atualizar_miniaturas_medicamento
+from .ocupacao import atualizar_ocupacao, dia_da_consulta
 
 @receiver(post_save, sender=User)
 def criar_perfil_usuario(sender, instance, created, **kwargs):
@@ -33,3 +37,64 @@ def vincular_conta_social(sender, request, sociallogin, **kwargs):
             sociallogin.connect(request, user)
     except User.DoesNotExist:
         pass
+
+@receiver(pre_save, sender=Consulta)
+def guardar_ocupacao_anterior(sender, instance, **kwargs):
+    """
+    Guarda o médico e o dia que a consulta tinha antes da alteração, para que
+    o resumo de ocupação do dia antigo também seja recalculado.
+    """
+    instance._ocupacao_anterior = None
+    if instance.pk:
+        anterior = Consulta.objects.filter(pk=instance.pk).values_list('medico_id', 'data_hora').first()
+        if anterior:
+            instance._ocupacao_anterior = (anterior[0], dia_da_consulta(anterior[1]))
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+def atualizar_resumos_consultas(sender, instance, **kwargs):
+    """
+    Mantém o resumo OcupacaoDiaria em dia e invalida o cache de estatísticas
+    do dashboard sempre que uma consulta muda.
+    """
+    afetados = {(instance.medico_id, dia_da_consulta(instance.data_hora))}
+    anterior = getattr(instance, '_ocupacao_anterior', None)
+    if anterior:
+        afetados.add(anterior)
+    for medico_id, dia in afetados:
+        atualizar_ocupacao(medico_id, dia)
+    invalidar_estatisticas_consultas()
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+def atualizar_versao_agenda(sender, instance, signal, **kwargs):
+    """
+    Muda a versão do feed .ics do médico. Se a consulta foi excluída ou
+    passou para outro médico, ela some da agenda antiga, o que só um feed
+    completo consegue refletir.
+    """
+    marcar_agenda_alterada(instance.medico_id, exclusao=signal is post_delete)
+    anterior = getattr(instance, '_ocupacao_anterior', None)
+    if anterior and anterior[0] != instance.medico_id:
+        marcar_agenda_alterada(anterior[0], exclusao=True)
+
+@receiver(post_save, sender=Consulta)
+def atualizar_escopo_relatorio(sender, instance, **kwargs):
+    """Se a consulta passou para outro médico, o relatório passa a aparecer na busca dele."""
+    anterior = getattr(instance, '_ocupacao_anterior', None)
+    if anterior and anterior[0] != instance.medico_id:
+        RelatorioConsulta.objects.filter(consulta=instance).update(
+            escopo=RelatorioConsulta.escopo_do_medico(instance.medico_id)
+        )
+
+@receiver(post_save, sender=Medicamento)
+def gerar_miniaturas_medicamento(sender, instance, **kwargs):
+    """
+    Gera as miniaturas (WebP e JPEG) quando a foto do medicamento é enviada ou trocada.
+    """
+    atualizar_miniaturas_medicamento(instance)
+
+@receiver(post_delete, sender=ConsultaArquivada)
+def excluir_relatorio_arquivado(sender, instance, **kwargs):
+    """O relatório de uma consulta arquivada fica em RelatorioConsulta (sem chave estrangeira): sai junto com ela."""
+    RelatorioConsulta.objects.filter(consulta_id=instance.pk).delete()
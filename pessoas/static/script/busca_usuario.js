@@ -0,0 +1,37 @@
+// ===== BUSCA DE USUÁRIOS (PACIENTE / MÉDICO) =====
+// Preenche as sugestões do <datalist> consultando a busca JSON do servidor
+// e guarda o id do usuário escolhido no campo oculto do formulário.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.busca-usuario').forEach(function(campo) {
+        const alvo = document.getElementById(campo.dataset.alvo);
+        const opcoes = document.getElementById(campo.getAttribute('list'));
+        let espera = null;
+
+        campo.addEventListener('input', function() {
+            // Se o texto corresponde a uma sugestão, seleciona o usuário
+            const escolhida = Array.from(opcoes.options).find(opcao => opcao.value === campo.value);
+            alvo.value = escolhida ? escolhida.dataset.id : '';
+            if (escolhida || campo.value.trim().length < 2) {
+                return;
+            }
+
+            // Espera o usuário parar de digitar antes de consultar o servidor
+            clearTimeout(espera);
+            espera = setTimeout(function() {
+                const url = new URL(campo.dataset.url, window.location.origin);
+                url.searchParams.set('q', campo.value.trim());
+                fetch(url)
+                    .then(resposta => resposta.json())
+                    .then(function(dados) {
+                        opcoes.innerHTML = '';
+                        dados.resultados.forEach(function(usuario) {
+                            const opcao = document.createElement('option');
+                            opcao.value = usuario.rotulo;
+                            opcao.dataset.id = usuario.id;
+                            opcoes.appendChild(opcao);
+                        });
+                    });
+            }, 250);
+        });
+    });
+});
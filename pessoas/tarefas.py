@@ -0,0 +1,144 @@
+# pessoas/tarefas.py
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+# Espera antes da 1ª nova tentativa; dobra a cada falha, até o limite
+ESPERA_INICIAL = timedelta(seconds=30)
+ESPERA_MAXIMA = timedelta(hours=1)
+# Tarefas "executando" há mais tempo que isso são de um worker que parou
+TEMPO_LIMITE_EXECUCAO = timedelta(minutes=30)
+
+# tipo -> (função, intervalo para tarefas periódicas ou None)
+_REGISTRO = {}
+
+
+def tarefa(tipo, intervalo=None):
+    """
+    Registra uma função como tipo de tarefa. A função recebe os dados da
+    tarefa como argumentos nomeados. Com intervalo, a tarefa é periódica: ao
+    terminar, uma nova é agendada para daqui a intervalo.
+    """
+    def decorator(funcao):
+        _REGISTRO[tipo] = (funcao, intervalo)
+        return funcao
+    return decorator
+
+
+def enfileirar(tipo, dados=None, executar_em=None, max_tentativas=5):
+    """Cria uma tarefa pendente para ser executada pelo worker."""
+    if tipo not in _REGISTRO:
+        raise ValueError(f"Tipo de tarefa não registrado: {tipo}")
+    return Tarefa.objects.create(
+        tipo=tipo,
+        dados=dados or {},
+        executar_em=executar_em or timezone.now(),
+        max_tentativas=max_tentativas,
+    )
+
+
+def _enfileirar_periodica(tipo, dados=None, executar_em=None, max_tentativas=5):
+    """
+    Agenda a próxima execução de uma tarefa periódica, se ela ainda não tiver
+    uma na fila. A garantia vem da coluna única chave_periodica, então vale
+    também para workers agendando ao mesmo tempo. Devolve a tarefa ou None.
+    """
+    try:
+        with transaction.atomic():
+            return Tarefa.objects.create(
+                tipo=tipo,
+                dados=dados or {},
+                executar_em=executar_em or timezone.now(),
+                max_tentativas=max_tentativas,
+                chave_periodica=tipo,
+            )
+    except IntegrityError:
+        return None
+
+
+def agendar_periodicas():
+    """Garante que cada tarefa periódica registrada tenha uma execução pendente."""
+    for tipo, (_, intervalo) in _REGISTRO.items():
+        # exists() cobre as execuções criadas antes da chave_periodica
+        if intervalo and not Tarefa.objects.filter(tipo=tipo, status__in=('pendente', 'executando')).exists():
+            _enfileirar_periodica(tipo)
+
+
+def liberar_travadas(agora=None):
+    """Devolve à fila as tarefas de workers que pararam no meio da execução."""
+    agora = agora or timezone.now()
+    return Tarefa.objects.filter(
+        status='executando', iniciada_em__lt=agora - TEMPO_LIMITE_EXECUCAO
+    ).update(status='pendente', executar_em=agora)
+
+
+def reservar_tarefas(limite=10):
+    """
+    Marca até `limite` tarefas vencidas como "executando" e as devolve.
+
+    O SELECT ... FOR UPDATE SKIP LOCKED faz cada worker pular as linhas que
+    outro worker está reservando, então vários workers podem rodar juntos
+    sem pegar a mesma tarefa. Bancos sem SKIP LOCKED (SQLite) serializam as
+    escritas de qualquer forma.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        pendentes = Tarefa.objects.filter(status='pendente', executar_em__lte=agora).order_by('executar_em', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            pendentes = pendentes.select_for_update(skip_locked=True)
+        else:
+            pendentes = pendentes.select_for_update()
+        tarefas = list(pendentes[:limite])
+        if tarefas:
+            Tarefa.objects.filter(pk__in=[t.pk for t in tarefas]).update(status='executando', iniciada_em=agora)
+    for t in tarefas:
+        t.status = 'executando'
+        t.iniciada_em = agora
+    return tarefas
+
+
+def espera_nova_tentativa(tentativas):
+    """Backoff exponencial com variação aleatória (evita falhas em sincronia)."""
+    espera = min(ESPERA_INICIAL * (2 ** (tentativas - 1)), ESPERA_MAXIMA)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def executar_tarefa(t):
+    """Executa uma tarefa reservada e grava o resultado (ou agenda uma nova tentativa)."""
+    funcao, intervalo = _REGISTRO.get(t.tipo, (None, None))
+    t.tentativas += 1
+    try:
+        if funcao is None:
+            raise LookupError(f"Tipo de tarefa não registrado: {t.tipo}")
+        funcao(**t.dados)
+    except Exception:
+        t.ultimo_erro = traceback.format_exc()
+        if t.tentativas < t.max_tentativas and funcao is not None:
+            t.status = 'pendente'
+            t.executar_em = timezone.now() + espera_nova_tentativa(t.tentativas)
+            logger.warning('Tarefa %s falhou (tentativa %s), nova tentativa em %s', t, t.tentativas, t.executar_em)
+        else:
+            t.status = 'falhou'
+            t.concluida_em = timezone.now()
+            logger.error('Tarefa %s falhou definitivamente', t)
+    else:
+        t.status = 'concluida'
+        t.concluida_em = timezone.now()
+        t.ultimo_erro = ''
+    if t.status != 'pendente':
+        # Terminou: libera a chave para a próxima execução da tarefa periódica
+        t.chave_periodica = None
+    t.save(update_fields=['status', 'tentativas', 'executar_em', 'ultimo_erro', 'concluida_em', 'chave_periodica'])
+
+    if intervalo and t.status != 'pendente':
+        _enfileirar_periodica(t.tipo, t.dados, executar_em=timezone.now() + intervalo, max_tentativas=t.max_tentativas)
+    return t.status == 'concluida'
@@ -1,3 +1,1358 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import pstats
+import re
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter, sleep
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core import mail
+from django.core.files.storage import InMemoryStorage
+from django.db import IntegrityError, connection, models
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .agenda_ics import gerar_token_agenda
+from .arquivamento import arquivar_consultas
+from .assincrono import em_paralelo
+from .benchmark import _nomes_das_urls, executar_benchmark
+from .busca import buscar_medicamentos, buscar_usuarios, filtrar_medicamentos_por_nome
+from .catalogo import _valor, sincronizar_precos
+from .busca_relatorios import buscar_relatorios, trecho_destacado
+from .dados_sinteticos import gerar_dados
+from .exportacao import CABECALHO, linhas_consultas
+from .estatisticas import ESTATISTICAS_TIMEOUT, obter_estatisticas_consultas, timeout_estatisticas
+from .disponibilidade import AgendaMedico, HorarioIndisponivel, horarios_livres, reservar_horario
+from .importacao import importar_pacientes
+from .imagens import caminho_miniatura, gerar_miniaturas
+from .lembretes import enviar_lembretes
+from .limite_login import METRICAS_EXPIRACAO, metricas, verificar_configuracao
+from .models import User, Consulta, Medicamento, Tarefa, OcupacaoDiaria, ConsultaArquivada, RelatorioConsulta
+from .orcamento_consultas import OrcamentoConsultasTestMixin, medir_consultas
+from .paginacao import codificar_cursor, paginar_por_cursor
+from .relatorios import RelatorioDesatualizado, salvar_relatorio
+from . import server_timing
+from .replicas import COOKIE_PRIMARIO, RoteadorReplica, alias_replica, banco_de_leitura, usar_replica
+from . import tarefas
 
 # Create your tests here.
+
+
+def criar_usuario(username, tipo_usuario, **extra):
+    """Cria um usuário e ajusta o Perfil criado pelo signal para o cargo pedido."""
+    usuario = User.objects.create_user(username=username, password='senha-teste', **extra)
+    usuario.perfil.tipo_usuario = tipo_usuario
+    usuario.perfil.save()
+    return usuario
+
+
+def _varreduras_sqlite(cursor, sql):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+    plano = [linha[-1] for linha in cursor.fetchall()]
+    # "SCAN tabela" sem "USING ... INDEX" é leitura completa da tabela
+    return {
+        re.match(r'SCAN (\w+)', passo).group(1)
+        for passo in plano
+        if re.match(r'SCAN \w+$', passo)
+    }
+
+
+def _varreduras_mysql(cursor, sql):
+    cursor.execute(f'EXPLAIN FORMAT=JSON {sql}')
+    plano = cursor.fetchone()[0]
+    tabelas = set()
+
+    def percorrer(no):
+        if isinstance(no, dict):
+            if no.get('access_type') == 'ALL':
+                tabelas.add(no.get('table_name'))
+            for valor in no.values():
+                percorrer(valor)
+        elif isinstance(no, list):
+            for valor in no:
+                percorrer(valor)
+
+    percorrer(json.loads(plano))
+    return tabelas
+
+
+_VARREDURAS_POR_BANCO = {'sqlite': _varreduras_sqlite, 'mysql': _varreduras_mysql}
+
+
+def tabelas_com_varredura_completa(sql):
+    """
+    Roda EXPLAIN no SQL e devolve as tabelas lidas por inteiro (sem índice).
+
+    Suporta SQLite (testes locais) e MySQL (produção); nos outros bancos os
+    testes que a usam são pulados.
+    """
+    with connection.cursor() as cursor:
+        return _VARREDURAS_POR_BANCO[connection.vendor](cursor, sql)
+
+
+@skipUnless(connection.vendor in _VARREDURAS_POR_BANCO, f'EXPLAIN não suportado para {connection.vendor}')
+class IndicesConsultasTests(TestCase):
+    """
+    Garante que as consultas das telas mais acessadas usam os índices
+    compostos de Consulta e Perfil em vez de ler as tabelas inteiras.
+    """
+
+    # Tabelas que crescem com o uso e não podem ser lidas por inteiro
+    TABELAS_VIGIADAS = {'pessoas_consulta', 'pessoas_perfil'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        cls.atendente = criar_usuario('atendente', 'atendente')
+        cls.medico = criar_usuario('medico', 'medico', first_name='Ana')
+        cls.paciente = criar_usuario('paciente', 'paciente')
+        agora = timezone.now()
+        Consulta.objects.bulk_create([
+            Consulta(paciente=cls.paciente, medico=cls.medico, data_hora=agora + timedelta(hours=i), status=status)
+            for i, status in enumerate(['agendada', 'concluida', 'cancelada'] * 5)
+        ])
+
+    def assertSemVarreduraCompleta(self, usuario, url):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as capturadas:
+            resposta = self.client.get(url)
+        self.assertLess(resposta.status_code, 400)
+
+        for consulta in capturadas.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT') or not any(t in sql for t in self.TABELAS_VIGIADAS):
+                continue
+            varridas = tabelas_com_varredura_completa(sql) & self.TABELAS_VIGIADAS
+            self.assertFalse(varridas, f'{url} faz varredura completa em {varridas}:\n{sql}')
+
+    def test_painel_medico(self):
+        self.assertSemVarreduraCompleta(self.medico, reverse('painel_medico'))
+
+    def test_painel_paciente(self):
+        self.assertSemVarreduraCompleta(self.paciente, reverse('painel_paciente'))
+
+    def test_painel_atendente(self):
+        url = reverse('painel_atendente')
+        self.assertSemVarreduraCompleta(self.atendente, url)
+        self.assertSemVarreduraCompleta(self.atendente, f'{url}?status=agendada')
+        self.assertSemVarreduraCompleta(self.atendente, f'{url}?medico={self.medico.pk}')
+
+    def test_dashboard_ocupacao(self):
+        self.assertSemVarreduraCompleta(self.staff, reverse('dashboard_ocupacao'))
+
+    def test_dashboards_por_cargo(self):
+        self.assertSemVarreduraCompleta(self.staff, reverse('dashboard_pacientes'))
+        self.assertSemVarreduraCompleta(self.staff, reverse('dashboard_medicos'))
+
+    def test_horarios_livres(self):
+        self.assertSemVarreduraCompleta(
+            self.paciente, reverse('horarios_livres_medico', args=[self.medico.pk])
+        )
+
+
+class BenchmarkTests(TestCase):
+    """Roda o gerador de dados sintéticos e o benchmark em escala mínima."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        cls.criados = gerar_dados(
+            pacientes=20, medicos=3, atendentes=1, consultas=200, medicamentos=30, semente=1
+        )
+
+    def test_gerar_dados(self):
+        self.assertEqual(
+            self.criados,
+            {'medicos': 3, 'pacientes': 20, 'atendentes': 1, 'medicamentos': 30, 'consultas': 200},
+        )
+        # Sem dois horários iguais para o mesmo médico
+        duplicados = (
+            Consulta.objects.values('medico', 'data_hora')
+            .annotate(total=models.Count('id')).filter(total__gt=1)
+        )
+        self.assertFalse(duplicados.exists())
+
+    def test_segunda_execucao_nao_repete_horarios(self):
+        gerar_dados(consultas=200, semente=1)
+        self.assertEqual(Consulta.objects.count(), 400)
+        duplicados = (
+            Consulta.objects.values('medico', 'data_hora')
+            .annotate(total=models.Count('id')).filter(total__gt=1)
+        )
+        self.assertFalse(duplicados.exists())
+        self.assertEqual(
+            RelatorioConsulta.objects.count(), Consulta.objects.filter(status='concluida').count()
+        )
+
+    def test_benchmark_cobre_todas_as_urls(self):
+        resultado = executar_benchmark(repeticoes=1, aquecimento=0)
+        json.dumps(resultado)
+
+        medidas = {item['url'] for item in resultado['resultados']}
+        ignoradas = {item['url'] for item in resultado['ignoradas']}
+        self.assertEqual(medidas | ignoradas, {nome for nome, _ in _nomes_das_urls()})
+        for item in resultado['resultados']:
+            self.assertLessEqual(item['p50_ms'], item['max_ms'])
+        painel = next(item for item in resultado['resultados'] if item['url'] == 'painel_medico' and item['papel'] == 'medico')
+        self.assertGreater(painel['consultas_sql'], 0)
+
+
+
+class BenchmarkSemDadosTests(TestCase):
+    def test_apaga_usuarios_criados_para_a_medicao(self):
+        resultado = executar_benchmark(repeticoes=1, aquecimento=0, papeis=('medico',), nomes=['painel_medico'])
+        self.assertEqual(resultado['resultados'][0]['status'], 200)
+        self.assertFalse(User.objects.filter(username__startswith='benchmark_').exists())
+
+
+class OrcamentoConsultasTests(OrcamentoConsultasTestMixin, TestCase):
+    """
+    Cada tela fica dentro do orçamento de consultas de ORCAMENTO_CONSULTAS.
+    Há linhas suficientes para que uma consulta por linha (N+1) estoure o orçamento.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        gerar_dados(pacientes=15, medicos=3, atendentes=1, consultas=120, medicamentos=20, semente=1)
+        cls.atendente = User.objects.filter(perfil__tipo_usuario='atendente').first()
+        cls.medico = User.objects.filter(perfil__tipo_usuario='medico').first()
+        cls.consulta = Consulta.objects.filter(medico=cls.medico).first()
+        cls.paciente = cls.consulta.paciente
+
+    def test_paineis(self):
+        self.assertDentroDoOrcamento(reverse('painel_paciente'), self.paciente)
+        self.assertDentroDoOrcamento(reverse('painel_medico'), self.medico)
+        self.assertDentroDoOrcamento(reverse('painel_atendente'), self.atendente)
+        self.assertDentroDoOrcamento(reverse('horarios_livres_medico', args=[self.medico.pk]), self.paciente)
+        self.assertDentroDoOrcamento(reverse('escrever_relatorio', args=[self.consulta.pk]), self.medico)
+
+    def test_dashboards(self):
+        for nome in ('dashboard_consultas', 'dashboard_ocupacao', 'dashboard_pacientes',
+                     'dashboard_medicos', 'dashboard_produtos', 'lista_medicamentos'):
+            self.assertDentroDoOrcamento(reverse(nome), self.staff)
+
+    def test_api(self):
+        for nome in ('api_consultas', 'api_medicamentos', 'api_medicos', 'api_pacientes'):
+            self.assertDentroDoOrcamento(reverse(nome), self.staff)
+
+    def test_detecta_consultas_repetidas(self):
+        with medir_consultas() as medicao:
+            for consulta in Consulta.objects.all()[:5]:
+                consulta.paciente.username
+        self.assertEqual(medicao.total, 6)
+        sql, vezes = medicao.duplicadas()[0]
+        self.assertEqual(vezes, 5)
+        self.assertIn('auth_user', sql)
+
+
+@mock.patch('pessoas.replicas.alias_replica', return_value='replica')
+class RoteadorReplicaTests(SimpleTestCase):
+    """Quando as leituras vão para a réplica e quando voltam para o principal."""
+
+    def test_le_da_replica_so_quando_pedido(self, _):
+        self.assertEqual(banco_de_leitura(), 'default')
+        with usar_replica():
+            self.assertEqual(RoteadorReplica().db_for_read(Consulta), 'replica')
+        self.assertEqual(banco_de_leitura(), 'default')
+
+    def test_le_do_principal_depois_de_escrever(self, _):
+        with usar_replica():
+            self.assertEqual(RoteadorReplica().db_for_write(Consulta), 'default')
+            self.assertEqual(RoteadorReplica().db_for_read(Consulta), 'default')
+
+
+class ReplicaMiddlewareTests(TestCase):
+    @mock.patch('pessoas.replicas.alias_replica', return_value='replica')
+    def test_cookie_depois_de_escrever(self, _):
+        User.objects.create_user(username='paciente', password='senha-teste')
+        resposta = self.client.post(reverse('login'), {'username': 'paciente', 'password': 'senha-teste'})
+        self.assertIn(COOKIE_PRIMARIO, resposta.cookies)
+        resposta = self.client.get(reverse('sobre'))
+        self.assertNotIn(COOKIE_PRIMARIO, resposta.cookies)
+
+    @mock.patch('pessoas.replicas.alias_replica', return_value='replica')
+    def test_estatisticas_do_principal(self, _):
+        # Não há banco "replica" aqui: ler dele levantaria ConnectionDoesNotExist
+        with usar_replica(), CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 0)
+        self.assertEqual(len(capturadas), 1)
+
+
+def _replica_separada():
+    replica = alias_replica()
+    return replica is not None and not settings.DATABASES[replica].get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(_replica_separada(), 'sem réplica em banco à parte (ex.: DB_REPLICA_SQLITE=/tmp/replica.sqlite3)')
+class ReplicaSqliteTests(TransactionTestCase):
+    """
+    Com a réplica num banco de verdade (ex.: dois arquivos SQLite), sem mocks.
+    TransactionTestCase: dentro de uma transação as leituras ficam no principal.
+    """
+    databases = {'default', alias_replica()} if _replica_separada() else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        Consulta.objects.create(paciente=paciente, medico=medico, data_hora=timezone.now() + timedelta(days=1))
+
+    def test_leituras_vao_para_a_replica(self):
+        # A réplica "atrasada" ainda não tem a consulta gravada no principal
+        with usar_replica():
+            self.assertFalse(Consulta.objects.exists())
+        self.assertTrue(Consulta.objects.exists())
+
+    def test_estatisticas_em_cache_vem_do_principal(self):
+        with usar_replica():
+            self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 1)
+
+
+class EstatisticasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        cls.paciente = criar_usuario('paciente', 'paciente')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def agendar(self, **campos):
+        return Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico, data_hora=timezone.now() + timedelta(days=1), **campos
+        )
+
+    def test_segunda_leitura_vem_do_cache(self):
+        self.agendar()
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 1)
+            self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 1)
+        self.assertEqual(len(capturadas), 1)
+
+    def test_salvar_e_excluir_consulta_invalidam(self):
+        consulta = self.agendar()
+        self.assertEqual(obter_estatisticas_consultas()['consultas_agendadas'], 1)
+
+        consulta.status = 'concluida'
+        consulta.save()
+        estatisticas = obter_estatisticas_consultas()
+        self.assertEqual((estatisticas['consultas_agendadas'], estatisticas['consultas_realizadas']), (0, 1))
+
+        self.agendar()
+        self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 2)
+        consulta.delete()
+        self.assertEqual(obter_estatisticas_consultas()['total_consultas'], 1)
+
+    def test_cache_por_processo_expira_logo(self):
+        self.assertLess(timeout_estatisticas(), ESTATISTICAS_TIMEOUT)
+        redis = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}
+        with override_settings(CACHES={**settings.CACHES, 'default': redis}):
+            self.assertEqual(timeout_estatisticas(), ESTATISTICAS_TIMEOUT)
+
+
+class PaginacaoCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        cls.atendente = criar_usuario('atendente', 'atendente')
+        inicio = timezone.now().replace(microsecond=0)
+        # Três consultas no mesmo horário, para que a página termine no meio do empate
+        horarios = [inicio, inicio + timedelta(hours=1), inicio + timedelta(hours=1),
+                    inicio + timedelta(hours=1), inicio + timedelta(hours=2), inicio + timedelta(hours=3)]
+        Consulta.objects.bulk_create([
+            Consulta(paciente=paciente, medico=medico, data_hora=horario, status=('agendada', 'cancelada')[numero % 2])
+            for numero, horario in enumerate(horarios)
+        ])
+
+    def percorrer(self, consultas, tamanho, **kwargs):
+        ids, cursor = [], None
+        while True:
+            pagina = paginar_por_cursor(consultas, cursor, tamanho=tamanho, **kwargs)
+            self.assertLessEqual(len(pagina), tamanho)
+            ids += [consulta.pk for consulta in pagina]
+            if not pagina.tem_proxima:
+                return ids
+            cursor = pagina.proximo_cursor
+
+    def test_cada_linha_uma_vez_e_em_ordem(self):
+        for tamanho in (1, 2, 4, 10):
+            self.assertEqual(
+                self.percorrer(Consulta.objects.all(), tamanho),
+                list(Consulta.objects.order_by('data_hora', 'id').values_list('id', flat=True)),
+            )
+            self.assertEqual(
+                self.percorrer(Consulta.objects.all(), tamanho, decrescente=True),
+                list(Consulta.objects.order_by('-data_hora', '-id').values_list('id', flat=True)),
+            )
+
+    def test_empate_no_horario_desempatado_pelo_id(self):
+        horario = Consulta.objects.order_by('data_hora').values_list('data_hora', flat=True)[1]
+        empatadas = Consulta.objects.filter(data_hora=horario)
+        self.assertEqual(empatadas.count(), 3)
+        ids = sorted(empatadas.values_list('id', flat=True))
+        primeira = paginar_por_cursor(empatadas, tamanho=1)
+        segunda = paginar_por_cursor(empatadas, primeira.proximo_cursor, tamanho=1)
+        self.assertEqual([primeira.itens[0].pk, segunda.itens[0].pk], ids[:2])
+        self.assertEqual(paginar_por_cursor(empatadas, segunda.proximo_cursor, tamanho=1).itens[0].pk, ids[2])
+
+    def test_cursor_invalido_e_a_primeira_pagina(self):
+        primeira = [consulta.pk for consulta in paginar_por_cursor(Consulta.objects.all(), tamanho=2)]
+        valido = paginar_por_cursor(Consulta.objects.all(), tamanho=2).proximo_cursor
+        for cursor in ('lixo', '%%%', valido[:-3], codificar_cursor('não é data', 1), codificar_cursor(None, 'x')):
+            with self.subTest(cursor=cursor):
+                pagina = paginar_por_cursor(Consulta.objects.all(), cursor, tamanho=2)
+                self.assertEqual([consulta.pk for consulta in pagina], primeira)
+
+    @mock.patch('pessoas.views.CONSULTAS_POR_PAGINA', 2)
+    def test_filtro_mantido_entre_as_paginas(self):
+        self.client.force_login(self.atendente)
+        ids, url = [], f"{reverse('painel_atendente')}?status=cancelada"
+        while url:
+            resposta = self.client.get(url)
+            self.assertTrue(all(consulta.status == 'cancelada' for consulta in resposta.context['consultas']))
+            ids += [consulta.pk for consulta in resposta.context['consultas']]
+            proxima = resposta.context['proxima_pagina']
+            if proxima:
+                self.assertIn('status=cancelada', proxima)
+            url = proxima and f"{reverse('painel_atendente')}?{proxima}"
+        self.assertEqual(
+            ids, list(Consulta.objects.filter(status='cancelada').order_by('data_hora', 'id').values_list('id', flat=True))
+        )
+
+
+class ArquivamentoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        cls.paciente = criar_usuario('paciente', 'paciente')
+        agora = timezone.now()
+        concluida, *_ = Consulta.objects.bulk_create([
+            Consulta(paciente=cls.paciente, medico=cls.medico, data_hora=agora - timedelta(days=400), status='concluida'),
+            Consulta(paciente=cls.paciente, medico=cls.medico, data_hora=agora - timedelta(days=400), status='agendada'),
+            Consulta(paciente=cls.paciente, medico=cls.medico, data_hora=agora + timedelta(days=1), status='agendada'),
+        ])
+        salvar_relatorio(concluida, 'Paciente estável. ' * 50)
+
+    def test_arquiva_so_as_encerradas_antigas(self):
+        self.assertEqual(arquivar_consultas(dias=365), 1)
+        self.assertEqual(Consulta.objects.count(), 2)
+        arquivada = ConsultaArquivada.objects.get()
+        self.assertTrue(RelatorioConsulta.objects.filter(consulta_id=arquivada.pk).exists())
+        self.assertEqual(arquivada.relatorio, 'Paciente estável. ' * 50)
+        self.assertLess(len(arquivada.relatorio_comprimido), len(arquivada.relatorio))
+
+    def test_conflito_desfaz_o_lote(self):
+        concluida = Consulta.objects.get(status='concluida')
+        ConsultaArquivada.objects.create(
+            id=concluida.pk, paciente=self.paciente, medico=self.medico,
+            data_hora=concluida.data_hora, status='concluida', criado_em=concluida.criado_em,
+        )
+        with self.assertRaises(IntegrityError):
+            arquivar_consultas(dias=365)
+        self.assertTrue(Consulta.objects.filter(pk=concluida.pk).exists())
+        self.assertTrue(RelatorioConsulta.objects.filter(consulta=concluida).exists())
+
+    def test_arquivadas_depois_das_ativas(self):
+        arquivar_consultas(dias=365)
+        for usuario, nome in ((self.paciente, 'painel_paciente'), (self.medico, 'painel_medico')):
+            self.client.force_login(usuario)
+            resposta = self.client.get(reverse(nome))
+            self.assertEqual([consulta.arquivada for consulta in resposta.context['consultas']], [False, False, True])
+            self.assertIsNone(resposta.context['proxima_pagina'])
+
+    def test_arquivadas_so_depois_da_ultima_pagina_das_ativas(self):
+        arquivar_consultas(dias=365)
+        self.client.force_login(self.medico)
+        with mock.patch('pessoas.views.CONSULTAS_POR_PAGINA', 1), \
+                CaptureQueriesContext(connection) as capturadas:
+            self.client.get(reverse('painel_medico'))
+        self.assertFalse([q for q in capturadas if ConsultaArquivada._meta.db_table in q['sql']])
+
+    @mock.patch('pessoas.views.CONSULTAS_POR_PAGINA', 1)
+    def test_historico_paginado(self):
+        arquivar_consultas(dias=365)
+        self.client.force_login(self.medico)
+        vistas = []
+        url = reverse('painel_medico')
+        while url:
+            resposta = self.client.get(url)
+            self.assertEqual(len(resposta.context['consultas']), 1)
+            vistas += [(consulta.arquivada, consulta.pk) for consulta in resposta.context['consultas']]
+            proxima = resposta.context['proxima_pagina']
+            url = proxima and f"{reverse('painel_medico')}?{proxima}"
+        self.assertEqual([arquivada for arquivada, _ in vistas], [False, False, True])
+        self.assertEqual(len(set(vistas)), 3)
+
+    def test_busca_encontra_relatorio_arquivado(self):
+        arquivar_consultas(dias=365)
+        [resultado] = buscar_relatorios(self.medico.pk, 'estavel').resultados
+        self.assertTrue(resultado.consulta.arquivada)
+        self.assertIn('<mark>estável</mark>', resultado.trecho)
+
+    def test_excluir_arquivada_exclui_o_relatorio(self):
+        arquivar_consultas(dias=365)
+        ConsultaArquivada.objects.get().delete()
+        self.assertFalse(RelatorioConsulta.objects.exists())
+
+
+class RelatorioConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        cls.consulta = Consulta.objects.create(paciente=paciente, medico=medico, data_hora=timezone.now())
+
+    def test_versoes(self):
+        self.assertIsNone(self.consulta.relatorio)
+        self.assertEqual(salvar_relatorio(self.consulta, 'primeira', versao=0), 1)
+        self.assertEqual(salvar_relatorio(self.consulta, 'segunda', versao=1), 2)
+        with self.assertRaises(RelatorioDesatualizado):
+            salvar_relatorio(self.consulta, 'sobrescreveria a segunda', versao=1)
+        self.assertEqual(Consulta.objects.get(pk=self.consulta.pk).relatorio, 'segunda')
+
+    def test_listagens_nao_trazem_o_relatorio(self):
+        salvar_relatorio(self.consulta, 'texto longo ' * 1000)
+        self.client.force_login(self.consulta.medico)
+        with CaptureQueriesContext(connection) as capturadas:
+            self.client.get(reverse('painel_medico'))
+        self.assertFalse(any('relatorioconsulta' in consulta['sql'] for consulta in capturadas.captured_queries))
+
+
+class BuscaRelatoriosTests(OrcamentoConsultasTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        outro_medico = criar_usuario('outro_medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        agora = timezone.now()
+        cls.consultas = [
+            Consulta.objects.create(paciente=paciente, medico=cls.medico, data_hora=agora - timedelta(days=dia))
+            for dia in range(3)
+        ]
+        cls.consulta_do_outro = Consulta.objects.create(paciente=paciente, medico=outro_medico, data_hora=agora)
+        salvar_relatorio(cls.consultas[0], 'Paciente com cefaleia. Pressão arterial normal.')
+        salvar_relatorio(cls.consultas[1], 'Pressão arterial elevada; hipertensão. Retorno em 30 dias.')
+        salvar_relatorio(cls.consultas[2], 'Sem queixas.')
+        salvar_relatorio(cls.consulta_do_outro, 'Pressão arterial elevada.')
+
+    def test_so_relatorios_do_medico(self):
+        pagina = buscar_relatorios(self.medico.pk, 'pressao arterial')
+        self.assertEqual(
+            {resultado.consulta.pk for resultado in pagina.resultados},
+            {self.consultas[0].pk, self.consultas[1].pk},
+        )
+        self.assertFalse(pagina.tem_proxima)
+        self.assertEqual(buscar_relatorios(self.medico.pk, 'hipert')[0][0].consulta, self.consultas[1])
+
+    def test_indice_acompanha_as_gravacoes(self):
+        self.assertEqual(len(buscar_relatorios(self.medico.pk, 'queixas').resultados), 1)
+        salvar_relatorio(self.consultas[2], 'Dor lombar.')
+        self.assertEqual(buscar_relatorios(self.medico.pk, 'queixas').resultados, [])
+        self.assertEqual(len(buscar_relatorios(self.medico.pk, 'lombar').resultados), 1)
+
+    def test_paginacao(self):
+        primeira = buscar_relatorios(self.medico.pk, 'arterial', por_pagina=1)
+        segunda = buscar_relatorios(self.medico.pk, 'arterial', pagina=2, por_pagina=1)
+        self.assertTrue(primeira.tem_proxima)
+        self.assertFalse(segunda.tem_proxima)
+        self.assertNotEqual(primeira.resultados[0].consulta, segunda.resultados[0].consulta)
+
+    def test_trecho_destacado(self):
+        trecho = trecho_destacado('<b>Pressão</b> arterial', ['pressao'])
+        self.assertEqual(trecho, '&lt;b&gt;<mark>Pressão</mark>&lt;/b&gt; arterial')
+
+    def test_view(self):
+        self.client.force_login(self.medico)
+        resposta = self.client.get(reverse('buscar_relatorios'), {'q': 'hipertensão', 'pagina': 'x'})
+        self.assertContains(resposta, '<mark>hipertensão</mark>')
+        self.assertDentroDoOrcamento(reverse('buscar_relatorios') + '?q=arterial', self.medico)
+
+
+@override_settings(LIMITE_LOGIN={'ip': (2, 1), 'usuario': (2, 1)})
+class LimiteLoginTests(TestCase):
+    def setUp(self):
+        caches['limite_login'].clear()
+        self.addCleanup(caches['limite_login'].clear)
+
+    def tentar_login(self, username, ip='10.0.0.1'):
+        return self.client.post(
+            reverse('login'), {'username': username, 'password': 'errada'}, REMOTE_ADDR=ip
+        )
+
+    def test_limite_por_usuario_e_por_ip(self):
+        with mock.patch('pessoas.forms.authenticate', return_value=None) as autenticar, \
+                self.assertLogs('pessoas.limite_login', 'WARNING') as logs:
+            self.assertEqual(self.tentar_login('paciente').status_code, 200)
+            self.assertEqual(self.tentar_login('Paciente', ip='10.0.0.2').status_code, 200)
+            resposta = self.tentar_login('paciente', ip='10.0.0.3')
+            self.assertEqual(resposta.status_code, 429)
+            self.assertIn('Retry-After', resposta)
+            # Recusadas não chegam ao hash da senha
+            self.assertEqual(autenticar.call_count, 2)
+
+            self.assertEqual(self.tentar_login('outro').status_code, 200)
+            self.assertEqual(self.tentar_login('mais_um').status_code, 429)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(metricas('login'), {'aceitas': 3, 'rejeitadas_ip': 1, 'rejeitadas_usuario': 1})
+        # Nada no cache padrão, e os contadores expiram
+        self.assertFalse(cache.get('limite_login:metricas:login:aceitas'))
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=timezone.now().timestamp() + METRICAS_EXPIRACAO + 1):
+            self.assertEqual(metricas('login'), {'aceitas': 0, 'rejeitadas_ip': 0, 'rejeitadas_usuario': 0})
+
+    def test_fichas_voltam_com_o_tempo(self):
+        with mock.patch('pessoas.limite_login.time.time', return_value=1000.0), \
+                self.assertLogs('pessoas.limite_login', 'WARNING'):
+            for _ in range(2):
+                self.client.post(reverse('cadastro'), {})
+            self.assertEqual(self.client.post(reverse('cadastro'), {}).status_code, 429)
+        with mock.patch('pessoas.limite_login.time.time', return_value=1060.0):
+            self.assertEqual(self.client.post(reverse('cadastro'), {}).status_code, 200)
+
+
+class ConfiguracaoLimiteLoginTests(SimpleTestCase):
+    def test_recusa_cache_por_processo_em_producao(self):
+        locmem = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        redis = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}
+        with override_settings(DEBUG=False, CACHES={'default': locmem, 'limite_login': locmem}):
+            with self.assertRaises(ImproperlyConfigured):
+                verificar_configuracao()
+            with override_settings(LIMITE_LOGIN_ATIVO=False):
+                verificar_configuracao()
+        with override_settings(DEBUG=False, CACHES={'default': locmem}), self.assertRaises(ImproperlyConfigured):
+            verificar_configuracao()
+        with override_settings(DEBUG=False, CACHES={'default': locmem, 'limite_login': redis}):
+            verificar_configuracao()
+        with override_settings(DEBUG=True, CACHES={'default': locmem, 'limite_login': locmem}):
+            verificar_configuracao()
+
+
+class OcupacaoTests(TestCase):
+    def test_resumo_acompanha_as_consultas(self):
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        meio_dia = timezone.localtime().replace(hour=12, minute=0)
+        consulta = Consulta.objects.create(paciente=paciente, medico=medico, data_hora=meio_dia)
+        Consulta.objects.create(paciente=paciente, medico=medico, data_hora=meio_dia + timedelta(hours=1))
+        consulta.status = 'cancelada'
+        consulta.save()
+
+        resumo = dict(OcupacaoDiaria.objects.filter(medico=medico).values_list('status', 'total'))
+        self.assertEqual(resumo, {'agendada': 1, 'cancelada': 1})
+        consulta.delete()
+        resumo = dict(OcupacaoDiaria.objects.filter(medico=medico).values_list('status', 'total'))
+        self.assertEqual(resumo, {'agendada': 1})
+
+
+class ReservarHorarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        cls.paciente = criar_usuario('paciente', 'paciente')
+        # Expediente padrão: 8h às 18h, consultas de 30 minutos
+        amanha = timezone.localdate() + timedelta(days=1)
+        cls.dez_horas = timezone.make_aware(datetime.combine(amanha, time(10, 0)))
+
+    def reservar(self, data_hora, **extra):
+        return reservar_horario(Consulta(paciente=self.paciente, medico=self.medico, data_hora=data_hora, **extra))
+
+    def test_horario_sobreposto(self):
+        self.reservar(self.dez_horas)
+        for minutos in (0, 15, -15):
+            with self.assertRaises(HorarioIndisponivel):
+                self.reservar(self.dez_horas + timedelta(minutes=minutos))
+        # Encostadas (uma termina quando a outra começa) não conflitam
+        self.reservar(self.dez_horas + timedelta(minutes=30))
+        self.reservar(self.dez_horas - timedelta(minutes=30))
+        self.assertEqual(Consulta.objects.filter(medico=self.medico).count(), 3)
+
+    def test_cancelada_libera_o_horario(self):
+        self.reservar(self.dez_horas, status='cancelada')
+        self.reservar(self.dez_horas)
+        self.assertNotIn(self.dez_horas, horarios_livres(self.medico, self.dez_horas.date(), self.dez_horas.date()))
+
+    def test_remarcar_nao_conflita_consigo_mesma(self):
+        consulta = self.reservar(self.dez_horas)
+        consulta.data_hora += timedelta(minutes=15)
+        reservar_horario(consulta)
+
+    def test_fora_do_expediente_e_no_passado(self):
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas.replace(hour=17, minute=45))
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas - timedelta(days=2))
+
+    def test_trava_a_agenda_do_medico(self):
+        with mock.patch.object(AgendaMedico, 'do_medico', wraps=AgendaMedico.do_medico) as do_medico:
+            self.reservar(self.dez_horas)
+        do_medico.assert_called_once_with(self.medico.pk, bloquear=True)
+
+    def test_medico_configura_o_expediente(self):
+        self.client.force_login(self.medico)
+        resposta = self.client.post(reverse('configurar_agenda'), {
+            'duracao_consulta': 60, 'inicio_expediente': '09:00', 'fim_expediente': '09:30',
+        })
+        self.assertEqual(resposta.status_code, 200)
+        self.client.post(reverse('configurar_agenda'), {
+            'duracao_consulta': 60, 'inicio_expediente': '09:00', 'fim_expediente': '12:00',
+        })
+        self.reservar(self.dez_horas)
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas + timedelta(minutes=45))
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas.replace(hour=8))
+
+    def test_mudar_a_duracao_mantem_as_marcadas(self):
+        def mudar_duracao(minutos):
+            self.client.post(reverse('configurar_agenda'), {
+                'duracao_consulta': minutos, 'inicio_expediente': '08:00', 'fim_expediente': '18:00',
+            })
+
+        self.client.force_login(self.medico)
+        mudar_duracao(60)
+        longa = self.reservar(self.dez_horas)
+        self.assertEqual(longa.duracao, timedelta(minutes=60))
+
+        # Encurtada: a consulta de 60 minutos continua ocupando 10h às 11h
+        mudar_duracao(20)
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas + timedelta(minutes=40))
+        dia = self.dez_horas.date()
+        livres = horarios_livres(self.medico, dia, dia)
+        self.assertNotIn(self.dez_horas + timedelta(minutes=40), livres)
+        self.assertIn(self.dez_horas + timedelta(minutes=60), livres)
+        self.assertIn(self.dez_horas - timedelta(minutes=20), livres)
+        self.reservar(self.dez_horas + timedelta(minutes=60))
+
+        # Alongada: a de 20 minutos (11h às 11h20) não bloqueia mais que isso
+        mudar_duracao(30)
+        livres = horarios_livres(self.medico, dia, dia)
+        self.assertNotIn(self.dez_horas.replace(hour=11), livres)
+        self.assertIn(self.dez_horas.replace(hour=11, minute=30), livres)
+        self.assertIn(self.dez_horas.replace(hour=9, minute=30), livres)
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(self.dez_horas.replace(hour=9, minute=45))
+        self.reservar(self.dez_horas.replace(hour=11, minute=20))
+
+
+class BuscaUsuariosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = criar_usuario('asilva', 'paciente', first_name='Ana', last_name='Silva', email='ana@exemplo.com')
+        cls.bruno = criar_usuario('bruno', 'paciente', first_name='Bruno', last_name='Anjos', email='b@exemplo.com')
+        cls.bruno.perfil.rg = '123456'
+        cls.bruno.perfil.save()
+        criar_usuario('anamedica', 'medico', first_name='Ana')
+
+    def test_busca_por_prefixo_em_cada_coluna(self):
+        self.assertEqual(list(buscar_usuarios('an', 'paciente')), [self.ana, self.bruno])
+        self.assertEqual(list(buscar_usuarios('SIL', 'paciente')), [self.ana])
+        self.assertEqual(list(buscar_usuarios('b@ex', 'paciente')), [self.bruno])
+        self.assertEqual(list(buscar_usuarios('1234', 'paciente')), [self.bruno])
+        self.assertEqual(list(buscar_usuarios('Ana Sil', 'paciente')), [self.ana])
+        self.assertEqual(list(buscar_usuarios('a', 'paciente')), [])
+        self.assertEqual(len(buscar_usuarios('an', 'paciente', limite=1)), 1)
+
+    def test_indices_de_auth_user(self):
+        with connection.cursor() as cursor:
+            restricoes = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        for nome in ('pessoas_user_first_name_idx', 'pessoas_user_last_name_idx', 'pessoas_user_email_idx'):
+            self.assertIn(nome, restricoes)
+
+
+class BuscaMedicamentosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dipirona = Medicamento.objects.create(nome='Dipirona Sódica', valor=Decimal('10.00'))
+        cls.amoxicilina = Medicamento.objects.create(nome='Amoxicilina', valor=Decimal('20.00'))
+
+    def buscar(self, termo):
+        return list(filtrar_medicamentos_por_nome(Medicamento.objects.all(), termo))
+
+    def test_ignora_acentos_e_maiusculas(self):
+        for termo in ('dipi', 'DIPIRONA', 'dipirona sod', 'Dipirona Sód', '  dipirona   SODICA '):
+            with self.subTest(termo=termo):
+                self.assertEqual(self.buscar(termo), [self.dipirona])
+        self.assertEqual(self.buscar('sodica'), [])
+        self.assertEqual(self.buscar(''), [self.amoxicilina, self.dipirona])
+        self.assertEqual(list(buscar_medicamentos('AMÓX')), [self.amoxicilina])
+
+    def test_nome_busca_acompanha_o_save(self):
+        self.assertEqual(self.dipirona.nome_busca, 'dipirona sodica')
+        self.dipirona.nome = 'Éter Etílico'
+        self.dipirona.save(update_fields=['nome'])
+        self.assertEqual(Medicamento.objects.get(pk=self.dipirona.pk).nome_busca, 'eter etilico')
+        self.assertEqual(self.buscar('ETER'), [self.dipirona])
+        self.assertEqual(self.buscar('dipi'), [])
+
+    def test_sincronizar_precos_mantem_nome_busca(self):
+        sincronizar_precos(io.StringIO('nome;valor;necessita_receita\nDIPIRONA SODICA;12,50;sim\n'))
+        dipirona = Medicamento.objects.get(pk=self.dipirona.pk)
+        self.assertEqual((dipirona.valor, dipirona.nome_busca), (Decimal('12.50'), 'dipirona sodica'))
+        self.assertEqual(self.buscar('dipirona'), [dipirona])
+
+
+class PaginasPublicasEmCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = criar_usuario('ana', 'paciente')
+        cls.bruno = criar_usuario('bruno', 'paciente')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        caches['limite_login'].clear()
+        self.addCleanup(caches['limite_login'].clear)
+        self.client = Client(enforce_csrf_checks=True)
+
+    def token_csrf(self, resposta):
+        return re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', resposta.content.decode()).group(1)
+
+    def entrar(self, usuario):
+        # Login pelo formulário: o Django troca o segredo CSRF a cada login
+        token = self.token_csrf(self.client.get(reverse('login')))
+        resposta = self.client.post(
+            reverse('login'), {'username': usuario.username, 'password': 'senha-teste', 'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(resposta.status_code, 302)
+
+    def sair(self, pagina):
+        resposta = self.client.post(reverse('logout'), {'csrfmiddlewaretoken': self.token_csrf(pagina)})
+        # Um token de outra sessão daria 403
+        self.assertEqual(resposta.status_code, 302)
+
+    def test_anonimo_recebe_a_pagina_do_cache(self):
+        primeira = self.client.get(reverse('sobre'))
+        self.assertTemplateUsed(primeira, 'pessoas/sobre.html')
+        segunda = Client().get(reverse('sobre'))
+        self.assertEqual(segunda.templates, [])
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertIn('public', segunda['Cache-Control'])
+
+    def test_usuario_logado_nunca_recebe_pagina_de_outro(self):
+        self.client.get(reverse('sobre'))
+        # Ana entra duas vezes: a página em cache do primeiro login tem um token que já não vale
+        for usuario, outro in ((self.ana, 'bruno'), (self.bruno, 'ana'), (self.ana, 'bruno')):
+            self.entrar(usuario)
+            resposta = self.client.get(reverse('sobre'))
+            self.assertContains(resposta, f'Olá, {usuario.username}!')
+            self.assertNotContains(resposta, f'Olá, {outro}!')
+            self.assertIn('private', resposta['Cache-Control'])
+            self.sair(resposta)
+
+    def test_etag_e_304(self):
+        resposta = self.client.get(reverse('sobre'))
+        self.assertTrue(resposta['ETag'])
+        self.assertTrue(resposta['Last-Modified'])
+        condicional = self.client.get(reverse('sobre'), headers={'If-None-Match': resposta['ETag']})
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional.content, b'')
+        self.assertEqual(condicional['ETag'], resposta['ETag'])
+        self.assertEqual(self.client.get(reverse('sobre'), headers={'If-None-Match': '"outra"'}).status_code, 200)
+
+
+class MiniaturasTests(SimpleTestCase):
+    def test_fotos_com_o_mesmo_nome_e_extensoes_diferentes(self):
+        storage = InMemoryStorage()
+        gerados = set()
+        for nome, formato in (('medicamentos/caixa.png', 'PNG'), ('medicamentos/caixa.jpg', 'JPEG')):
+            buffer = BytesIO()
+            Image.new('RGB', (300, 150), 'red').save(buffer, format=formato)
+            storage.save(nome, ContentFile(buffer.getvalue()))
+            gerados.update(gerar_miniaturas(SimpleNamespace(storage=storage, name=nome)))
+        self.assertEqual(len(gerados), 8)
+        self.assertIn(caminho_miniatura('medicamentos/caixa.png', 100, 'webp'), gerados)
+        self.assertEqual(caminho_miniatura('medicamentos/caixa', 100, 'jpeg'), 'medicamentos/miniaturas/caixa_100.jpg')
+
+
+class PapelUsuarioTests(TestCase):
+    def test_rebaixado_perde_o_acesso(self):
+        medico = criar_usuario('medico', 'medico')
+        # Backend do allauth: o perfil não vem junto com o usuário
+        self.client.force_login(medico, backend='allauth.account.auth_backends.AuthenticationBackend')
+        url = reverse('buscar_relatorios')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        medico.perfil.tipo_usuario = 'paciente'
+        medico.perfil.save()
+        # Nem um cache vazio (outro processo, reinício) traz o papel antigo de volta
+        cache.clear()
+        self.assertRedirects(self.client.get(url), reverse('painel'), fetch_redirect_response=False)
+
+
+class ImportarPacientesTests(TestCase):
+    def importar(self, conteudo, **opcoes):
+        return importar_pacientes(io.StringIO(conteudo), processos=1, **opcoes)
+
+    def test_importa_em_lotes(self):
+        User.objects.create_user(username='existente', email='existente@exemplo.com')
+        lotes = []
+        resultado = self.importar(
+            'username,first_name,email,senha,rg,data_nascimento\n'
+            'ana,Ana,Ana@Exemplo.com,segredo-forte,111,1990-05-01\n'
+            'bruno,Bruno,,,222,02/03/1985\n'
+            'existente,Outro,,,,\n'
+            'carla,Carla,existente@exemplo.com,,,\n'
+            'ana,Ana de novo,,,,\n'
+            'davi,Davi,davi@,,,\n'
+            'eva,Eva,,,,31/02/2000\n'
+            ',Sem username,,,,\n',
+            tamanho_lote=3,
+            progresso=lambda r: lotes.append(r.lidas),
+        )
+        self.assertEqual(lotes, [3, 6, 8])
+        self.assertEqual((resultado.lidas, resultado.criados, resultado.ignorados), (8, 2, 6))
+        self.assertEqual([numero for numero, _ in sorted(resultado.erros)], [4, 5, 6, 7, 8, 9])
+
+        ana = User.objects.select_related('perfil').get(username='ana')
+        self.assertEqual(ana.email, 'ana@exemplo.com')
+        self.assertTrue(ana.check_password('segredo-forte'))
+        self.assertEqual((ana.perfil.tipo_usuario, ana.perfil.rg), ('paciente', '111'))
+        bruno = User.objects.select_related('perfil').get(username='bruno')
+        self.assertFalse(bruno.has_usable_password())
+        self.assertEqual(bruno.perfil.data_nascimento.isoformat(), '1985-03-02')
+
+    def test_reimportar_nao_duplica(self):
+        conteudo = 'username\nana\nbruno\n'
+        self.importar(conteudo)
+        resultado = self.importar(conteudo)
+        self.assertEqual((resultado.criados, resultado.ignorados), (0, 2))
+        self.assertEqual(User.objects.filter(perfil__tipo_usuario='paciente').count(), 2)
+
+    def test_cabecalho_obrigatorio(self):
+        with self.assertRaises(ValueError):
+            self.importar('nome;email\nana;ana@exemplo.com\n')
+
+    def test_recusa_campos_longos_demais(self):
+        longo = 'a' * 250 + '@exemplo.com'
+        resultado = self.importar(
+            'username,email,rg,endereco\n'
+            f'ana,{longo},,\n'
+            f'bruno,,{"1" * 21},\n'
+            f'carla,,,{"Rua " * 70}\n'
+            'davi,,123,Rua A\n'
+        )
+        self.assertEqual(resultado.criados, 1)
+        self.assertEqual(
+            sorted(resultado.erros),
+            [(2, 'email com mais de 254 caracteres'), (3, 'rg com mais de 20 caracteres'),
+             (4, 'endereco com mais de 255 caracteres')],
+        )
+
+    def test_usuario_criado_durante_a_importacao(self):
+        from . import importacao
+
+        def filtrar_e_concorrer(dados_lote, resultado):
+            novos = filtrar(dados_lote, resultado)
+            User.objects.create_user(username='bruno')
+            return novos
+
+        filtrar = importacao._filtrar_existentes
+        with mock.patch('pessoas.importacao._filtrar_existentes', side_effect=filtrar_e_concorrer):
+            resultado = self.importar('username\nana\nbruno\ncarla\n')
+        self.assertEqual((resultado.criados, resultado.ignorados), (2, 1))
+        self.assertEqual(resultado.erros, [(3, 'usuário bruno já existe')])
+        self.assertEqual(User.objects.filter(username__in=['ana', 'carla'], perfil__tipo_usuario='paciente').count(), 2)
+
+
+class AgendaIcsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        cls.paciente = criar_usuario('paciente', 'paciente', first_name='Ana', last_name='Silva')
+        cls.token = gerar_token_agenda(cls.medico.perfil)
+        amanha = timezone.now() + timedelta(days=1)
+        cls.antiga = Consulta.objects.create(paciente=cls.paciente, medico=cls.medico, data_hora=amanha)
+        # Alterada há muito tempo: fica fora das sincronizações incrementais
+        Consulta.objects.filter(pk=cls.antiga.pk).update(atualizado_em=timezone.now() - timedelta(days=1))
+
+    def baixar(self, **parametros):
+        cabecalhos = {}
+        if 'etag' in parametros:
+            cabecalhos['HTTP_IF_NONE_MATCH'] = parametros.pop('etag')
+        return self.client.get(reverse('agenda_ics', args=[self.token]), parametros, **cabecalhos)
+
+    def eventos(self, resposta):
+        return re.findall(r'UID:consulta-(\d+)@simed', resposta.content.decode())
+
+    def test_feed_e_etag(self):
+        resposta = self.baixar()
+        self.assertEqual(resposta['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('SUMMARY:Consulta - Ana Silva', resposta.content.decode())
+        self.assertEqual(self.eventos(resposta), [str(self.antiga.pk)])
+
+        self.assertEqual(self.baixar(etag=resposta['ETag']).status_code, 304)
+        self.antiga.status = 'cancelada'
+        self.antiga.save()
+        resposta = self.baixar(etag=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', resposta.content.decode())
+
+    def test_sincronizacao_incremental(self):
+        token = self.baixar()['X-Sync-Token']
+        nova = Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico, data_hora=timezone.now() + timedelta(days=2)
+        )
+        self.assertEqual(self.eventos(self.baixar(desde=token)), [str(nova.pk)])
+        # Token adulterado: feed completo
+        self.assertEqual(len(self.eventos(self.baixar(desde=token + 'x'))), 2)
+
+    def test_exclusao_forca_feed_completo(self):
+        token = self.baixar()['X-Sync-Token']
+        Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico, data_hora=timezone.now() + timedelta(days=2)
+        ).delete()
+        self.assertEqual(self.eventos(self.baixar(desde=token)), [str(self.antiga.pk)])
+
+    def test_link_trocado_deixa_de_funcionar(self):
+        gerar_token_agenda(self.medico.perfil)
+        self.assertEqual(self.baixar().status_code, 404)
+
+
+class SincronizarPrecosTests(TestCase):
+    def test_formatos_de_valor(self):
+        for texto, esperado in (
+            ('12', '12'), ('12.5', '12.50'), ('12,50', '12.50'), ('R$ 1.234,56', '1234.56'),
+            ('1.234.567,8', '1234567.80'),
+        ):
+            self.assertEqual(_valor(texto), Decimal(esperado), texto)
+        for texto in ('1,234.56', '1.234', '12,505', '1.23.4', '', 'abc', '0,00', '-5', '100000000,00'):
+            with self.assertRaises(ValueError, msg=texto):
+                _valor(texto)
+
+    def test_nomes_sem_acento_e_maiusculas(self):
+        dipirona = Medicamento.objects.create(nome='Dipirona Sódica', valor=Decimal('10.00'))
+        Medicamento.objects.create(nome='Amoxicilina', valor=Decimal('20.00'))
+        relatorio = sincronizar_precos(io.StringIO(
+            'nome;valor;necessita_receita\n'
+            'dipirona sodica;12,50;nao\n'
+            'AMOXICILINA;20;\n'
+            'Paracetamol;5,00;\n'
+            'Dipirona  Sódica;13,00;\n'
+            'Ibuprofeno;1.234;\n'
+            'Omeprazol;99999999999;\n'
+        ))
+        self.assertEqual(relatorio.medicamentos_alterados, 1)
+        self.assertEqual(relatorio.nao_encontrados, ['Paracetamol'])
+        self.assertEqual([numero for numero, _ in relatorio.erros], [5, 6, 7])
+        dipirona.refresh_from_db()
+        self.assertEqual((dipirona.valor, dipirona.necessita_receita), (Decimal('12.50'), False))
+
+
+class ApiStatusConsultaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = criar_usuario('medico', 'medico')
+        cls.paciente = criar_usuario('paciente', 'paciente')
+        cls.outro_paciente = criar_usuario('outro_paciente', 'paciente')
+        cls.atendente = criar_usuario('atendente', 'atendente')
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        amanha = timezone.localdate() + timedelta(days=1)
+        cls.horario = timezone.make_aware(datetime.combine(amanha, time(10, 0)))
+
+    def consulta(self, status='agendada'):
+        return Consulta.objects.create(
+            paciente=self.paciente, medico=self.medico, data_hora=self.horario, status=status
+        )
+
+    def patch(self, usuario, consulta, **dados):
+        self.client.force_login(usuario)
+        return self.client.patch(
+            reverse('api_consulta_detalhe', args=[consulta.pk]), json.dumps(dados),
+            content_type='application/json',
+        )
+
+    def assertStatus(self, consulta, esperado):
+        consulta.refresh_from_db()
+        self.assertEqual(consulta.status, esperado)
+
+    def test_paciente(self):
+        consulta = self.consulta()
+        self.assertEqual(self.patch(self.paciente, consulta, status='concluida').status_code, 403)
+        self.assertEqual(self.patch(self.paciente, consulta, status='cancelada').status_code, 200)
+        self.assertEqual(self.patch(self.paciente, consulta, status='agendada').status_code, 403)
+        concluida = self.consulta('concluida')
+        self.assertEqual(self.patch(self.paciente, concluida, status='cancelada').status_code, 409)
+        self.assertStatus(concluida, 'concluida')
+        # Consulta de outro paciente nem aparece
+        self.assertEqual(self.patch(self.outro_paciente, consulta, status='cancelada').status_code, 404)
+
+    def test_medico(self):
+        cancelada = self.consulta('cancelada')
+        self.assertEqual(self.patch(self.medico, cancelada, relatorio='texto').status_code, 409)
+        self.assertStatus(cancelada, 'cancelada')
+        self.assertIsNone(cancelada.relatorio)
+        self.assertEqual(self.patch(self.medico, cancelada, status='agendada').status_code, 403)
+
+        consulta = self.consulta()
+        self.assertEqual(self.patch(self.medico, consulta, relatorio='texto').status_code, 200)
+        self.assertStatus(consulta, 'concluida')
+        self.assertEqual(self.patch(self.medico, consulta, relatorio='revisado').status_code, 200)
+        self.assertEqual(self.patch(self.medico, consulta, status='cancelada').status_code, 409)
+        self.assertStatus(consulta, 'concluida')
+
+    def test_reativar_reserva_o_horario(self):
+        for usuario in (self.atendente, self.staff):
+            cancelada = self.consulta('cancelada')
+            ocupante = reservar_horario(Consulta(
+                paciente=self.outro_paciente, medico=self.medico, data_hora=self.horario
+            ))
+            resposta = self.patch(usuario, cancelada, status='agendada')
+            self.assertEqual(resposta.status_code, 409)
+            self.assertIn('data_hora', resposta.json()['erros'])
+            self.assertStatus(cancelada, 'cancelada')
+
+            ocupante.delete()
+            self.assertEqual(self.patch(usuario, cancelada, status='agendada').status_code, 200)
+            self.assertStatus(cancelada, 'agendada')
+            cancelada.delete()
+
+    def test_atendente_nao_escreve_relatorio(self):
+        self.assertEqual(self.patch(self.atendente, self.consulta(), relatorio='texto').status_code, 403)
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        medico = criar_usuario('medico', 'medico', first_name='Ana', last_name='Souza')
+        paciente = criar_usuario('paciente', 'paciente', first_name='João', last_name='Pães & <Filhos>', email='j@exemplo.com')
+        inicio = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        # Horários repetidos: os limites dos lotes caem no meio de empates
+        Consulta.objects.bulk_create([
+            Consulta(paciente=paciente, medico=medico, data_hora=inicio + timedelta(hours=hora))
+            for hora in (0, 1, 1, 1, 2, 2, 3)
+        ])
+        cls.ids = [str(pk) for pk in Consulta.objects.order_by('data_hora', 'id').values_list('id', flat=True)]
+
+    def baixar(self, formato):
+        self.client.force_login(self.staff)
+        resposta = self.client.get(reverse('exportar_consultas'), {'formato': formato})
+        self.assertEqual(resposta.status_code, 200)
+        return b''.join(resposta.streaming_content)
+
+    def test_csv(self):
+        texto = self.baixar('csv').decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff'))
+        linhas = list(csv.reader(io.StringIO(texto[1:]), delimiter=';'))
+        self.assertEqual(linhas[0], CABECALHO)
+        self.assertEqual([linha[0] for linha in linhas[1:]], self.ids)
+        self.assertEqual(linhas[1][2:], ['Agendada', 'João Pães & <Filhos>', 'j@exemplo.com', 'Ana Souza'])
+
+    def test_xlsx_e_um_zip_valido(self):
+        with zipfile.ZipFile(io.BytesIO(self.baixar('xlsx'))) as arquivo:
+            self.assertIsNone(arquivo.testzip())
+            self.assertIn('[Content_Types].xml', arquivo.namelist())
+            planilha = ElementTree.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        linhas = [
+            [celula.text for celula in linha.findall('s:c/s:is/s:t', ns)]
+            for linha in planilha.findall('s:sheetData/s:row', ns)
+        ]
+        self.assertEqual(linhas, list(linhas_consultas(Consulta.objects.all())))
+        self.assertEqual(linhas[1][3], 'João Pães & <Filhos>')
+
+    def test_lotes_nao_perdem_nem_repetem_linhas(self):
+        for tamanho_lote in (1, 2, 3, 7, 50):
+            with self.subTest(tamanho_lote=tamanho_lote), medir_consultas() as medicao:
+                linhas = list(linhas_consultas(Consulta.objects.all(), tamanho_lote=tamanho_lote))
+                self.assertEqual([linha[0] for linha in linhas[1:]], self.ids)
+                # Um SELECT por lote
+                self.assertEqual(medicao.total, -(-len(self.ids) // tamanho_lote))
+
+
+class ExportacaoAssincronaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente')
+        Consulta.objects.bulk_create([
+            Consulta(paciente=paciente, medico=medico, data_hora=timezone.now() + timedelta(hours=i))
+            for i in range(5)
+        ])
+
+    async def test_asgi_envia_em_streaming(self):
+        await self.async_client.aforce_login(self.staff)
+        resposta = await self.async_client.get(reverse('exportar_consultas'))
+        # Iterador assíncrono: o ASGI envia os pedaços sem juntar o arquivo na memória
+        self.assertTrue(resposta.is_async)
+        conteudo = ''.join([pedaco.decode() async for pedaco in resposta.streaming_content])
+        self.assertEqual(conteudo.count('\r\n'), 6)
+
+    def test_wsgi_continua_sincrono(self):
+        self.client.force_login(self.staff)
+        resposta = self.client.get(reverse('exportar_consultas'))
+        self.assertFalse(resposta.is_async)
+        self.assertEqual(b''.join(resposta.streaming_content).decode().count('\r\n'), 6)
+
+
+class EmParaleloTests(TransactionTestCase):
+    """Fora de uma transação, como em produção: cada função na sua thread e conexão."""
+
+    def test_funcoes_rodam_ao_mesmo_tempo(self):
+        criar_usuario('paciente', 'paciente')
+
+        def consultar():
+            sleep(0.2)
+            return threading.get_ident(), User.objects.count()
+
+        inicio = perf_counter()
+        resultados = async_to_sync(em_paralelo)(consultar, consultar, consultar)
+        self.assertLess(perf_counter() - inicio, 0.5)
+        self.assertEqual([total for _, total in resultados], [1, 1, 1])
+        self.assertEqual(len({thread for thread, _ in resultados}), 3)
+
+
+class FilaTarefasTests(TestCase):
+    def setUp(self):
+        self.execucoes = []
+        self.falhar = False
+
+        def executar(**dados):
+            self.execucoes.append(dados)
+            if self.falhar:
+                raise RuntimeError('falhou')
+
+        registro = {'teste': (executar, None), 'teste_periodica': (executar, timedelta(hours=1))}
+        patcher = mock.patch.dict(tarefas._REGISTRO, registro, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserva_so_as_vencidas(self):
+        vencidas = [tarefas.enfileirar('teste', {'n': n}) for n in range(3)]
+        tarefas.enfileirar('teste', executar_em=timezone.now() + timedelta(hours=1))
+        reservadas = tarefas.reservar_tarefas(limite=2)
+        self.assertEqual([t.pk for t in reservadas], [t.pk for t in vencidas[:2]])
+        self.assertEqual([t.pk for t in tarefas.reservar_tarefas()], [vencidas[2].pk])
+        self.assertEqual(tarefas.reservar_tarefas(), [])
+        self.assertEqual(Tarefa.objects.filter(status='executando').count(), 3)
+
+    def test_novas_tentativas_com_espera_crescente(self):
+        self.falhar = True
+        t = tarefas.enfileirar('teste', {'n': 1}, max_tentativas=3)
+        esperas = []
+        with self.assertLogs('pessoas.tarefas', 'WARNING') as logs:
+            for _ in range(3):
+                Tarefa.objects.filter(pk=t.pk).update(executar_em=timezone.now())
+                [t] = tarefas.reservar_tarefas()
+                antes = timezone.now()
+                self.assertFalse(tarefas.executar_tarefa(t))
+                esperas.append(t.executar_em - antes)
+        self.assertIn('falhou definitivamente', logs.output[-1])
+        t.refresh_from_db()
+        self.assertEqual((t.status, t.tentativas), ('falhou', 3))
+        self.assertIn('RuntimeError', t.ultimo_erro)
+        # 30s e 60s (±20%); a última falha não agenda nova tentativa
+        self.assertTrue(timedelta(seconds=23) < esperas[0] < timedelta(seconds=37))
+        self.assertTrue(timedelta(seconds=47) < esperas[1] < timedelta(seconds=73))
+        self.assertEqual(self.execucoes, [{'n': 1}] * 3)
+
+    def test_liberar_travadas(self):
+        t = tarefas.enfileirar('teste')
+        tarefas.reservar_tarefas()
+        self.assertEqual(tarefas.liberar_travadas(), 0)
+        self.assertEqual(tarefas.liberar_travadas(timezone.now() + tarefas.TEMPO_LIMITE_EXECUCAO * 2), 1)
+        t.refresh_from_db()
+        self.assertEqual(t.status, 'pendente')
+
+    def test_periodica_tem_uma_execucao_na_fila(self):
+        tarefas.agendar_periodicas()
+        tarefas.agendar_periodicas()
+        # Dois workers que passaram juntos pelo exists(): a chave única barra o segundo
+        self.assertIsNone(tarefas._enfileirar_periodica('teste_periodica'))
+        self.assertEqual(Tarefa.objects.filter(tipo='teste_periodica').count(), 1)
+
+        [t] = tarefas.reservar_tarefas()
+        self.assertTrue(tarefas.executar_tarefa(t))
+        proxima = Tarefa.objects.get(tipo='teste_periodica', status='pendente')
+        self.assertEqual(proxima.chave_periodica, 'teste_periodica')
+        self.assertGreater(proxima.executar_em, timezone.now() + timedelta(minutes=59))
+        tarefas.agendar_periodicas()
+        self.assertEqual(Tarefa.objects.filter(tipo='teste_periodica').count(), 2)
+
+
+@override_settings(LEMBRETES_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class LembretesTests(TestCase):
+    def test_envia_um_lembrete_por_consulta(self):
+        medico = criar_usuario('medico', 'medico')
+        paciente = criar_usuario('paciente', 'paciente', email='paciente@exemplo.com', first_name='Ana')
+        sem_email = criar_usuario('sem_email', 'paciente')
+        agora = timezone.now()
+        proxima = Consulta.objects.create(paciente=paciente, medico=medico, data_hora=agora + timedelta(hours=2))
+        Consulta.objects.create(paciente=paciente, medico=medico, data_hora=agora + timedelta(days=3))
+        Consulta.objects.create(paciente=paciente, medico=medico, data_hora=agora + timedelta(hours=3), status='cancelada')
+        Consulta.objects.create(paciente=sem_email, medico=medico, data_hora=agora + timedelta(hours=4))
+
+        self.assertEqual(enviar_lembretes(tamanho_lote=1), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['paciente@exemplo.com'])
+        self.assertIn('Olá, Ana!', mail.outbox[0].body)
+        proxima.refresh_from_db()
+        self.assertIsNotNone(proxima.lembrete_enviado_em)
+        # Já avisada: não recebe de novo
+        self.assertEqual(enviar_lembretes(), 0)
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='senha-teste', is_staff=True)
+
+    def test_cabecalho_so_para_a_equipe(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')).headers)
+        paciente = criar_usuario('paciente', 'paciente')
+        self.client.force_login(paciente)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')).headers)
+
+        self.client.force_login(self.staff)
+        cabecalho = self.client.get(reverse('dashboard_consultas')).headers['Server-Timing']
+        self.assertRegex(cabecalho, r'^db;dur=[\d.]+;desc="\d+ consultas", template;dur=[\d.]+, .*total;dur=[\d.]+$')
+
+    @override_settings(SERVER_TIMING_PUBLICO=True)
+    def test_cabecalho_publico(self):
+        self.assertIn('Server-Timing', self.client.get(reverse('home')).headers)
+
+    def test_cabecalho_em_asgi(self):
+        async def requisicoes():
+            anonima = await self.async_client.get(reverse('home'))
+            await self.async_client.aforce_login(self.staff)
+            return anonima, await self.async_client.get(reverse('home'))
+
+        anonima, da_equipe = async_to_sync(requisicoes)()
+        self.assertNotIn('Server-Timing', anonima.headers)
+        self.assertIn('total;dur=', da_equipe.headers['Server-Timing'])
+
+    def test_perfilador_salva_requisicoes_lentas(self):
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(
+            PERFILADOR_TAXA_AMOSTRAGEM=1, PERFILADOR_LIMITE_MS=0, PERFILADOR_DIRETORIO=diretorio,
+        ):
+            self.client.get(reverse('home'))
+            [arquivo] = list(Path(diretorio).glob('*_home_*ms.prof'))
+            self.assertTrue(pstats.Stats(str(arquivo)).total_calls)
+
+            # Com o perfilador ocupado por outra requisição, segue sem perfil
+            with server_timing._trava_perfilador:
+                self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+            self.assertEqual(len(list(Path(diretorio).iterdir())), 1)
+            self.assertFalse(server_timing._trava_perfilador.locked())
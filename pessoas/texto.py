@@ -0,0 +1,10 @@
+# pessoas/texto.py
+
+import unicodedata
+
+
+def normalizar_texto(texto):
+    """Remove acentos e diferenças de maiúsculas/minúsculas ("Dipirona Sódica" -> "dipirona sodica")."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
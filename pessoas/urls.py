@@ -1,7 +1,7 @@
 # pessoas/urls.py
 
 from django.urls import path
-from . import views
+from . import api, views
 from django.contrib.auth import views as auth_views
 # A importação do 'admin' foi REMOVIDA daqui
 
@@ -34,22 +34,31 @@ urlpatterns = [
     # URLs dos Painéis
     path("painel/", views.painel, name="painel"),
     path("painel/medico/", views.painel_medico, name="painel_medico"),
+    path("painel/medico/agenda/", views.configurar_agenda, name="configurar_agenda"),
+    path("painel/medico/agenda/link/", views.gerar_link_agenda, name="gerar_link_agenda"),
+    path("painel/medico/relatorios/busca/", views.buscar_relatorios_view, name="buscar_relatorios"),
+    path("agenda/<str:token>.ics", views.agenda_ics, name="agenda_ics"),
     path("painel/paciente/", views.painel_paciente, name="painel_paciente"),
     path("painel/atendente/", views.painel_atendente, name="painel_atendente"),
 
     # URLs de Ações
     path("consulta/<int:consulta_id>/relatorio/", views.escrever_relatorio, name="escrever_relatorio"),
+    path("medicos/<int:medico_id>/horarios/", views.horarios_livres_medico, name="horarios_livres_medico"),
+    path("usuarios/buscar/", views.buscar_usuarios_view, name="buscar_usuarios"),
     
     path('medicamentos/', views.lista_medicamentos, name='lista_medicamentos'),
+    path('medicamentos/buscar/', views.buscar_medicamentos_view, name='buscar_medicamentos'),
     path('medicamentos/cadastrar/', views.cadastrar_medicamento, name='cadastrar_medicamento'),
     path('medicamentos/<int:medicamento_id>/excluir/', views.excluir_medicamento, name='excluir_medicamento'),
     # URLs do Dashboard Administrativo
     path('dashboard/', views.dashboard_admin, name='dashboard_admin'),
     path('dashboard/produtos/', views.dashboard_produtos, name='dashboard_produtos'),
+    path('dashboard/produtos/sincronizar/', views.sincronizar_precos_view, name='sincronizar_precos'),
     path('dashboard/consultas/', views.dashboard_consultas, name='dashboard_consultas'),
     path('dashboard/ocupacao/', views.dashboard_ocupacao, name='dashboard_ocupacao'),
     path('dashboard/pacientes/', views.dashboard_pacientes, name='dashboard_pacientes'),
     path('dashboard/medicos/', views.dashboard_medicos, name='dashboard_medicos'),
+    path('dashboard/consultas/exportar/', views.exportar_consultas, name='exportar_consultas'),
     
     # Ações do Dashboard
     path('dashboard/medicamento/<int:medicamento_id>/editar/', views.editar_medicamento, name='editar_medicamento'),
@@ -59,4 +68,11 @@ urlpatterns = [
 
     # URL para Gerenciamento de Cargos
     path('dashboard/usuario/<int:user_id>/cargos/', views.gerenciar_cargos, name='gerenciar_cargos'),
+
+    # API JSON (autenticação pela sessão do site)
+    path('api/consultas/', api.consultas, name='api_consultas'),
+    path('api/consultas/<int:consulta_id>/', api.consulta_detalhe, name='api_consulta_detalhe'),
+    path('api/medicamentos/', api.medicamentos, name='api_medicamentos'),
+    path('api/medicos/', api.medicos, name='api_medicos'),
+    path('api/pacientes/', api.pacientes, name='api_pacientes'),
 ]
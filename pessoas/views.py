@@ -1,52 +1,154 @@
+import io
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
 from .forms import (
     CadastroUsuarioForm, PerfilForm, AgendarConsultaForm, 
     RelatorioConsultaForm, AgendarConsultaAtendenteForm, 
-    MedicamentoForm, LoginUsuarioForm
+    MedicamentoForm, LoginUsuarioForm, FiltroConsultasForm,
+    FiltroMedicamentosForm, SincronizarPrecosForm, BuscaRelatoriosForm, AgendaMedicoForm,
+    carregar_escolhas,
 )
-from .models import User, Perfil, Consulta, Medicamento
-
+from .models import User, Perfil, Consulta, ConsultaArquivada, Medicamento
+from .cache_paginas import pagina_publica_em_cache
+from .catalogo import sincronizar_precos
+from .agenda_ics import (
+    MARGEM_SINCRONIZACAO, consultas_do_feed, criar_token_sincronizacao, etag_agenda,
+    gerar_ics, gerar_token_agenda, janela_agenda, ler_token_sincronizacao,
+)
+from .assincrono import em_paralelo, iterar_em_thread, renderizar
+from .busca import buscar_medicamentos, buscar_usuarios, rotulo_usuario
+from .busca_relatorios import buscar_relatorios
+from .disponibilidade import HorarioIndisponivel, MAX_DIAS_BUSCA, horarios_livres, reservar_horario
+from .estatisticas import obter_estatisticas_consultas
+from .exportacao import gerar_csv, gerar_xlsx, linhas_consultas
+from .ocupacao import limites_do_dia, ocupacao_por_medico
+from .paginacao import PaginaCursor, paginar_por_cursor
+from .papeis import PAPEL_STAFF, papel_requerido
+from .relatorios import RelatorioDesatualizado, salvar_relatorio, versao_do_relatorio
+from .replicas import banco_de_leitura, ler_da_replica
+from .limite_login import limitar_tentativas
+
+# Quantidade de consultas exibidas por página nos painéis
+CONSULTAS_POR_PAGINA = 50
+# Cursores do histórico que já estão nas consultas arquivadas (pagina_do_historico)
+PREFIXO_CURSOR_ARQUIVADAS = "arquivadas:"
+# Quantidade de medicamentos exibidos por página no catálogo e no dashboard
+MEDICAMENTOS_POR_PAGINA = 30
+
+# --- FUNÇÕES AUXILIARES ---
+
+def url_proxima_pagina(request, pagina):
+    """Querystring da próxima página, mantendo os filtros atuais (ou None se não houver)."""
+    if not pagina.tem_proxima:
+        return None
+    parametros = request.GET.copy()
+    parametros["cursor"] = pagina.proximo_cursor
+    return parametros.urlencode()
+
+def _pagina_de_arquivadas(arquivadas, cursor, tamanho):
+    pagina = paginar_por_cursor(arquivadas, cursor, tamanho=tamanho, decrescente=True)
+    if pagina.tem_proxima:
+        pagina.proximo_cursor = PREFIXO_CURSOR_ARQUIVADAS + pagina.proximo_cursor
+    return pagina
+
+def pagina_do_historico(request, consultas, arquivadas):
+    """
+    Página do histórico de um painel: as consultas ativas, da mais antiga para
+    a mais nova, e, depois da última delas, as arquivadas, da mais recente para
+    a mais antiga. As arquivadas só são lidas quando as ativas acabam.
+    Devolve (página, próxima página).
+    """
+    cursor = request.GET.get("cursor") or ""
+    if cursor.startswith(PREFIXO_CURSOR_ARQUIVADAS):
+        pagina = _pagina_de_arquivadas(
+            arquivadas, cursor[len(PREFIXO_CURSOR_ARQUIVADAS):] or None, CONSULTAS_POR_PAGINA
+        )
+        return pagina, url_proxima_pagina(request, pagina)
+
+    pagina = paginar_por_cursor(consultas, cursor or None, tamanho=CONSULTAS_POR_PAGINA)
+    if not pagina.tem_proxima:
+        # Última página das ativas: completa com as arquivadas mais recentes
+        restantes = CONSULTAS_POR_PAGINA - len(pagina)
+        if restantes:
+            cauda = _pagina_de_arquivadas(arquivadas, None, restantes)
+            pagina = PaginaCursor(pagina.itens + cauda.itens, cauda.proximo_cursor)
+        elif arquivadas.exists():
+            pagina.proximo_cursor = PREFIXO_CURSOR_ARQUIVADAS
+    return pagina, url_proxima_pagina(request, pagina)
+
+def listar_medicamentos(request):
+    """Aplica a busca/filtros do catálogo e devolve (formulário, página, próxima página)."""
+    filtro_form = FiltroMedicamentosForm(request.GET or None)
+    medicamentos = Medicamento.objects.all()
+    if filtro_form.is_valid():
+        medicamentos = filtro_form.filtrar(medicamentos)
+    pagina = paginar_por_cursor(
+        medicamentos, request.GET.get("cursor"), tamanho=MEDICAMENTOS_POR_PAGINA, campo="nome"
+    )
+    return filtro_form, pagina, url_proxima_pagina(request, pagina)
+    
 # --- VIEWS DE PÁGINA ---
 
+@pagina_publica_em_cache
 def home(request):
     return render(request, 'pessoas/home.html')
 
+@pagina_publica_em_cache
 def sobre(request):
     return render(request, 'pessoas/sobre.html')
 
 def produtos(request):
     return render(request, 'pessoas/lista_medicamentos.html')
 
+@pagina_publica_em_cache
 def nos_encontre(request):
     return render(request, 'pessoas/encontre.html')
 
+@pagina_publica_em_cache
 def cirurgia(request):
     # Esta vai carregar o cirurgia.html
     return render(request, 'pessoas/cirurgia.html')
 
+@pagina_publica_em_cache
 def exames(request):
     # Esta vai carregar o exames.html
     return render(request, 'pessoas/exames.html')
 
+@pagina_publica_em_cache
 def odontologia(request):
     # Esta vai carregar o odontologia.html
     return render(request, 'pessoas/odontologia.html')
 
+@pagina_publica_em_cache
 def oftalmologia(request):
     # Esta vai carregar o oftalmologia.html (corrigido de 'oftalmolofia')
     return render(request, 'pessoas/oftalmologia.html') 
 
+@pagina_publica_em_cache
 def tomografia(request):
     # Esta vai carregar o tomografia.html
     return render(request, 'pessoas/tomografia.html')
 
+@pagina_publica_em_cache
 def consulta(request):
     # Esta vai carregar o consulta.html
     return render(request, 'pessoas/consulta.html')
 
+@pagina_publica_em_cache
 def agenda(request):
     # Esta vai carregar o agenda.html
     return render(request, 'pessoas/agenda.html')
@@ -54,6 +156,7 @@ def agenda(request):
     
 # --- VIEWS DE AUTENTICAÇÃO ---
 
+@limitar_tentativas('login', campo_usuario='username')
 def login_view(request):
     if request.method == 'POST':
         form = LoginUsuarioForm(request.POST)
@@ -65,6 +168,7 @@ def login_view(request):
         form = LoginUsuarioForm()
     return render(request, 'pessoas/login.html', {'form': form})
 
+@limitar_tentativas('cadastro')
 def cadastrar_usuario(request):
     if request.method == 'POST':
         form = CadastroUsuarioForm(request.POST)
@@ -109,13 +213,31 @@ def cadastrar_medicamento(request):
     }
     return render(request, 'pessoas/cadastrar_medicamento.html', contexto)
 
+@ler_da_replica
 def lista_medicamentos(request):
-    medicamentos = Medicamento.objects.all().order_by('nome')
+    filtro_form, medicamentos, proxima_pagina = listar_medicamentos(request)
     contexto = {
-        'medicamentos': medicamentos
+        'medicamentos': medicamentos,
+        'filtro_form': filtro_form,
+        'proxima_pagina': proxima_pagina,
     }
     return render(request, 'pessoas/lista_medicamentos.html', contexto)
 
+def buscar_medicamentos_view(request):
+    """Sugestões (JSON) do catálogo para o autocomplete: ?q=termo"""
+    medicamentos = buscar_medicamentos(request.GET.get('q', ''))
+    return JsonResponse({
+        'resultados': [
+            {
+                'id': medicamento.id,
+                'nome': medicamento.nome,
+                'valor': str(medicamento.valor),
+                'necessita_receita': medicamento.necessita_receita,
+            }
+            for medicamento in medicamentos
+        ],
+    })
+
 # --- PAINÉIS (DASHBOARDS) ---
 
 @login_required # Garante que apenas usuários logados acessem esta view
@@ -124,47 +246,159 @@ def painel(request):
     View principal que verifica o tipo de usuário e o redireciona
     para o painel correto (médico, paciente ou atendente).
     """
-    try:
-        perfil = request.user.perfil
-        if request.user.is_staff:
-            return redirect('dashboard_consultas') # Redireciona admin para a página de consultas
-        elif perfil.tipo_usuario == 'medico':
-            return redirect('dashboard') # Redireciona médico para o painel médico
-        elif perfil.tipo_usuario == 'paciente':
-            return redirect('home')
-        elif perfil.tipo_usuario == "atendente":
-            return redirect("painel_atendente")
-    except Perfil.DoesNotExist:
-        # Caso um usuário (ex: admin) não tenha perfil, redireciona
-        return redirect('login') # Ou para uma página de "Completar Perfil"
+    papel = request.papel
+    if papel == PAPEL_STAFF:
+        return redirect('dashboard_consultas') # Redireciona admin para a página de consultas
+    elif papel == 'medico':
+        return redirect('painel_medico') # Redireciona médico para o painel médico
+    elif papel == 'paciente':
+        return redirect('home')
+    elif papel == "atendente":
+        return redirect("painel_atendente")
+    # Caso um usuário (ex: admin) não tenha perfil, redireciona
+    return redirect('login') # Ou para uma página de "Completar Perfil"
         
 @login_required
 def painel_medico(request):
-    """Painel do médico, mostra suas consultas agendadas."""
-    consultas = Consulta.objects.filter(medico=request.user).order_by('data_hora')
-    return render(request, 'pessoas/painel_medico.html', {'consultas': consultas})
+    """Painel do médico, mostra suas consultas (ativas ou arquivadas), paginadas."""
+    consultas, proxima_pagina = pagina_do_historico(
+        request,
+        Consulta.objects.filter(medico=request.user).select_related('paciente'),
+        ConsultaArquivada.objects.filter(medico=request.user).select_related('paciente').defer('relatorio_comprimido'),
+    )
+    url_agenda = None
+    form_agenda = None
+    if request.papel == 'medico':
+        if request.user.perfil.token_agenda:
+            url_agenda = request.build_absolute_uri(reverse('agenda_ics', args=[request.user.perfil.token_agenda]))
+        form_agenda = AgendaMedicoForm(instance=request.user.perfil)
+    return render(request, 'pessoas/painel_medico.html', {
+        'consultas': consultas, 'proxima_pagina': proxima_pagina,
+        'url_agenda': url_agenda, 'form_agenda': form_agenda,
+    })
 
-@login_required
-def painel_paciente(request):
-    """Painel do paciente, mostra suas consultas e permite agendar novas."""
-    consultas = Consulta.objects.filter(paciente=request.user).order_by('data_hora')
-    perfil = request.user.perfil
+@papel_requerido('medico')
+@ler_da_replica
+def buscar_relatorios_view(request):
+    """Busca de texto completo nos relatórios das consultas do médico, por relevância."""
+    form = BuscaRelatoriosForm(request.GET or None)
+    pagina = None
+    proxima_pagina = None
+    if form.is_valid() and form.cleaned_data['q']:
+        try:
+            numero = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            numero = 1
+        pagina = buscar_relatorios(request.user.pk, form.cleaned_data['q'], numero)
+        if pagina.tem_proxima:
+            parametros = request.GET.copy()
+            parametros['pagina'] = pagina.numero + 1
+            proxima_pagina = parametros.urlencode()
+    return render(request, 'pessoas/buscar_relatorios.html', {
+        'form': form,
+        'pagina': pagina,
+        'proxima_pagina': proxima_pagina,
+    })
 
+@papel_requerido('medico')
+def configurar_agenda(request):
+    """Altera a duração das consultas e o expediente do médico."""
+    form = AgendaMedicoForm(request.POST or None, instance=request.user.perfil)
+    if request.method == 'POST' and form.is_valid():
+        # Vale para as próximas consultas: as marcadas mantêm a duração que tinham
+        form.save()
+        return redirect('painel_medico')
+    return render(request, 'pessoas/configurar_agenda.html', {'form': form})
+
+@papel_requerido('medico')
+def gerar_link_agenda(request):
+    """Cria (ou troca) o link do feed .ics da agenda do médico."""
     if request.method == 'POST':
-        form = AgendarConsultaForm(request.POST)
-        perfil_form = PerfilForm(request.POST, instance=perfil)
-        if form.is_valid() and perfil_form.is_valid():
-            nova_consulta = form.save(commit=False)
-            nova_consulta.paciente = request.user
-            nova_consulta.save()
+        gerar_token_agenda(request.user.perfil)
+    return redirect('painel_medico')
+
+def agenda_ics(request, token):
+    """
+    Feed iCalendar da agenda do médico, acessado pelo link secreto (sem login),
+    para ser assinado em aplicativos de calendário.
+
+    Responde 304 ao If-None-Match enquanto a agenda não muda, sem consultar
+    as consultas. Com ?desde=<token de sincronização> (recebido no cabeçalho
+    X-Sync-Token da resposta anterior) traz só as consultas alteradas desde
+    então; se alguma consulta foi excluída nesse meio tempo, traz o feed completo.
+    """
+    perfil = get_object_or_404(
+        Perfil.objects.only('usuario_id', 'versao_agenda', 'agenda_excluida_em'),
+        token_agenda=token, tipo_usuario='medico',
+    )
+    inicio, fim = janela_agenda()
+    desde_token = request.GET.get('desde')
+    desde = ler_token_sincronizacao(desde_token) if desde_token else None
+    if desde is None or (perfil.agenda_excluida_em and perfil.agenda_excluida_em >= desde):
+        desde_token = desde = None
+
+    etag = etag_agenda(perfil, inicio, desde_token)
+    condicional = get_conditional_response(request, etag=etag)
+    if condicional is not None:
+        condicional['ETag'] = etag
+        return condicional
+
+    token_sincronizacao = criar_token_sincronizacao(timezone.now() - MARGEM_SINCRONIZACAO)
+    consultas = consultas_do_feed(perfil, inicio, fim, desde)
+    resposta = HttpResponse(
+        gerar_ics(perfil, consultas, token_sincronizacao),
+        content_type='text/calendar; charset=utf-8',
+    )
+    resposta['ETag'] = etag
+    resposta['X-Sync-Token'] = token_sincronizacao
+    resposta['Content-Disposition'] = 'inline; filename="agenda.ics"'
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+def _agendar_pelo_paciente(request):
+    """Trata o POST do painel do paciente. Retorna (None, None) se a consulta foi agendada."""
+    form = AgendarConsultaForm(request.POST)
+    perfil_form = PerfilForm(request.POST, instance=request.user.perfil)
+    if form.is_valid() and perfil_form.is_valid():
+        nova_consulta = form.save(commit=False)
+        nova_consulta.paciente = request.user
+        try:
+            # Grava só se o horário continuar livre (protege contra agendamentos simultâneos)
+            reservar_horario(nova_consulta)
+        except HorarioIndisponivel as erro:
+            form.add_error('data_hora', erro)
+        else:
             perfil_form.save()
+            return None, None
+    return form, perfil_form
+
+@login_required
+async def painel_paciente(request):
+    """Painel do paciente, mostra suas consultas e permite agendar novas."""
+    usuario = await request.auser()
+    if request.method == 'POST':
+        form, perfil_form = await sync_to_async(_agendar_pelo_paciente)(request)
+        if form is None:
             return redirect('painel_paciente')
     else:
         form = AgendarConsultaForm()
-        perfil_form = PerfilForm(instance=perfil)
-
-    return render(request, 'pessoas/painel_paciente.html', {
+        perfil_form = await sync_to_async(lambda: PerfilForm(instance=request.user.perfil))()
+
+    # A página de consultas do paciente e a lista de médicos do formulário são independentes
+    (consultas, proxima_pagina), escolhas_medico = await em_paralelo(
+        partial(pagina_do_historico, request, *(
+            modelo.objects.filter(paciente_id=usuario.pk).select_related('medico').only(
+                'data_hora', 'status', 'medico__username', 'medico__last_name'
+            )
+            for modelo in (Consulta, ConsultaArquivada)
+        )),
+        partial(carregar_escolhas, form.fields['medico']),
+    )
+    form.fields['medico'].choices = escolhas_medico
+
+    return await renderizar(request, 'pessoas/painel_paciente.html', {
         'consultas': consultas,
+        'proxima_pagina': proxima_pagina,
         'form': form,
         'perfil_form': perfil_form
     })
@@ -179,25 +413,53 @@ def checkup_tratamento(request):
     # Esta vai carregar o checkup_tratamento.html
     return render(request, 'pessoas/checkup_tratamento.html')
     
-@login_required
-def painel_atendente(request):
-    """Painel do atendente, mostra todas as consultas e permite agendar novas."""
-    if request.user.perfil.tipo_usuario != "atendente":
-        return redirect("painel")
-
-    consultas = Consulta.objects.all().order_by("data_hora")
+def _preparar_painel_atendente(request):
+    """
+    Valida os filtros e trata o POST de agendamento do painel do atendente.
+    Retorna (filtro_form, consultas filtradas, formulário de agendamento, agendou).
+    """
+    # Carrega paciente e médico no mesmo SELECT (apenas as colunas usadas no template)
+    consultas = Consulta.objects.select_related("paciente", "medico").only(
+        "data_hora", "status",
+        "paciente__username", "paciente__first_name", "paciente__last_name",
+        "medico__username", "medico__first_name", "medico__last_name",
+    )
+    filtro_form = FiltroConsultasForm(request.GET or None)
+    if filtro_form.is_valid():
+        consultas = filtro_form.filtrar(consultas)
 
     if request.method == "POST":
         form = AgendarConsultaAtendenteForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect("painel_atendente")
+            try:
+                reservar_horario(form.save(commit=False))
+            except HorarioIndisponivel as erro:
+                form.add_error("data_hora", erro)
+            else:
+                return filtro_form, consultas, form, True
     else:
         form = AgendarConsultaAtendenteForm()
+    return filtro_form, consultas, form, False
 
-    return render(request, "pessoas/painel_atendente.html", {
-        "consultas": consultas,
-        "form": form
+@papel_requerido("atendente")
+async def painel_atendente(request):
+    """Painel do atendente, mostra todas as consultas e permite agendar novas."""
+    filtro_form, consultas, form, agendou = await sync_to_async(_preparar_painel_atendente)(request)
+    if agendou:
+        return redirect("painel_atendente")
+
+    # A página de consultas e a lista de médicos do filtro são consultas independentes
+    pagina, escolhas_medico = await em_paralelo(
+        partial(paginar_por_cursor, consultas, request.GET.get("cursor"), tamanho=CONSULTAS_POR_PAGINA),
+        partial(carregar_escolhas, filtro_form.fields["medico"]),
+    )
+    filtro_form.fields["medico"].choices = escolhas_medico
+
+    return await renderizar(request, "pessoas/painel_atendente.html", {
+        "consultas": pagina,
+        "form": form,
+        "filtro_form": filtro_form,
+        "proxima_pagina": url_proxima_pagina(request, pagina),
     })
 
 # --- AÇÕES ESPECÍFICAS ---
@@ -205,120 +467,214 @@ def painel_atendente(request):
 @login_required
 def escrever_relatorio(request, consulta_id):
     """Permite que um médico adicione ou edite um relatório de uma consulta."""
-    consulta = get_object_or_404(Consulta, id=consulta_id, medico=request.user)
+    consulta = Consulta.objects.filter(id=consulta_id, medico=request.user).select_related(
+        'paciente', 'relatorio_consulta'
+    ).first()
+    if consulta is None:
+        # Consultas arquivadas: o relatório só pode ser lido
+        arquivada = get_object_or_404(ConsultaArquivada, id=consulta_id, medico=request.user)
+        return render(request, 'pessoas/escrever_relatorio.html', {'consulta': arquivada})
 
     if request.method == 'POST':
-        form = RelatorioConsultaForm(request.POST, instance=consulta)
+        form = RelatorioConsultaForm(request.POST)
+        if consulta.status == 'cancelada':
+            form.add_error(None, "Consultas canceladas não recebem relatório.")
         if form.is_valid():
-            consulta.status = 'concluida'
-            form.save()
-            return redirect('painel_medico')
+            try:
+                with transaction.atomic():
+                    salvar_relatorio(consulta, form.cleaned_data['relatorio'], form.cleaned_data['versao'])
+                    consulta.status = 'concluida'
+                    consulta.save()
+            except RelatorioDesatualizado:
+                form.add_error(None, "O relatório foi alterado por outra pessoa enquanto você editava. "
+                                     "Salve de novo para substituí-lo pelo seu texto.")
+                # O próximo envio passa a valer sobre a versão atual
+                form.data = form.data.copy()
+                form.data['versao'] = versao_do_relatorio(consulta)
+            else:
+                return redirect('painel_medico')
     else:
-        form = RelatorioConsultaForm(instance=consulta)
+        relatorio = getattr(consulta, 'relatorio_consulta', None)
+        form = RelatorioConsultaForm(initial={
+            'relatorio': relatorio.texto if relatorio else '',
+            'versao': relatorio.versao if relatorio else 0,
+        })
 
     return render(request, 'pessoas/escrever_relatorio.html', {'form': form, 'consulta': consulta})
 
-# --- DASHBOARD ADMINISTRATIVO ---
+@login_required
+def horarios_livres_medico(request, medico_id):
+    """
+    Retorna (JSON) os horários livres de um médico entre ?inicio= e ?fim= (AAAA-MM-DD).
+    Sem parâmetros, usa os próximos 7 dias.
+    """
+    medico = get_object_or_404(User, pk=medico_id, perfil__tipo_usuario='medico')
+    hoje = timezone.localdate()
+    try:
+        inicio = parse_date(request.GET.get('inicio', '')) or hoje
+        fim = parse_date(request.GET.get('fim', '')) or inicio + timedelta(days=6)
+    except ValueError:
+        return JsonResponse({'erro': 'Data inválida.'}, status=400)
+    if fim < inicio or (fim - inicio).days >= MAX_DIAS_BUSCA:
+        return JsonResponse({'erro': f'O intervalo deve ter entre 1 e {MAX_DIAS_BUSCA} dias.'}, status=400)
+
+    livres = horarios_livres(medico, inicio, fim)
+    return JsonResponse({
+        'medico': medico.id,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'horarios': [timezone.localtime(horario).isoformat() for horario in livres],
+    })
 
 @login_required
+def buscar_usuarios_view(request):
+    """
+    Busca (JSON) de pacientes ou médicos por prefixo, usada pelo campo de
+    busca do formulário de agendamento do atendente. ?tipo=paciente|medico&q=termo
+    """
+    if request.papel not in (PAPEL_STAFF, 'atendente'):
+        return JsonResponse({'erro': 'Acesso negado.'}, status=403)
+
+    tipo = request.GET.get('tipo', 'paciente')
+    if tipo not in ('paciente', 'medico'):
+        return JsonResponse({'erro': 'Tipo de usuário inválido.'}, status=400)
+
+    usuarios = buscar_usuarios(request.GET.get('q', ''), tipo)
+    return JsonResponse({
+        'resultados': [
+            {'id': usuario.id, 'rotulo': rotulo_usuario(usuario)} for usuario in usuarios
+        ],
+    })
+
+# --- DASHBOARD ADMINISTRATIVO ---
+
+@papel_requerido(PAPEL_STAFF)
 def dashboard_admin(request):
     """
     Dashboard administrativo principal - redireciona para a página de estatísticas.
     Apenas usuários staff/admin podem acessar.
     """
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     return redirect('dashboard_consultas')
 
-@login_required
-def dashboard_produtos(request):
-    """Lista todos os medicamentos cadastrados para edição."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
-    medicamentos = Medicamento.objects.all().order_by('nome')
-    return render(request, 'pessoas/dashboard_produtos.html', {'medicamentos': medicamentos})
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+async def dashboard_produtos(request):
+    """Lista os medicamentos cadastrados para edição, com busca e paginação."""
+    filtro_form, medicamentos, proxima_pagina = await sync_to_async(listar_medicamentos)(request)
+    return await renderizar(request, 'pessoas/dashboard_produtos.html', {
+        'medicamentos': medicamentos,
+        'filtro_form': filtro_form,
+        'proxima_pagina': proxima_pagina,
+    })
 
-@login_required
-def dashboard_consultas(request):
+@papel_requerido(PAPEL_STAFF)
+def sincronizar_precos_view(request):
+    """Recebe a tabela de preços do fornecedor e mostra o relatório de alterações."""
+    relatorio = None
+    if request.method == 'POST':
+        form = SincronizarPrecosForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = io.TextIOWrapper(form.cleaned_data['arquivo'].file, encoding='utf-8-sig', newline='')
+            try:
+                relatorio = sincronizar_precos(arquivo, aplicar=not form.cleaned_data['simular'])
+            except (UnicodeDecodeError, ValueError) as erro:
+                form.add_error('arquivo', str(erro))
+    else:
+        form = SincronizarPrecosForm()
+
+    return render(request, 'pessoas/sincronizar_precos.html', {'form': form, 'relatorio': relatorio})
+
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+async def dashboard_consultas(request):
     """Dashboard com estatísticas de consultas."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
-    from django.db.models import Count, Q
-    from datetime import date
-    
-    # Estatísticas
-    total_consultas = Consulta.objects.count()
-    consultas_realizadas = Consulta.objects.filter(status='concluida').count()
-    consultas_agendadas = Consulta.objects.filter(status='agendada').count()
-    consultas_canceladas = Consulta.objects.filter(status='cancelada').count()
-    
-    # Máximo de atendimentos por dia (consultas agendadas para hoje)
-    max_atendimentos_dia = Consulta.objects.filter(
-        data_hora__date=date.today()
-    ).count()
-    
-    # Profissional mais ocupado (médico com mais consultas agendadas)
-    medico_mais_ocupado = Consulta.objects.filter(
-        status='agendada'
-    ).values(
-        'medico__first_name', 'medico__last_name'
-    ).annotate(
-        total=Count('id')
-    ).order_by('-total').first()
+    # Todas as estatísticas vêm de uma única consulta agregada, mantida em cache
+    contexto = await sync_to_async(obter_estatisticas_consultas)()
     
-    profissional_nome = "N/A"
-    if medico_mais_ocupado:
-        profissional_nome = f"{medico_mais_ocupado['medico__first_name']} {medico_mais_ocupado['medico__last_name']}"
-    
-    contexto = {
-        'total_consultas': total_consultas,
-        'consultas_realizadas': consultas_realizadas,
-        'max_atendimentos_dia': max_atendimentos_dia,
-        'consultas_agendadas': consultas_agendadas,
-        'consultas_canceladas': consultas_canceladas,
-        'profissional_nome': profissional_nome,
-    }
-    
-    return render(request, 'pessoas/dashboard_consultas.html', contexto)
+    return await renderizar(request, 'pessoas/dashboard_consultas.html', contexto)
 
-@login_required
-def dashboard_ocupacao(request):
-    """Lista todas as consultas agendadas."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
-    consultas = Consulta.objects.filter(status='agendada').order_by('data_hora')
-    return render(request, 'pessoas/dashboard_ocupacao.html', {'consultas': consultas})
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+async def dashboard_ocupacao(request):
+    """Mostra a ocupação de um dia (resumo por médico) e as consultas agendadas nele."""
+    # Dia escolhido via ?data=AAAA-MM-DD (padrão: hoje)
+    try:
+        dia = parse_date(request.GET.get('data', '')) or timezone.localdate()
+    except ValueError:
+        dia = timezone.localdate()
+    inicio, fim = limites_do_dia(dia)
+
+    consultas = Consulta.objects.filter(
+        status='agendada', data_hora__gte=inicio, data_hora__lt=fim
+    ).select_related('medico').only(
+        'data_hora', 'medico__username', 'medico__last_name'
+    ).order_by('data_hora')
+    # O resumo por médico vem da tabela OcupacaoDiaria, sem varrer as consultas;
+    # ele e a lista do dia são lidos ao mesmo tempo
+    ocupacao, consultas = await em_paralelo(partial(ocupacao_por_medico, dia), partial(list, consultas))
+    return await renderizar(request, 'pessoas/dashboard_ocupacao.html', {
+        'consultas': consultas,
+        'ocupacao': ocupacao,
+        'dia': dia,
+    })
 
-@login_required
-def dashboard_pacientes(request):
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+async def dashboard_pacientes(request):
     """Lista todos os pacientes cadastrados."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
-    pacientes = User.objects.filter(perfil__tipo_usuario='paciente').order_by('first_name')
-    return render(request, 'pessoas/dashboard_pacientes.html', {'pacientes': pacientes})
-
-@login_required
-def dashboard_medicos(request):
+    pacientes = [
+        paciente async for paciente in User.objects.filter(perfil__tipo_usuario='paciente').order_by('first_name')
+    ]
+    return await renderizar(request, 'pessoas/dashboard_pacientes.html', {'pacientes': pacientes})
+
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+async def dashboard_medicos(request):
     """Lista todos os médicos cadastrados."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
-    medicos = User.objects.filter(perfil__tipo_usuario='medico').order_by('first_name')
-    return render(request, 'pessoas/dashboard_medicos.html', {'medicos': medicos})
+    # O template mostra o endereço do perfil: carrega junto para evitar uma consulta por médico
+    medicos = [
+        medico async for medico in
+        User.objects.filter(perfil__tipo_usuario='medico').select_related('perfil').order_by('first_name')
+    ]
+    return await renderizar(request, 'pessoas/dashboard_medicos.html', {'medicos': medicos})
+
+@papel_requerido(PAPEL_STAFF)
+@ler_da_replica
+def exportar_consultas(request):
+    """
+    Exporta as consultas (com nomes de paciente e médico) em CSV ou XLSX.
+    Aceita ?formato=csv|xlsx e os mesmos filtros do painel do atendente.
+    O arquivo é enviado em streaming, à medida que as linhas são lidas,
+    tanto no WSGI quanto no ASGI (veja DEPLOY_ASGI.md).
+    """
+    # As linhas são lidas depois que a view retorna: o banco é escolhido agora
+    consultas = Consulta.objects.using(banco_de_leitura())
+    filtro_form = FiltroConsultasForm(request.GET or None)
+    if filtro_form.is_valid():
+        consultas = filtro_form.filtrar(consultas)
+
+    linhas = linhas_consultas(consultas)
+    nome_arquivo = f"consultas_{timezone.localdate():%Y%m%d}"
+    if request.GET.get('formato') == 'xlsx':
+        conteudo = gerar_xlsx(linhas)
+        tipo = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        extensao = 'xlsx'
+    else:
+        conteudo = gerar_csv(linhas)
+        tipo = 'text/csv; charset=utf-8'
+        extensao = 'csv'
+    if isinstance(request, ASGIRequest):
+        # No ASGI um iterador síncrono seria lido por inteiro antes do envio
+        conteudo = iterar_em_thread(conteudo)
+    resposta = StreamingHttpResponse(conteudo, content_type=tipo)
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{extensao}"'
+    return resposta
 
 # --- AÇÕES DO DASHBOARD ---
 
-@login_required
+@papel_requerido(PAPEL_STAFF)
 def editar_medicamento(request, medicamento_id):
     """Edita um medicamento existente."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     medicamento = get_object_or_404(Medicamento, pk=medicamento_id)
     
     if request.method == 'POST':
@@ -331,46 +687,34 @@ def editar_medicamento(request, medicamento_id):
     
     return render(request, 'pessoas/editar_medicamento.html', {'form': form, 'medicamento': medicamento})
 
-@login_required
+@papel_requerido(PAPEL_STAFF)
 def cancelar_consulta_admin(request, consulta_id):
     """Cancela uma consulta (ação do admin)."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     consulta = get_object_or_404(Consulta, pk=consulta_id)
     consulta.status = 'cancelada'
     consulta.save()
     return redirect('dashboard_ocupacao')
 
-@login_required
+@papel_requerido(PAPEL_STAFF)
 def remover_medico(request, medico_id):
     """Remove um médico do sistema."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     medico = get_object_or_404(User, pk=medico_id, perfil__tipo_usuario='medico')
     if request.method == 'POST':
         medico.delete()
     return redirect('dashboard_medicos')
 
-@login_required
+@papel_requerido(PAPEL_STAFF)
 def remover_paciente(request, paciente_id):
     """Remove um paciente do sistema."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     paciente = get_object_or_404(User, pk=paciente_id, perfil__tipo_usuario='paciente')
     if request.method == 'POST':
         paciente.delete()
     return redirect('dashboard_pacientes')
 
 
-@login_required
+@papel_requerido(PAPEL_STAFF)
 def gerenciar_cargos(request, user_id):
     """Permite ao admin alterar o cargo (tipo_usuario) de um usuário."""
-    if not request.user.is_staff:
-        return redirect('painel')
-    
     usuario = get_object_or_404(User, pk=user_id)
     
     try: